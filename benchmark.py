@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mediciones de rendimiento sin acceso a la red.
+
+Uso:
+    python benchmark.py correo --mensajes 2000 --conexiones 4
+    python benchmark.py extraccion --cuentas 10000 100000 1000000
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import random
+import logging
+
+def benchmark_mail(args):
+    """
+    Mide la descarga de adjuntos contra el servidor IMAP de prueba en memoria.
+    
+    Se ejecuta en una carpeta temporal para no tocar las descargas ni el registro
+    (ledger.db) reales.
+    """
+    workdir = tempfile.mkdtemp(prefix='benchmark_correo_')
+    os.environ['DOWNLOAD_FOLDER'] = os.path.join(workdir, 'files')
+    os.environ['LEDGER_FILE'] = os.path.join(workdir, 'ledger.db')
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, project_dir)
+    os.chdir(workdir)
+    try:
+        import mail
+        from processors import ledger
+        from processors.imap_stub import StubServer
+        from processors.mail_sources import IMAPSource
+
+        mail.DOWNLOAD_FOLDER = os.environ['DOWNLOAD_FOLDER']
+        mail.SEARCH_CRITERIA = 'SUBJECT "Estado Financiero"'
+        mail.IMAP_CONNECTIONS = args.conexiones
+        mail.FETCH_BATCH_SIZE = args.lote
+
+        server = StubServer()
+        start = time.perf_counter()
+        server.seed(args.mensajes)
+        logging.info(f"Buzón de prueba con {args.mensajes} correos creado en {time.perf_counter() - start:.2f} s")
+
+        for fetch_mode in args.modos:
+            mail.FETCH_MODE = fetch_mode
+            mail.clean_downloaded_emails()
+            shutil.rmtree(mail.DOWNLOAD_FOLDER, ignore_errors=True)
+            server.commands = 0
+
+            start = time.perf_counter()
+            files = IMAPSource(server.connect).download_attachments()
+            elapsed = time.perf_counter() - start
+            print(f"{fetch_mode:>8}: {len(files)} archivos de {args.mensajes} correos en {elapsed:.2f} s "
+                  f"({args.mensajes / elapsed:.0f} correos/s, {server.commands} comandos IMAP)")
+        ledger.close()
+    finally:
+        os.chdir(project_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def extract_financial_data_rowwise(dataframe):
+    """
+    Implementación anterior de extract_financial_data, fila a fila con iterrows/iloc.
+    
+    Se conserva solo como referencia para medir la diferencia y comprobar que la
+    versión por columnas devuelve lo mismo con los importes de los estados
+    sintéticos (positivos y con punto decimal: la referencia ignora los signos).
+    """
+    import pandas as pd
+    from processors.financial_data import clasificar_cuenta, clasificar_categoria
+
+    financial_data = []
+    if dataframe.shape[1] < 3:
+        return financial_data
+    columns = dataframe.columns.tolist()
+
+    header_row_idx = None
+    for idx, row in dataframe.iterrows():
+        if isinstance(row[columns[0]], str) and "Código cuenta contable" in row[columns[0]]:
+            header_row_idx = idx
+            break
+    if header_row_idx is None:
+        for idx, row in dataframe.iterrows():
+            if isinstance(row[columns[0]], str) and row[columns[0]].isdigit():
+                header_row_idx = idx - 1
+                break
+    if header_row_idx is None:
+        header_row_idx = 7
+
+    for idx in range(header_row_idx + 1, len(dataframe)):
+        row = dataframe.iloc[idx]
+        codigo = row[columns[0]]
+        descripcion = row[columns[1]]
+        valor = row[columns[2]]
+        if pd.notna(codigo) and pd.notna(valor):
+            if not isinstance(codigo, str):
+                codigo = str(codigo)
+            try:
+                if isinstance(valor, str):
+                    valor = ''.join(c for c in valor if c.isdigit() or c == '.')
+                valor = float(valor)
+            except (ValueError, TypeError):
+                continue
+            financial_data.append({
+                'codigo': codigo,
+                'descripcion': descripcion if pd.notna(descripcion) else '',
+                'valor': valor,
+                'tipo': clasificar_cuenta(codigo, descripcion),
+                'categoria': clasificar_categoria(codigo, descripcion)
+            })
+    return financial_data
+
+def synthetic_statement(accounts, seed=0):
+    """
+    Crea un DataFrame como el que devuelve pd.read_excel para un estado financiero
+    de `accounts` cuentas: filas de título, la fila de encabezado y las cuentas,
+    con valores numéricos, valores de texto ("$1,234.50"), vacíos y filas en blanco.
+    """
+    import pandas as pd
+
+    rnd = random.Random(seed)
+    rows = [
+        ["Empresa de prueba", None, None],
+        ["Estado de situación financiera", None, None],
+        [None, None, None],
+        ["Código cuenta contable", "Nombre cuenta contable", "Saldo"]
+    ]
+    prefixes = ['1105', '1445', '1504', '1520', '1592', '2335', '2365', '2370', '2505', '3105', '4135', '5105', '6120']
+    for i in range(accounts):
+        codigo = rnd.choice(prefixes) + str(i).zfill(6)
+        draw = rnd.random()
+        if draw < 0.6:
+            valor = round(rnd.uniform(0, 1e7), 2)
+        elif draw < 0.9:
+            valor = f"${rnd.uniform(0, 1e7):,.2f}"
+        elif draw < 0.95:
+            valor = None
+        else:
+            valor = "n/a"
+        rows.append([codigo if rnd.random() > 0.02 else None, f"Cuenta {i}", valor])
+    return pd.DataFrame(rows, columns=['Empresa de prueba', 'Unnamed: 1', 'Unnamed: 2'])
+
+def benchmark_extraction(args):
+    """
+    Compara extract_financial_data (por columnas) con la implementación anterior
+    fila a fila sobre estados sintéticos de distintos tamaños.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from processors.financial_data import extract_financial_data
+
+    for accounts in args.cuentas:
+        dataframe = synthetic_statement(accounts)
+
+        start = time.perf_counter()
+        records = extract_financial_data(dataframe)
+        vectorized = time.perf_counter() - start
+        line = f"{accounts:>9} cuentas: por columnas {vectorized:.3f} s"
+
+        if not args.sin_referencia:
+            start = time.perf_counter()
+            reference = extract_financial_data_rowwise(dataframe)
+            rowwise = time.perf_counter() - start
+            if records != reference:
+                raise SystemExit(f"Los registros extraídos de {accounts} cuentas no coinciden con la referencia")
+            line += f", fila a fila {rowwise:.3f} s ({rowwise / vectorized:.1f}x)"
+        print(f"{line}, {len(records)} registros")
+
+def main():
+    parser = argparse.ArgumentParser(description='Mediciones de rendimiento')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_mail = subparsers.add_parser('correo', help='Descarga de adjuntos contra el servidor IMAP de prueba')
+    parser_mail.add_argument('--mensajes', type=int, default=1000, help='Correos sintéticos en el buzón')
+    parser_mail.add_argument('--conexiones', type=int, default=1, help='Conexiones IMAP simultáneas')
+    parser_mail.add_argument('--lote', type=int, default=50, help='Correos por lote')
+    parser_mail.add_argument('--modos', nargs='+', default=['partes', 'completo'], help='Modos de descarga a medir')
+    parser_mail.set_defaults(func=benchmark_mail)
+
+    parser_extraction = subparsers.add_parser('extraccion', help='Extracción de registros de un estado financiero')
+    parser_extraction.add_argument('--cuentas', type=int, nargs='+', default=[10000, 100000, 1000000],
+                                   help='Número de cuentas de cada estado sintético')
+    parser_extraction.add_argument('--sin-referencia', action='store_true',
+                                   help='No ejecutar la implementación fila a fila (lenta con muchas cuentas)')
+    parser_extraction.set_defaults(func=benchmark_extraction)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
-import load_files
 import pandas as pd
+from processors.file_processor import load_files
 import logging
 
 # Cargar variables de entorno
@@ -17,8 +17,8 @@ def main():
     downloaded_files = [f for f in os.listdir(DOWNLOAD_FOLDER) 
                        if f.endswith(('.xls', '.xlsx', '.csv'))]
     
-    # Cargar los archivos
-    loaded_data = load_files.load_files(downloaded_files, DOWNLOAD_FOLDER)
+    # Cargar los archivos (se leen uno a uno a medida que se recorren)
+    loaded_data = load_files(downloaded_files, DOWNLOAD_FOLDER)
     
     # Examinar cada DataFrame
     for filename, df in loaded_data.items():
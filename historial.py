@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Consultas al historial de estados financieros analizados (processors.history).
+
+Uso:
+    python historial.py periodos
+    python historial.py cuenta 1445 --entidad "Finca La Esperanza"
+    python historial.py categoria animales
+    python historial.py total utilidad --csv
+    python historial.py consolidado --periodo 2024
+"""
+
+import sys
+import argparse
+import logging
+import pandas as pd
+from processors import history
+from processors.consolidation import consolidate, render_consolidated_report
+from processors.report_generator import write_lines
+
+def show(frame, args):
+    """Muestra un DataFrame como tabla o como CSV."""
+    if frame.empty:
+        print("No hay datos en el historial para esa consulta.")
+    elif args.csv:
+        frame.to_csv(sys.stdout, index=False)
+    else:
+        with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:,.2f}'.format):
+            print(frame.to_string(index=False, na_rep=''))
+
+def query_periods(args):
+    show(history.periods(args.entidad), args)
+
+def query_account(args):
+    show(history.with_changes(history.account_series(args.codigo, args.entidad)), args)
+
+def query_category(args):
+    show(history.with_changes(history.category_series(args.categoria, args.entidad)), args)
+
+def query_type(args):
+    show(history.with_changes(history.summary_series('tipo', args.tipo, args.entidad)), args)
+
+def query_total(args):
+    show(history.with_changes(history.summary_series('total', args.total, args.entidad)), args)
+
+def query_consolidated(args):
+    batch = history.load_batch(args.entidad, args.periodo)
+    if not len(batch):
+        print("No hay datos en el historial para esa consulta.")
+        return
+    results = consolidate(batch, level=args.nivel)
+    if args.csv:
+        show(results['tabla'], args)
+    else:
+        write_lines(sys.stdout, render_consolidated_report(results))
+        print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Consultas al historial de estados financieros')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    # Opciones comunes a todas las consultas
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--entidad', help='Solo los estados de esta entidad')
+    common.add_argument('--csv', action='store_true', help='Mostrar el resultado como CSV')
+
+    parser_periods = subparsers.add_parser('periodos', parents=[common], help='Estados guardados en el historial')
+    parser_periods.set_defaults(func=query_periods)
+
+    parser_account = subparsers.add_parser('cuenta', parents=[common], help='Serie de una cuenta con sus variaciones')
+    parser_account.add_argument('codigo', help='Código de la cuenta')
+    parser_account.set_defaults(func=query_account)
+
+    parser_category = subparsers.add_parser('categoria', parents=[common], help='Serie de una categoría con sus variaciones')
+    parser_category.add_argument('categoria', help='Nombre de la categoría (ver categorias.json)')
+    parser_category.set_defaults(func=query_category)
+
+    parser_type = subparsers.add_parser('tipo', parents=[common], help='Serie de un tipo de cuenta con sus variaciones')
+    parser_type.add_argument('tipo', help='Tipo de cuenta (Activo, Pasivo, Ingreso, ...)')
+    parser_type.set_defaults(func=query_type)
+
+    parser_total = subparsers.add_parser('total', parents=[common], help='Serie de un total del análisis con sus variaciones')
+    parser_total.add_argument('total', help='Clave del total (total_activos, total_gastos, utilidad, ...)')
+    parser_total.set_defaults(func=query_total)
+
+    parser_consolidated = subparsers.add_parser('consolidado', parents=[common], help='Análisis consolidado de varios estados (por entidad y por periodo)')
+    parser_consolidated.add_argument('--periodo', help='Solo los periodos que empiezan así (2024 = todo el año)')
+    parser_consolidated.add_argument('--nivel', type=int, default=None, help='Calcular los totales con las cuentas de este nivel del árbol de códigos')
+    parser_consolidated.set_defaults(func=query_consolidated)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not history.enabled():
+        parser.error("El historial está desactivado (HISTORY_FILE vacío)")
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,22 @@
 import imaplib
 import email
+import binascii
+import quopri
+import re
+import queue
+import select
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
 from email.header import decode_header
+from urllib.parse import unquote
 import os
 import logging
+from processors.attachment_store import store_attachment
+from processors import ledger
 
 # Configuración
 # load config from dotenv
@@ -14,8 +27,31 @@ PASSWORD = os.getenv('PASSWORD')
 IMAP_SERVER = os.getenv('IMAP_SERVER')
 DOWNLOAD_FOLDER = os.getenv('DOWNLOAD_FOLDER')
 SEARCH_CRITERIA = os.getenv('SEARCH_CRITERIA')
-DOWNLOADED_EMAILS_FILE = 'downloaded_emails.txt'
+MAILBOX = os.getenv('MAILBOX', 'inbox')
+# Identificador del buzón en el registro (processors.ledger)
+IMAP_SOURCE = f"imap:{MAILBOX}"
 SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+# 'partes' descarga solo las partes MIME de los adjuntos soportados,
+# 'completo' descarga el mensaje RFC822 entero (comportamiento anterior)
+FETCH_MODE = os.getenv('FETCH_MODE', 'partes')
+FETCH_BATCH_SIZE = int(os.getenv('FETCH_BATCH_SIZE', '50'))
+# Conexiones IMAP simultáneas y reintentos por lote ante una conexión caída
+IMAP_CONNECTIONS = int(os.getenv('IMAP_CONNECTIONS', '1'))
+IMAP_MAX_RETRIES = int(os.getenv('IMAP_MAX_RETRIES', '3'))
+# Tamaño (bytes) de cada fragmento pedido al servidor al descargar un adjunto
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', str(1024 * 1024)))
+# Modo --watch: segundos máximos de cada IDLE (el RFC 2177 pide renovarlo antes de 29 minutos)
+# y segundos entre NOOP cuando el servidor no soporta IDLE
+WATCH_IDLE_TIMEOUT = int(os.getenv('WATCH_IDLE_TIMEOUT', str(25 * 60)))
+WATCH_POLL_INTERVAL = int(os.getenv('WATCH_POLL_INTERVAL', '60'))
+
+# Tokens de una respuesta IMAP: paréntesis, cadenas entre comillas y átomos
+_IMAP_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_LITERAL_SUFFIX_RE = re.compile(rb'\{\d+\}$')
+_BODY_SECTION_RE = re.compile(rb'BODY\[([\d.]+)\](?:<\d+>)?')
+_NON_BASE64_RE = re.compile(rb'[^A-Za-z0-9+/=]')
+_INTERNALDATE_RE = re.compile(rb'INTERNALDATE "([^"]+)"')
+_EXISTS_RE = re.compile(rb'^\* \d+ EXISTS')
 
 def clean_filename(filename):
     """Limpia el nombre del archivo."""
@@ -23,121 +59,760 @@ def clean_filename(filename):
         filename = filename.decode()
     return "".join(c if c.isalnum() or c in ['.', '_', '-'] else "_" for c in filename)
 
+def decode_filename(filename):
+    """Decodifica un nombre de archivo que puede venir en formato MIME (RFC 2047)."""
+    decoded_header = decode_header(filename)
+    return ''.join(
+        str(t[0], t[1] if t[1] else 'utf-8') if isinstance(t[0], bytes) else t[0]
+        for t in decoded_header
+    )
+
+def is_supported_file(filename):
+    """Indica si el archivo tiene una extensión soportada."""
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+def save_attachment_stream(filename, chunks):
+    """
+    Guarda un adjunto en el almacén de adjuntos escribiéndolo por fragmentos.
+    
+    El adjunto se guarda por su hash SHA-256, de modo que dos adjuntos con el
+    mismo nombre no se sobrescriben y el mismo archivo reenviado varias veces
+    solo se guarda una vez.
+    
+    Args:
+        filename (str): Nombre original (ya decodificado) del adjunto.
+        chunks (iterable): Fragmentos (bytes) del contenido decodificado.
+        
+    Returns:
+        dict: 'hash', 'archivo' (nombre almacenado), 'nombre' y 'nuevo'.
+    """
+    attachment = store_attachment(chunks, clean_filename(filename), download_folder=DOWNLOAD_FOLDER)
+    if attachment['nuevo']:
+        logging.info(f"Descargado: {filename} -> {attachment['archivo']}")
+    return attachment
+
+def save_attachment(filename, payload):
+    """
+    Guarda el contenido de un adjunto en el almacén de adjuntos.
+    
+    Args:
+        filename (str): Nombre original (ya decodificado) del adjunto.
+        payload (bytes): Contenido decodificado del adjunto.
+        
+    Returns:
+        dict: 'hash', 'archivo' (nombre almacenado), 'nombre' y 'nuevo'.
+    """
+    return save_attachment_stream(filename, [payload])
+
+def parse_internaldate(value):
+    """Convierte un INTERNALDATE de IMAP en una fecha ISO 8601 (None si no se puede)."""
+    if isinstance(value, bytes):
+        value = value.decode()
+    try:
+        return datetime.strptime(value, '%d-%b-%Y %H:%M:%S %z').isoformat()
+    except (TypeError, ValueError):
+        return None
+
+def _quote_literal(literal):
+    """Convierte un literal IMAP en una cadena entre comillas equivalente."""
+    return b'"' + literal.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+def parse_imap_response(msg_data):
+    """
+    Convierte la respuesta de imaplib en listas anidadas.
+    
+    Los literales (que imaplib devuelve como tuplas) se integran como cadenas,
+    NIL se convierte en None y el resto de átomos se devuelven como str.
+    
+    Args:
+        msg_data (list): Respuesta devuelta por imaplib (bytes y tuplas).
+        
+    Returns:
+        list: Elementos de la respuesta como listas anidadas.
+    """
+    buffer = []
+    for item in msg_data:
+        if isinstance(item, tuple):
+            buffer.append(_LITERAL_SUFFIX_RE.sub(b'', item[0].rstrip()) + _quote_literal(item[1]))
+        elif item:
+            buffer.append(item)
+    data = b' '.join(buffer)
+    
+    root = []
+    stack = [root]
+    for match in _IMAP_TOKEN_RE.finditer(data):
+        opening, closing, quoted, atom = match.groups()
+        if opening:
+            child = []
+            stack[-1].append(child)
+            stack.append(child)
+        elif closing:
+            if len(stack) > 1:
+                stack.pop()
+        elif quoted is not None:
+            value = re.sub(rb'\\(.)', rb'\1', quoted)
+            stack[-1].append(value.decode('utf-8', errors='replace'))
+        elif atom is not None:
+            value = atom.decode('utf-8', errors='replace')
+            stack[-1].append(None if value.upper() == 'NIL' else value)
+    return root
+
+def parse_fetch_response(msg_data):
+    """
+    Agrupa la respuesta de un FETCH por mensaje.
+    
+    Args:
+        msg_data (list): Respuesta de imaplib a un comando FETCH.
+        
+    Returns:
+        list: Lista de tuplas (id_mensaje, dict de atributos en mayúsculas).
+    """
+    items = parse_imap_response(msg_data)
+    messages = []
+    for message_id, attributes in zip(items[::2], items[1::2]):
+        if not isinstance(attributes, list):
+            continue
+        values = dict(zip((str(k).upper() for k in attributes[::2]), attributes[1::2]))
+        messages.append((message_id, values))
+    return messages
+
+def _bodystructure_params(params):
+    """Convierte una lista de parámetros de BODYSTRUCTURE en diccionario."""
+    if not isinstance(params, list):
+        return {}
+    return {str(k).lower(): v for k, v in zip(params[::2], params[1::2])}
+
+def _decode_rfc2231(value):
+    """Decodifica un parámetro extendido RFC 2231 (charset'idioma'valor)."""
+    parts = value.split("'", 2)
+    if len(parts) < 3:
+        return unquote(value)
+    return unquote(parts[2], encoding=parts[0] or 'utf-8', errors='replace')
+
+def _bodystructure_filename(structure):
+    """Obtiene el nombre del archivo de una parte simple de BODYSTRUCTURE."""
+    main_type = str(structure[0]).lower()
+    sub_type = str(structure[1]).lower()
+    
+    # Los campos de extensión van después de los campos básicos de cada tipo
+    extension_start = 7
+    if main_type == 'text':
+        extension_start += 1
+    elif main_type == 'message' and sub_type == 'rfc822':
+        extension_start += 3
+    
+    candidates = {}
+    disposition = structure[extension_start + 1] if len(structure) > extension_start + 1 else None
+    if isinstance(disposition, list) and len(disposition) > 1:
+        candidates.update(_bodystructure_params(disposition[1]))
+    content_params = _bodystructure_params(structure[2])
+    
+    for params, key in ((candidates, 'filename'), (content_params, 'name')):
+        if params.get(key + '*'):
+            return _decode_rfc2231(params[key + '*'])
+        if params.get(key):
+            return decode_filename(params[key])
+    return None
+
+def find_attachment_parts(structure, part_id=''):
+    """
+    Busca en un BODYSTRUCTURE las partes que son adjuntos soportados.
+    
+    Args:
+        structure (list): BODYSTRUCTURE ya convertido en listas anidadas.
+        part_id (str): Identificador de la parte actual (vacío para la raíz).
+        
+    Returns:
+        list: Lista de diccionarios con 'parte', 'filename', 'encoding' y 'size'.
+    """
+    parts = []
+    if not isinstance(structure, list) or not structure:
+        return parts
+    
+    # Parte multipart: las subpartes se numeran 1, 2, ... dentro del prefijo actual
+    if isinstance(structure[0], list):
+        for index, child in enumerate(structure):
+            # Tras las subpartes vienen el subtipo y los campos de extensión
+            if not isinstance(child, list):
+                break
+            child_id = f"{part_id}.{index + 1}" if part_id else str(index + 1)
+            parts.extend(find_attachment_parts(child, child_id))
+        return parts
+    
+    part_id = part_id or '1'
+    main_type = str(structure[0]).lower()
+    sub_type = str(structure[1]).lower()
+    
+    # Mensajes reenviados como adjunto: buscar dentro del mensaje encapsulado
+    if main_type == 'message' and sub_type == 'rfc822' and len(structure) > 8:
+        inner = structure[8]
+        if isinstance(inner, list) and inner:
+            inner_id = part_id if isinstance(inner[0], list) else f"{part_id}.1"
+            return find_attachment_parts(inner, inner_id)
+    
+    filename = _bodystructure_filename(structure)
+    if filename and is_supported_file(filename):
+        parts.append({
+            'parte': part_id,
+            'filename': filename,
+            'encoding': str(structure[5] or '7bit').lower(),
+            'size': int(structure[6]) if str(structure[6]).isdigit() else 0
+        })
+    elif filename:
+        logging.info(f"Archivo {filename} no es un tipo soportado. Saltando...")
+    return parts
+
+def iter_decoded_chunks(chunks, encoding):
+    """
+    Decodifica por fragmentos el contenido de una parte según su Content-Transfer-Encoding.
+    
+    Los bytes que no completan un grupo base64 o una línea quoted-printable se
+    guardan hasta el siguiente fragmento, así la memoria usada depende del
+    tamaño del fragmento y no del tamaño del adjunto.
+    
+    Args:
+        chunks (iterable): Fragmentos (bytes) del contenido codificado.
+        encoding (str): Content-Transfer-Encoding de la parte, en minúsculas.
+        
+    Yields:
+        bytes: Fragmentos del contenido decodificado.
+    """
+    pending = b''
+    if encoding == 'base64':
+        for chunk in chunks:
+            data = pending + _NON_BASE64_RE.sub(b'', chunk)
+            cut = len(data) - len(data) % 4
+            pending = data[cut:]
+            if cut:
+                yield binascii.a2b_base64(data[:cut])
+        if pending:
+            yield binascii.a2b_base64(pending + b'=' * (-len(pending) % 4))
+    elif encoding == 'quoted-printable':
+        for chunk in chunks:
+            data = pending + chunk
+            cut = data.rfind(b'\n') + 1
+            pending = data[cut:]
+            if cut:
+                yield quopri.decodestring(data[:cut])
+        if pending:
+            yield quopri.decodestring(pending)
+    else:
+        yield from chunks
+
+def iter_part_chunks(mail, uid, part_id):
+    """
+    Descarga una parte de un correo en fragmentos con BODY.PEEK[<parte>]<inicio.tamaño>.
+    
+    Args:
+        mail (imaplib.IMAP4): Conexión IMAP con el buzón ya seleccionado.
+        uid (int): UID del correo.
+        part_id (str): Identificador de la parte (por ejemplo '2' o '2.1').
+        
+    Yields:
+        bytes: Fragmentos del contenido codificado de la parte.
+    """
+    offset = 0
+    while True:
+        status, data = mail.uid('FETCH', str(uid), f'(BODY.PEEK[{part_id}]<{offset}.{STREAM_CHUNK_SIZE}>)')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"No se pudo descargar la parte {part_id} del correo {uid}: {data}")
+        chunk = None
+        for response_part in data:
+            if isinstance(response_part, tuple) and _BODY_SECTION_RE.search(response_part[0]):
+                chunk = response_part[1]
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < STREAM_CHUNK_SIZE:
+            return
+        offset += len(chunk)
+
+def fetch_attachment_parts(mail, uids):
+    """
+    Descarga solo las partes MIME de los adjuntos soportados de varios correos.
+    
+    Primero obtiene el BODYSTRUCTURE de un lote de correos y luego pide
+    únicamente las partes adjuntas con BODY.PEEK[<parte>], por fragmentos de
+    STREAM_CHUNK_SIZE bytes que se decodifican y escriben directamente a disco.
+    
+    Args:
+        mail (imaplib.IMAP4): Conexión IMAP con el buzón ya seleccionado.
+        uids (list): UIDs (int) de los correos a procesar.
+        
+    Returns:
+        dict: Diccionario UID (int) -> correo descargado ('recibido', 'duracion' y
+            'adjuntos', la lista de adjuntos guardados).
+    """
+    downloaded = {}
+    status, msg_data = mail.uid('FETCH', ','.join(str(uid) for uid in uids), '(UID INTERNALDATE BODYSTRUCTURE)')
+    if status != 'OK':
+        logging.error(f"No se pudo obtener la estructura de los correos: {msg_data}")
+        return downloaded
+    
+    for _, attributes in parse_fetch_response(msg_data):
+        if 'UID' not in attributes or 'BODYSTRUCTURE' not in attributes:
+            continue
+        start = time.perf_counter()
+        uid = int(attributes['UID'])
+        received = parse_internaldate(attributes.get('INTERNALDATE'))
+        parts = find_attachment_parts(attributes['BODYSTRUCTURE'])
+        
+        attachments = []
+        try:
+            for part in parts:
+                # Descargar y decodificar la parte por fragmentos directamente a disco
+                chunks = iter_decoded_chunks(iter_part_chunks(mail, uid, part['parte']), part['encoding'])
+                attachments.append(save_attachment_stream(part['filename'], chunks))
+        except imaplib.IMAP4.abort:
+            raise
+        except imaplib.IMAP4.error as e:
+            logging.error(f"No se pudieron descargar los adjuntos del correo {uid}: {e}")
+            continue
+        downloaded[uid] = {'recibido': received, 'duracion': time.perf_counter() - start, 'adjuntos': attachments}
+    return downloaded
+
+def fetch_full_message(mail, uid):
+    """
+    Descarga el correo completo (RFC822) y guarda sus adjuntos soportados.
+    
+    Args:
+        mail (imaplib.IMAP4): Conexión IMAP con el buzón ya seleccionado.
+        uid (int): UID del correo a descargar.
+        
+    Returns:
+        dict: Correo descargado ('recibido', 'duracion' y 'adjuntos', la lista de adjuntos guardados).
+    """
+    start = time.perf_counter()
+    attachments = []
+    status, msg_data = mail.uid('FETCH', str(uid), '(RFC822 INTERNALDATE)')  # Obtener el correo completo
+    received = None
+    for response_part in msg_data:
+        header = response_part[0] if isinstance(response_part, tuple) else response_part
+        match = _INTERNALDATE_RE.search(header or b'')
+        if match:
+            received = parse_internaldate(match.group(1))
+    for response_part in msg_data:
+        if isinstance(response_part, tuple):
+            msg = email.message_from_bytes(response_part[1])
+            attachments.extend(save_message_attachments(msg))
+    return {'recibido': received, 'duracion': time.perf_counter() - start, 'adjuntos': attachments}
+
+def save_message_attachments(msg):
+    """
+    Guarda los adjuntos soportados de un correo ya leído.
+    
+    Args:
+        msg (email.message.Message): Correo a procesar.
+        
+    Returns:
+        list: Adjuntos guardados (diccionarios con 'hash', 'archivo', 'nombre' y 'nuevo').
+    """
+    attachments = []
+    
+    # Recorrer las partes del correo
+    for part in msg.walk():
+        if part.get_content_maintype() == 'multipart':
+            continue
+        if part.get('Content-Disposition') is None:
+            continue
+
+        # Obtener el nombre del archivo adjunto
+        filename = part.get_filename()
+        if filename:
+            # Decodificar el nombre del archivo si está en formato MIME
+            filename = decode_filename(filename)
+            
+            # Verificar si el tipo de archivo es soportado
+            if not is_supported_file(filename):
+                logging.info(f"Archivo {filename} no es un tipo soportado. Saltando...")
+                continue
+
+            # Guardar el archivo adjunto
+            attachments.append(save_attachment(filename, part.get_payload(decode=True)))
+    return attachments
+
+def get_uidvalidity(mail):
+    """Devuelve el UIDVALIDITY del buzón seleccionado."""
+    status, data = mail.response('UIDVALIDITY')
+    if not data or data[0] is None:
+        status, data = mail.status(MAILBOX, '(UIDVALIDITY)')
+        match = re.search(rb'UIDVALIDITY (\d+)', data[0] or b'')
+        return int(match.group(1)) if match else None
+    return int(data[-1])
+
+def search_new_uids(mail, last_uid):
+    """
+    Busca los UIDs mayores que last_uid que coinciden con SEARCH_CRITERIA.
+    
+    Args:
+        mail (imaplib.IMAP4): Conexión IMAP con el buzón ya seleccionado.
+        last_uid (int): Último UID ya procesado (0 para una sincronización completa).
+        
+    Returns:
+        list: UIDs (int) en orden ascendente, o None si la búsqueda falló.
+    """
+    criteria = f"UID {last_uid + 1}:*"
+    if SEARCH_CRITERIA:
+        criteria = f"{criteria} {SEARCH_CRITERIA}"
+    status, messages = mail.uid('SEARCH', criteria)
+    if status != 'OK':
+        return None
+    
+    # "N:*" siempre incluye el último mensaje aunque su UID sea menor que N
+    uids = sorted(int(uid) for uid in messages[0].split())
+    return [uid for uid in uids if uid > last_uid]
+
+def connect_imap():
+    """Abre una conexión IMAP autenticada con el buzón ya seleccionado."""
+    mail = imaplib.IMAP4_SSL(IMAP_SERVER)
+    mail.login(EMAIL, PASSWORD)
+    mail.select(MAILBOX)
+    return mail
+
+def close_imap(mail):
+    """Cierra una conexión IMAP ignorando los errores de una conexión ya caída."""
+    try:
+        mail.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
+
+def fetch_batch(mail, batch):
+    """Descarga los adjuntos de un lote de UIDs según FETCH_MODE."""
+    if FETCH_MODE == 'completo':
+        return {uid: fetch_full_message(mail, uid) for uid in batch}
+    return fetch_attachment_parts(mail, batch)
+
+def _download_worker(batch_queue, on_batch_done, mail=None, connect=None):
+    """
+    Descarga lotes de la cola con una conexión propia hasta vaciarla.
+    
+    Si la conexión se cae se vuelve a conectar y se reintenta el lote hasta
+    IMAP_MAX_RETRIES veces. El trabajador solo cierra las conexiones que abre
+    él mismo; la conexión recibida sigue siendo de quien llama.
+    
+    Args:
+        batch_queue (queue.Queue): Cola de tuplas (índice_lote, lista_de_UIDs).
+        on_batch_done (callable): Función llamada con (índice_lote, resultados).
+        mail (imaplib.IMAP4, optional): Conexión ya abierta a reutilizar.
+        connect (callable, optional): Función que abre una conexión nueva.
+            Por defecto connect_imap.
+    """
+    connect = connect or connect_imap
+    own_connection = None
+    try:
+        while True:
+            try:
+                index, batch = batch_queue.get_nowait()
+            except queue.Empty:
+                return
+            
+            results = {}
+            for attempt in range(1, IMAP_MAX_RETRIES + 1):
+                try:
+                    if mail is None:
+                        mail = own_connection = connect()
+                    results = fetch_batch(mail, batch)
+                    break
+                except (imaplib.IMAP4.abort, OSError) as e:
+                    logging.warning(f"Conexión perdida en el lote {index} (intento {attempt}/{IMAP_MAX_RETRIES}): {e}")
+                    if own_connection is not None:
+                        close_imap(own_connection)
+                    mail = own_connection = None
+            else:
+                logging.error(f"No se pudo descargar el lote {index} tras {IMAP_MAX_RETRIES} intentos.")
+            on_batch_done(index, results)
+    finally:
+        if own_connection is not None:
+            close_imap(own_connection)
+
+def download_uids(mail, uids, uidvalidity, last_uid, connections=None, connect=None):
+    """
+    Descarga los adjuntos de los UIDs indicados usando varias conexiones en paralelo.
+    
+    Los UIDs se reparten en lotes de FETCH_BATCH_SIZE entre hasta `connections`
+    conexiones. Cada lote terminado se registra en processors.ledger en una sola
+    transacción (correos, adjuntos y punto de control), en orden de UID, de modo
+    que el punto de control nunca salta un correo pendiente.
+    
+    Args:
+        mail (imaplib.IMAP4): Conexión ya abierta que usa el primer trabajador (no se cierra).
+        uids (list): UIDs (int) en orden ascendente.
+        uidvalidity (int): UIDVALIDITY del buzón.
+        last_uid (int): Último UID del punto de control actual.
+        connections (int, optional): Número de conexiones. Por defecto IMAP_CONNECTIONS.
+        connect (callable, optional): Función que abre una conexión nueva.
+            Por defecto connect_imap.
+        
+    Returns:
+        list: Archivos descargados, en orden de UID.
+    """
+    if connections is None:
+        connections = IMAP_CONNECTIONS
+    batches = [uids[start:start + FETCH_BATCH_SIZE] for start in range(0, len(uids), FETCH_BATCH_SIZE)]
+    connections = max(1, min(connections, len(batches)))
+    
+    batch_queue = queue.Queue()
+    for index, batch in enumerate(batches):
+        batch_queue.put((index, batch))
+    
+    lock = threading.Lock()
+    completed = {}
+    progress = {'next': 0, 'checkpoint': last_uid, 'blocked': False}
+    downloaded_files = []
+    
+    def on_batch_done(index, results):
+        with lock:
+            completed[index] = results
+            # Procesar en orden los lotes contiguos ya terminados
+            while progress['next'] in completed:
+                batch = batches[progress['next']]
+                batch_results = completed.pop(progress['next'])
+                progress['next'] += 1
+                
+                messages = []
+                for uid in batch:
+                    if uid in batch_results:
+                        messages.append(dict(batch_results[uid], uid=uid))
+                        downloaded_files.extend(a['archivo'] for a in batch_results[uid]['adjuntos'])
+                
+                # Avanzar el punto de control solo hasta el último correo procesado sin huecos
+                checkpoint = None
+                missing = [uid for uid in batch if uid not in batch_results]
+                if missing:
+                    logging.error(f"No se pudieron procesar los correos {missing}. Se reintentarán en la próxima ejecución.")
+                    if not progress['blocked'] and missing[0] - 1 > progress['checkpoint']:
+                        checkpoint = progress['checkpoint'] = missing[0] - 1
+                    progress['blocked'] = True
+                elif not progress['blocked']:
+                    checkpoint = progress['checkpoint'] = batch[-1]
+                
+                # Registrar el lote (correos, adjuntos y punto de control) en una sola transacción
+                ledger.record_messages(IMAP_SOURCE, messages, uidvalidity, checkpoint)
+    
+    if connections == 1:
+        _download_worker(batch_queue, on_batch_done, mail, connect)
+    else:
+        logging.info(f"Descargando {len(uids)} correos con {connections} conexiones...")
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [executor.submit(_download_worker, batch_queue, on_batch_done, mail if i == 0 else None, connect)
+                       for i in range(connections)]
+            for future in futures:
+                future.result()
+    
+    return downloaded_files
+
 def clean_downloaded_emails():
-    """Limpia el registro de correos descargados."""
+    """Limpia el registro de correos descargados y los puntos de control de sincronización."""
     try:
-        if os.path.exists(DOWNLOADED_EMAILS_FILE):
-            os.remove(DOWNLOADED_EMAILS_FILE)
-            # print("Registro de correos descargados eliminado.")
+        ledger.reset()
+        # print("Registro de correos descargados eliminado.")
     except Exception as e:
         # print(f"Error al limpiar el registro de correos: {e}")
         logging.error(f"Error al limpiar el registro de correos: {e}")
 
-def download_attachments(force_download=False):
+def sync_mailbox(mail, uidvalidity=None, connect=None):
     """
-    Conecta a Gmail y descarga archivos adjuntos y devuelve una lista de los archivos descargados.
+    Descarga los adjuntos de los correos nuevos usando una conexión ya abierta.
     
     Args:
-        force_download (bool): Si es True, fuerza la descarga incluso si ya existen.
+        mail (imaplib.IMAP4): Conexión IMAP con el buzón ya seleccionado (no se cierra).
+        uidvalidity (int, optional): UIDVALIDITY ya conocido del buzón.
+        connect (callable, optional): Función que abre conexiones adicionales.
+            Por defecto connect_imap.
         
     Returns:
         list: Lista de nombres de archivos descargados.
     """
-    # print("Iniciando descarga de correos...")
-    logging.info("Iniciando descarga de correos...")
-    downloaded_files = []  # Lista para almacenar los nombres de los archivos descargados
-    
-    # Si se fuerza la descarga, limpiar el registro de correos descargados
-    if force_download:
-        clean_downloaded_emails()
-    
-    # Conectar al servidor IMAP
-    mail = imaplib.IMAP4_SSL(IMAP_SERVER)
-    mail.login(EMAIL, PASSWORD)  # Codificar a UTF-8
-    mail.select('inbox')  # Selecciona la bandeja de entrada
-    
-    # Leer los IDs de correos ya descargados
-    downloaded_ids = set()
-    if os.path.exists(DOWNLOADED_EMAILS_FILE):
-        with open(DOWNLOADED_EMAILS_FILE, 'r') as log_file:
-            downloaded_ids = set(line.strip() for line in log_file)
+    # Leer el punto de control; si UIDVALIDITY cambió los UIDs guardados ya no son válidos
+    if uidvalidity is None:
+        uidvalidity = get_uidvalidity(mail)
+    state = ledger.get_sync_state(IMAP_SOURCE)
+    last_uid = state.get('last_uid', 0)
+    if state and state.get('uidvalidity') != uidvalidity:
+        logging.warning(f"UIDVALIDITY cambió ({state.get('uidvalidity')} -> {uidvalidity}). Sincronización completa...")
+        last_uid = 0
 
-    # Buscar correos que coincidan con el filtro
-    status, messages = mail.search(None, SEARCH_CRITERIA)
-    if status != 'OK':
+    # Buscar solo los correos nuevos que coincidan con el filtro
+    uids = search_new_uids(mail, last_uid)
+    if uids is None:
         # print("No se encontraron correos.")
         logging.info("No se encontraron correos.")
         return []
-    
-    # Obtener la lista de IDs de los correos
-    email_ids = messages[0].split()
 
-    if not email_ids:
+    if not uids:
         # print("No se encontraron correos con archivos adjuntos.")
-        logging.info("No se encontraron correos con archivos adjuntos.")
+        logging.info("No se encontraron correos nuevos con archivos adjuntos.")
         return []
 
     # Crear la carpeta para los archivos adjuntos
     if not os.path.exists(DOWNLOAD_FOLDER):
         os.makedirs(DOWNLOAD_FOLDER)
 
-    # Recorrer los correos
-    for email_id in email_ids:
-        email_id_str = email_id.decode()  # Decodificar el ID a cadena
-        if email_id_str in downloaded_ids and not force_download:
-            # print(f"Correo {email_id_str} ya descargado. Saltando...")
-            logging.info(f"Correo {email_id_str} ya descargado. Saltando...")
-            continue  # Saltar correos ya descargados
-
-        status, msg_data = mail.fetch(email_id, '(RFC822)')  # Obtener el correo completo
-        for response_part in msg_data:
-            if isinstance(response_part, tuple):
-                msg = email.message_from_bytes(response_part[1])
-
-                # Recorrer las partes del correo
-                for part in msg.walk():
-                    if part.get_content_maintype() == 'multipart':
-                        continue
-                    if part.get('Content-Disposition') is None:
-                        continue
-
-                    # Obtener el nombre del archivo adjunto
-                    filename = part.get_filename()
-                    if filename:
-                        # Decodificar el nombre del archivo si está en formato MIME
-                        decoded_header = decode_header(filename)
-                        filename = ''.join(
-                            str(t[0], t[1] if t[1] else 'utf-8') if isinstance(t[0], bytes) else t[0]
-                            for t in decoded_header
-                        )
-                        
-                        # Verificar si el tipo de archivo es soportado
-                        if not any(filename.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                            # print(f"Archivo {filename} no es un tipo soportado. Saltando...")
-                            logging.info(f"Archivo {filename} no es un tipo soportado. Saltando...")
-                            continue
-
-                        # Limpiar el nombre del archivo
-                        filename = clean_filename(filename)
-                        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-
-                        # Guardar el archivo adjunto
-                        with open(filepath, 'wb') as f:
-                            f.write(part.get_payload(decode=True))
-                        # print(f"Descargado: {filename}")
-                        logging.info(f"Descargado: {filename}")
-                        downloaded_files.append(filename)  # Agregar el nombre del archivo a la lista
-
-        # Registrar el ID del correo descargado
-        with open(DOWNLOADED_EMAILS_FILE, 'a') as log_file:
-            log_file.write(f"{email_id_str}\n")  # Escribir el ID como cadena
-
-    # Cerrar la conexión
-    mail.logout()
+    # Descargar los correos por lotes.
+    # Un mismo contenido recibido en varios correos se devuelve una sola vez.
+    downloaded_files = list(dict.fromkeys(download_uids(mail, uids, uidvalidity, last_uid, connect=connect)))
+
     # print(f"Archivos descargados: {downloaded_files}")
     logging.info(f"Archivos descargados: {downloaded_files}")
     return downloaded_files  # Devolver la lista de archivos descargados
 
+def download_attachments(force_download=False, connect=None):
+    """
+    Conecta a Gmail y descarga archivos adjuntos y devuelve una lista de los archivos descargados.
+    
+    Args:
+        force_download (bool): Si es True, fuerza la descarga incluso si ya existen.
+        connect (callable, optional): Función que abre una conexión IMAP autenticada
+            con el buzón seleccionado. Por defecto connect_imap.
+        
+    Returns:
+        list: Lista de nombres de archivos descargados.
+    """
+    # print("Iniciando descarga de correos...")
+    logging.info("Iniciando descarga de correos...")
+    
+    # Si se fuerza la descarga, limpiar el registro de correos descargados
+    if force_download:
+        clean_downloaded_emails()
+    
+    # Conectar al servidor IMAP
+    connect = connect or connect_imap
+    mail = connect()
+    try:
+        return sync_mailbox(mail, connect=connect)
+    finally:
+        close_imap(mail)
+
+def _buffered(mail):
+    """
+    Indica si ya hay datos del servidor listos para leer sin esperar.
+    
+    imaplib lee con un búfer (mail.file): una línea que llegó junto con la
+    anterior queda en el búfer y select no la ve. Se mira el búfer sin
+    bloquear; si está vacío, la lectura sin bloqueo también recoge los datos
+    que SSL ya descifró.
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+def idle_wait(mail, timeout):
+    """
+    Espera con IMAP IDLE (RFC 2177) hasta que llegue un correo o venza el tiempo.
+    
+    Args:
+        mail (imaplib.IMAP4): Conexión IMAP con el buzón ya seleccionado.
+        timeout (float): Segundos máximos de espera.
+        
+    Returns:
+        bool: True si el servidor avisó de correos nuevos (EXISTS).
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b' IDLE\r\n')
+    response = mail.readline()
+    if not response.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"El servidor rechazó IDLE: {response!r}")
+    
+    new_mail = False
+    deadline = time.monotonic() + timeout
+    while not new_mail:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # Las líneas que ya están en el búfer (o descifradas por SSL) no las detecta select
+        if not _buffered(mail):
+            readable, _, _ = select.select([mail.sock], [], [], remaining)
+            if not readable:
+                break
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("La conexión se cerró durante IDLE")
+        new_mail = bool(_EXISTS_RE.match(line))
+    
+    # Terminar IDLE y leer hasta la respuesta etiquetada
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("La conexión se cerró al terminar IDLE")
+        if line.startswith(tag):
+            break
+        new_mail = new_mail or bool(_EXISTS_RE.match(line))
+    # _new_tag deja la etiqueta pendiente en tagged_commands: quitarla para que no se acumulen
+    mail.tagged_commands.pop(tag, None)
+    return new_mail
+
+def poll_wait(mail, interval):
+    """
+    Espera `interval` segundos y consulta con NOOP si llegaron correos nuevos.
+    
+    Returns:
+        bool: True si el servidor avisó de correos nuevos (EXISTS).
+    """
+    time.sleep(interval)
+    mail.noop()
+    status, data = mail.response('EXISTS')
+    return bool(data) and data[0] is not None
+
+def watch_mailbox(callback, connect=None):
+    """
+    Mantiene una conexión abierta y procesa los correos nuevos en cuanto llegan.
+    
+    Usa IMAP IDLE si el servidor lo soporta y, si no, consulta con NOOP cada
+    WATCH_POLL_INTERVAL segundos. Al arrancar y con cada aviso de correo nuevo
+    se hace una sincronización incremental por UID sobre la misma conexión y se
+    llama a `callback` con los archivos descargados. Si la conexión se cae se
+    vuelve a conectar. Termina con Ctrl+C.
+    
+    Args:
+        callback (callable): Función que recibe la lista de archivos descargados.
+        connect (callable, optional): Función que abre una conexión IMAP autenticada
+            con el buzón seleccionado. Por defecto connect_imap.
+    """
+    logging.info("Iniciando modo watch...")
+    connect = connect or connect_imap
+    mail = None
+    retry_delay = 1
+    try:
+        while True:
+            try:
+                if mail is None:
+                    mail = connect()
+                    uidvalidity = get_uidvalidity(mail)
+                    supports_idle = 'IDLE' in mail.capabilities
+                    logging.info(f"Esperando correos nuevos ({'IDLE' if supports_idle else 'NOOP'})...")
+                    new_mail = True  # Sincronizar lo que llegó mientras no había conexión
+                elif supports_idle:
+                    new_mail = idle_wait(mail, WATCH_IDLE_TIMEOUT)
+                else:
+                    new_mail = poll_wait(mail, WATCH_POLL_INTERVAL)
+                
+                if new_mail:
+                    downloaded_files = sync_mailbox(mail, uidvalidity, connect)
+                    if downloaded_files:
+                        try:
+                            callback(downloaded_files)
+                        except Exception as e:
+                            logging.error(f"Error al procesar {downloaded_files}: {e}")
+                retry_delay = 1
+            except (imaplib.IMAP4.abort, OSError) as e:
+                logging.warning(f"Conexión perdida en modo watch: {e}. Reconectando en {retry_delay} s...")
+                if mail is not None:
+                    close_imap(mail)
+                mail = None
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 300)
+    except KeyboardInterrupt:
+        logging.info("Modo watch detenido.")
+    finally:
+        if mail is not None:
+            close_imap(mail)
+
 if __name__ == '__main__':
     downloaded_files = download_attachments()
     print(f"Archivos descargados: {downloaded_files}")
\ No newline at end of file
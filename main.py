@@ -12,12 +12,16 @@ Este script coordina el flujo de trabajo completo:
 """
 
 import os
+import re
 import sys
 import argparse
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
-from processors.financial_data import analyze_financial_data, generate_financial_report, clean_previous_reports
+from processors.financial_data import analyze_financial_data, clean_previous_reports
+from processors.consolidation import consolidate, render_consolidated_report
+from processors.report_generator import write_report, write_lines
+from processors import ledger, history
 
 # Importar los módulos del paquete processors
 import processors
@@ -38,6 +42,175 @@ logging.basicConfig(
     ]
 )
 
+def report_name(name, timestamp, prefix="informe_financiero"):
+    """
+    Genera el nombre del archivo de informe de un archivo u hoja.
+    
+    Args:
+        name (str): Nombre del archivo o '<archivo> [<hoja>]'.
+        timestamp (str): Fecha y hora de generación (AAAAMMDD_HHMMSS).
+        prefix (str): Tipo de informe.
+        
+    Returns:
+        str: Nombre único del informe dentro de la carpeta de reportes.
+    """
+    filename, _, sheet = name.partition(' [')
+    stem = os.path.splitext(filename)[0]
+    # Los archivos del almacén se llaman <sha256>: basta con el principio del hash
+    if re.fullmatch(r'[0-9a-f]{64}', stem):
+        stem = stem[:12]
+    suffix = re.sub(r'[^\w-]+', '_', f"{stem} {sheet.rstrip(']')}".strip()).strip('_')
+    return f"{prefix}_{timestamp}_{suffix}.txt"
+
+def previous_version(financial_data, content_hash, sheet=None):
+    """
+    Busca en el historial la versión anterior de un estado corregido.
+    
+    Args:
+        financial_data (FinancialStatement): Datos financieros del estado.
+        content_hash (str): SHA-256 del archivo.
+        sheet (str, optional): Hoja del libro de Excel.
+        
+    Returns:
+        tuple: (versión de history.find_version, entidad, periodo), o None si el
+            estado no está en el historial, no cambió o sus totales guardados no
+            se calcularon con las hojas (entonces se analiza completo).
+    """
+    periodo = history.statement_period(financial_data, content_hash)
+    if periodo is None:
+        return None
+    entidad = history.statement_entity(financial_data)
+    version = history.find_version(entidad, periodo, sheet)
+    if version is None or version['hash'] == content_hash:
+        return None
+    # Las diferencias de las hojas solo se pueden sumar a totales calculados con las hojas
+    if version['nivel'] is not None:
+        logging.info(f"El estado de {entidad} ({periodo}) se guardó con los totales del nivel "
+                     f"{version['nivel']}; se analiza completo")
+        return None
+    return version, entidad, periodo
+
+def process_files(downloaded_files, debug_mode=False, skip_processed=True, level=None, incremental=False, consolidated=None, compact=False):
+    """
+    Carga, analiza y genera el informe de cada archivo.
+    
+    Args:
+        downloaded_files (list): Lista de nombres de archivos en DOWNLOAD_FOLDER.
+        debug_mode (bool): Si es True, incluye información de debug en los informes.
+        skip_processed (bool): Si es True, omite el contenido ya procesado.
+        level (int, optional): Nivel del árbol de códigos con el que se
+            calculan los totales. Por defecto, las hojas.
+        incremental (bool): Si es True, los estados que ya están en el historial
+            con otro contenido se analizan a partir de su versión anterior y se
+            genera un informe de cambios.
+        consolidated (list, optional): Si se indica, se le añade una tupla
+            (entidad, periodo, datos financieros) por cada estado analizado,
+            para el informe consolidado.
+        compact (bool): Si es True, el detalle de las cuentas del informe es
+            compacto (una línea por cuenta y cada ruta de ancestros una sola vez).
+    """
+    # Paso 2: Preparar la carga y extracción de los archivos (omitiendo el contenido ya procesado).
+    # Los archivos se leen en paralelo a medida que se recorren y cada uno se libera
+    # en cuanto se escribe su informe.
+    extracted_data = processors.extract_files(downloaded_files, DOWNLOAD_FOLDER, skip_processed=skip_processed)
+    
+    if not extracted_data:
+        if skip_processed:
+            logging.info("No hay archivos nuevos para procesar.")
+        else:
+            logging.error("No se pudieron cargar los archivos.")
+        return
+    
+    # Paso 3: Procesar cada archivo
+    # Cada etapa queda registrada en el registro con su duración y su resultado;
+    # al terminar la etapa 'informe' el contenido queda marcado como procesado.
+    # Los libros con varias hojas de estados financieros generan un informe por hoja
+    # y sus etapas se registran por hoja.
+    for filename, financial_data in extracted_data.items():
+        content_hash = extracted_data.content_hash(filename)
+        sheet = extracted_data.sheet(filename)
+        
+        if not financial_data:
+            logging.error(f"No se pudieron extraer datos de {filename}")
+            ledger.record_stage(content_hash, 'informe', 'error', error='Sin datos extraídos', hoja=sheet)
+            continue
+        
+        # Modo incremental: un estado corregido se analiza a partir de su versión
+        # anterior en el historial, recalculando solo las cuentas que cambiaron
+        previous = None
+        if incremental and history.enabled():
+            previous = previous_version(financial_data, content_hash, sheet)
+        
+        if previous:
+            version, entidad, periodo = previous
+            with ledger.stage(content_hash, 'analisis', sheet):
+                anterior, resultados_anteriores = history.load_version(version['estado'])
+                analysis_results = processors.incremental_analysis(anterior, resultados_anteriores, financial_data)
+            logging.info(f"{filename}: versión corregida del estado de {entidad} ({periodo}), "
+                         f"{len(analysis_results['afectadas'])} cuentas afectadas")
+            
+            # Reemplazar en el historial solo las cuentas afectadas y las eliminadas
+            with ledger.stage(content_hash, 'historial', sheet):
+                eliminadas = [cuenta['codigo'] for cuenta in analysis_results['cambios']['eliminadas']]
+                history.replace_accounts(version['estado'], financial_data, analysis_results['afectadas'] + eliminadas,
+                                         analysis_results['niveles'], analysis_results['hojas'],
+                                         analysis_results, content_hash, nombre=filename)
+        else:
+            # Analizar los datos financieros
+            with ledger.stage(content_hash, 'analisis', sheet):
+                analysis_results = processors.analyze_financial_data(financial_data, level=level)
+            
+            # Guardar el estado en el historial para consultar su evolución (historial.py)
+            if history.enabled():
+                with ledger.stage(content_hash, 'historial', sheet):
+                    history.record(financial_data, analysis_results, content_hash,
+                                   nombre=filename, hoja=sheet, nivel=level)
+        
+        with ledger.stage(content_hash, 'informe', sheet):
+            # Crear directorio de reportes si no existe
+            os.makedirs("reportes", exist_ok=True)
+            
+            # Generar nombre de archivo con timestamp y el archivo u hoja de origen
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            prefix = "informe_cambios" if previous else "informe_financiero"
+            report_file = os.path.join("reportes", report_name(filename, timestamp, prefix))
+            
+            # Guardar informe (de cambios, si es una versión corregida); los informes
+            # se escriben a medida que se generan, sin armarlos en memoria
+            if previous:
+                write_lines(report_file, processors.render_change_report(analysis_results, entidad, periodo))
+            else:
+                write_report(report_file, financial_data, analysis_results, debug=debug_mode, compact=compact)
+        
+        logging.info(f"Informe guardado: {report_file}")
+        
+        if consolidated is not None:
+            periodo = history.statement_period(financial_data, content_hash) or 'sin periodo'
+            consolidated.append((history.statement_entity(financial_data), periodo, financial_data))
+    
+    # Un libro con varias hojas queda procesado cuando todas sus hojas tienen informe;
+    # si falta alguna, la siguiente ejecución procesa solo las que faltan
+    for content_hash, sheets in extracted_data.contents().items():
+        ledger.finish_sheets(content_hash, sheets)
+
+def write_consolidated_report(statements, level=None):
+    """
+    Analiza juntos los estados procesados y guarda el informe consolidado.
+    
+    Args:
+        statements (list): Tuplas (entidad, periodo, datos financieros).
+        level (int, optional): Nivel del árbol de códigos con el que se
+            calculan los totales. Por defecto, las hojas.
+    """
+    if not statements:
+        return
+    results = consolidate(statements, level=level)
+    os.makedirs("reportes", exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_file = os.path.join("reportes", f"informe_consolidado_{timestamp}.txt")
+    write_lines(report_file, render_consolidated_report(results))
+    logging.info(f"Informe consolidado de {results['estados']} estados guardado: {report_file}")
+
 def main():
     """
     Función principal que coordina el flujo de trabajo.
@@ -47,9 +220,17 @@ def main():
     parser.add_argument('--debug', action='store_true', help='Modo debug (fuerza la descarga de correos)')
     parser.add_argument('--no-email', action='store_true', help='No descargar correos, usar archivos existentes')
     parser.add_argument('--output', type=str, default=REPORTS_FOLDER, help='Carpeta de salida para los informes')
+    parser.add_argument('--reprocesar', action='store_true', help='Procesar también los archivos ya procesados')
+    parser.add_argument('--watch', action='store_true', help='Mantener la conexión abierta y procesar los correos en cuanto llegan')
+    parser.add_argument('--nivel', type=int, default=None, help='Calcular los totales con las cuentas de este nivel del árbol de códigos (0 = cuentas sin padre) en lugar de con las hojas')
+    parser.add_argument('--compacto', action='store_true', help='Detalle de cuentas compacto en los informes: una línea por cuenta y cada ruta de ancestros una sola vez')
+    parser.add_argument('--consolidado', action='store_true', help='Generar además un informe consolidado de todos los estados procesados (por entidad y por periodo)')
+    parser.add_argument('--incremental', action='store_true', help='Analizar los estados corregidos a partir de su versión anterior en el historial y generar un informe de cambios')
     
     # Parsear los argumentos
     args = parser.parse_args()
+    if args.incremental and args.nivel is not None:
+        parser.error("--incremental calcula los totales con las hojas; no se puede usar con --nivel")
     
     # Crear la carpeta de informes si no existe
     if not os.path.exists(args.output):
@@ -57,12 +238,22 @@ def main():
     
     # Verificar si estamos en modo debug
     debug_mode = args.debug
+    skip_processed = not (debug_mode or args.reprocesar)
     
     try:
         # Limpiar reportes anteriores si estamos en modo debug
         if debug_mode:
             clean_previous_reports(debug=True)
         
+        # Modo watch: procesar cada correo nuevo en cuanto llega
+        if args.watch:
+            if debug_mode:
+                processors.clean_downloaded_emails()
+            processors.watch_mailbox(
+                lambda files: process_files(files, debug_mode=debug_mode, skip_processed=skip_processed, level=args.nivel, incremental=args.incremental, compact=args.compacto)
+            )
+            return
+        
         # Paso 1: Descargar archivos adjuntos de correos electrónicos
         if args.debug:
             processors.clean_downloaded_emails()
@@ -76,40 +267,14 @@ def main():
             logging.error("No hay archivos para procesar.")
             return
         
-        # Paso 2: Cargar archivos
-        loaded_data = processors.load_files(downloaded_files, DOWNLOAD_FOLDER)
+        # Pasos 2 y 3: Cargar, analizar y generar los informes
+        consolidated = [] if args.consolidado else None
+        process_files(downloaded_files, debug_mode=debug_mode, skip_processed=skip_processed, level=args.nivel,
+                      incremental=args.incremental, consolidated=consolidated, compact=args.compacto)
         
-        if not loaded_data:
-            logging.error("No se pudieron cargar los archivos.")
-            return
-        
-        # Paso 3: Procesar cada archivo
-        for filename in loaded_data:
-            # Extraer datos financieros
-            financial_data = processors.extract_financial_data(loaded_data[filename])
-            
-            if not financial_data:
-                logging.error(f"No se pudieron extraer datos de {filename}")
-                continue
-            
-            # Analizar los datos financieros
-            analysis_results = processors.analyze_financial_data(financial_data)
-            
-            # Generar informe
-            report = generate_financial_report(financial_data, analysis_results, debug=debug_mode)
-            
-            # Crear directorio de reportes si no existe
-            os.makedirs("reportes", exist_ok=True)
-            
-            # Generar nombre de archivo con timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            report_file = f"reportes/informe_financiero_{timestamp}.txt"
-            
-            # Guardar informe
-            with open(report_file, "w", encoding="utf-8") as f:
-                f.write(report)
-            
-            logging.info(f"Informe guardado: {report_file}")
+        # Informe consolidado de todos los estados procesados
+        if args.consolidado:
+            write_consolidated_report(consolidated, level=args.nivel)
         
     except Exception as e:
         logging.error(f"Error: {str(e)}")
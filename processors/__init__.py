@@ -5,20 +5,59 @@ Este paquete contiene módulos para procesar correos electrónicos,
 cargar archivos, extraer y analizar datos financieros, y generar informes.
 """
 
-from processors.email_processor import download_attachments, clean_downloaded_emails
-from processors.file_processor import load_files, get_available_files
+from processors.email_processor import download_attachments, clean_downloaded_emails, watch_mailbox
+from processors.file_processor import load_files, extract_files, get_available_files
 from processors.financial_data import extract_financial_data, analyze_financial_data, clasificar_cuenta, clasificar_categoria
-from processors.report_generator import generate_report, export_to_excel
+from processors.financial_data import clasificar_cuentas, clasificar_categorias
+from processors.statement import FinancialStatement, as_statement
+from processors.amounts import parse_amounts, detect_decimal_separator
+from processors.hierarchy import CodeIndex
+from processors.rollup import rollup, level_mask
+from processors.aggregation import aggregate_matrix
+from processors.categories import get_classifier, reload_rules
+from processors.report_generator import generate_report, render_report, write_report, write_lines, export_to_excel
+from processors.ledger import mark_processed
+from processors.history import account_series, category_series, with_changes
+from processors.incremental import diff_statements, incremental_analysis, render_change_report
+from processors.consolidation import StatementBatch, consolidate
+from processors.mail_sources import get_mail_source
 
 __all__ = [
     'download_attachments',
     'clean_downloaded_emails',
+    'watch_mailbox',
     'load_files',
+    'extract_files',
     'get_available_files',
     'extract_financial_data',
     'analyze_financial_data',
     'clasificar_cuenta',
     'clasificar_categoria',
+    'clasificar_cuentas',
+    'clasificar_categorias',
+    'FinancialStatement',
+    'as_statement',
+    'parse_amounts',
+    'detect_decimal_separator',
+    'CodeIndex',
+    'rollup',
+    'level_mask',
+    'aggregate_matrix',
+    'get_classifier',
+    'reload_rules',
     'generate_report',
-    'export_to_excel'
+    'render_report',
+    'write_report',
+    'write_lines',
+    'export_to_excel',
+    'mark_processed',
+    'account_series',
+    'category_series',
+    'with_changes',
+    'diff_statements',
+    'incremental_analysis',
+    'render_change_report',
+    'StatementBatch',
+    'consolidate',
+    'get_mail_source'
 ] 
\ No newline at end of file
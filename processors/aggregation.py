@@ -0,0 +1,66 @@
+"""
+Sumas por grupo de los valores de un estado financiero.
+
+El tipo y la categoría de cada cuenta ya son códigos enteros (pd.Categorical),
+así que las sumas por tipo, por categoría o por nivel se hacen de una vez con
+np.bincount en lugar de recorrer las cuentas o crear una máscara por grupo.
+np.bincount acumula los valores en el orden de las cuentas, así cada suma da
+exactamente lo mismo que sumarlos uno a uno.
+"""
+
+import numpy as np
+
+def sum_by_code(codes, valores, size, mask=None):
+    """
+    Suma los valores de cada código de grupo.
+
+    Args:
+        codes (numpy.ndarray): Código de grupo de cada cuenta (enteros; los
+            negativos, como los nulos de un pd.Categorical, se ignoran).
+        valores (numpy.ndarray): Valor de cada cuenta.
+        size (int): Número de grupos.
+        mask (numpy.ndarray, optional): Cuentas que se suman. Por defecto, todas.
+
+    Returns:
+        numpy.ndarray: Suma de cada grupo (0 para los grupos sin cuentas).
+    """
+    codes = np.asarray(codes)
+    selected = codes >= 0
+    if mask is not None:
+        selected &= mask
+    return np.bincount(codes[selected], weights=valores[selected], minlength=size)
+
+def aggregate_matrix(statement, depths):
+    """
+    Suma los valores por tipo, categoría y nivel del árbol de códigos.
+
+    Cada nivel suma las cuentas que están a esa profundidad, así que un mismo
+    valor aparece en varios niveles (la cuenta padre y sus subcuentas); para
+    obtener totales sin doble conteo se usa un solo nivel o las hojas.
+
+    Args:
+        statement (FinancialStatement): Datos financieros.
+        depths (numpy.ndarray): Nivel de cada cuenta (ver processors.rollup.code_depths).
+
+    Returns:
+        dict: 'tipos', 'categorias' y 'niveles' (las etiquetas de cada eje) y
+            'valores', un numpy.ndarray de forma (tipos, categorías, niveles)
+            con la suma de cada combinación.
+    """
+    tipos = statement.tipos.categories.tolist()
+    categorias = statement.categorias.categories.tolist()
+    niveles = list(range(int(depths.max()) + 1)) if len(depths) else []
+
+    shape = (len(tipos), len(categorias), len(niveles))
+    codes = np.full(len(statement), -1, dtype=np.int64)
+    valid = (statement.tipos.codes >= 0) & (statement.categorias.codes >= 0)
+    codes[valid] = np.ravel_multi_index(
+        (statement.tipos.codes[valid], statement.categorias.codes[valid], depths[valid]), shape)
+    valores = sum_by_code(codes, statement.valores, int(np.prod(shape)))
+
+    return {
+        'tipos': tipos,
+        'categorias': categorias,
+        'niveles': niveles,
+        'valores': valores.astype('float64').reshape(shape)
+    }
@@ -0,0 +1,163 @@
+"""
+Conversión de importes de texto a número por columnas.
+
+Los valores de un estado financiero llegan como texto en formatos muy
+distintos: "$1,234.50", "-1.234.567,89", "(5.000)", "1 234,5 COP", "300-"...
+parse_amounts convierte una columna completa de una vez:
+
+- Los separadores de miles y decimales se detectan por columna
+  (detect_decimal_separator): si un valor tiene los dos, el último es el
+  decimal; un separador repetido es de miles; uno solo seguido de un número de
+  dígitos distinto de 3 es decimal. Si no hay pistas se usa
+  AMOUNT_DECIMAL_SEPARATOR.
+- Son negativos los valores entre paréntesis, con el signo menos delante o
+  con el signo menos detrás.
+- Se eliminan los símbolos y códigos de moneda y los espacios.
+
+Los textos que no quedan como un número válido (letras, varios signos, miles
+mal agrupados como "1.2.3") se rechazan en lugar de adivinar su valor, y se
+cuentan para poder avisar.
+"""
+
+import os
+import re
+from dotenv import load_dotenv
+import numpy as np
+import pandas as pd
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Separador decimal cuando una columna no permite deducirlo ("1,234" o "1.234"): '.' o ','
+AMOUNT_DECIMAL_SEPARATOR = os.getenv('AMOUNT_DECIMAL_SEPARATOR', '.')
+
+# Símbolos y códigos de moneda que se eliminan de los importes
+CURRENCY_RE = r'(?i)US\$|COP|USD|EUR|MXN|[$€£¥]'
+
+def _number_re(decimal, thousands):
+    """Expresión de un importe sin signo: grupos de miles de tres dígitos (o sin agrupar) y decimales opcionales."""
+    decimal, thousands = re.escape(decimal), re.escape(thousands)
+    integer = rf"[0-9]+(?:[{thousands}'][0-9]{{3}})*"
+    return rf"(?:{integer})(?:{decimal}[0-9]*)?|{decimal}[0-9]+"
+
+def text_mask(series):
+    """Indica qué valores de una Serie son cadenas de texto."""
+    if pd.api.types.is_string_dtype(series.dtype) and series.dtype != object:
+        return series.notna().to_numpy()
+    if series.dtype != object:
+        return np.zeros(len(series), dtype=bool)
+    return np.fromiter((isinstance(value, str) for value in series.to_numpy()), dtype=bool, count=len(series))
+
+def _normalize(textos):
+    """
+    Quita espacios y moneda y separa el signo.
+
+    Returns:
+        tuple: (textos sin signo, máscara de negativos, máscara de signos inválidos).
+    """
+    textos = textos.str.replace(r'\s+', '', regex=True).str.replace('−', '-', regex=False)
+    textos = textos.str.replace(CURRENCY_RE, '', regex=True)
+
+    parentheses = (textos.str.startswith('(') & textos.str.endswith(')')).to_numpy(dtype=bool)
+    textos = textos.where(~parentheses, textos.str[1:-1])
+    leading = textos.str.startswith('-').to_numpy(dtype=bool)
+    textos = textos.where(~leading, textos.str[1:])
+    trailing = textos.str.endswith('-').to_numpy(dtype=bool)
+    textos = textos.where(~trailing, textos.str[:-1])
+
+    signs = parentheses.astype(int) + leading + trailing
+    return textos, signs == 1, signs > 1
+
+def _vote_decimal(textos):
+    """Separador decimal con más votos en unos textos ya normalizados, o None si hay empate."""
+    dots = textos.str.count(r'\.').to_numpy()
+    commas = textos.str.count(',').to_numpy()
+    lengths = textos.str.len().to_numpy()
+    last_dot = textos.str.rfind('.').to_numpy()
+    last_comma = textos.str.rfind(',').to_numpy()
+
+    both = (dots > 0) & (commas > 0)
+    only_dots = (dots > 0) & (commas == 0)
+    only_commas = (commas > 0) & (dots == 0)
+
+    # Votos a favor de '.' y de ',' como separador decimal
+    dot_votes = (both & (last_dot > last_comma)) | (only_commas & (commas > 1)) \
+        | (only_dots & (dots == 1) & (lengths - last_dot - 1 != 3))
+    comma_votes = (both & (last_comma > last_dot)) | (only_dots & (dots > 1)) \
+        | (only_commas & (commas == 1) & (lengths - last_comma - 1 != 3))
+    dot_votes, comma_votes = int(dot_votes.sum()), int(comma_votes.sum())
+    if dot_votes != comma_votes:
+        return '.' if dot_votes > comma_votes else ','
+    return None
+
+def detect_decimal_separator(valores, default=None):
+    """
+    Detecta el separador decimal de una columna de importes.
+
+    Args:
+        valores (pd.Series): Valores de la columna (los que no son texto se ignoran).
+        default (str, optional): Separador si la columna no permite deducirlo.
+            Por defecto AMOUNT_DECIMAL_SEPARATOR.
+
+    Returns:
+        str: '.' o ','.
+    """
+    default = default or AMOUNT_DECIMAL_SEPARATOR
+    is_text = text_mask(valores)
+    if not is_text.any():
+        return default
+    textos, _, _ = _normalize(valores[is_text].astype(object))
+    return _vote_decimal(textos) or default
+
+def parse_amounts(valores, decimal=None):
+    """
+    Convierte a float una columna de importes sin nulos.
+
+    Args:
+        valores (pd.Series): Valores de la columna (texto, números o una mezcla).
+        decimal (str, optional): Separador decimal ('.' o ','). Por defecto se
+            detecta en la propia columna con detect_decimal_separator.
+
+    Returns:
+        tuple: (valores como ndarray de float64, máscara de los que se pudieron
+            convertir). Los rechazados son los False de la máscara.
+    """
+    count = len(valores)
+    if pd.api.types.is_numeric_dtype(valores.dtype):
+        return valores.to_numpy(dtype='float64'), np.ones(count, dtype=bool)
+
+    values = np.full(count, np.nan)
+    parsed = np.zeros(count, dtype=bool)
+    is_text = text_mask(valores)
+
+    if is_text.any():
+        positions = np.flatnonzero(is_text)
+        textos, negative, invalid = _normalize(valores[is_text].astype(object))
+        decimal = decimal or _vote_decimal(textos) or AMOUNT_DECIMAL_SEPARATOR
+        thousands = ',' if decimal == '.' else '.'
+
+        valid = textos.str.fullmatch(_number_re(decimal, thousands)).to_numpy(dtype=bool) & ~invalid
+        textos = textos[valid].str.replace(thousands, '', regex=False).str.replace("'", '', regex=False)
+        if decimal == ',':
+            textos = textos.str.replace(',', '.', regex=False)
+
+        numbers = textos.to_numpy(dtype=object).astype('float64')
+        values[positions[valid]] = np.where(negative[valid], -numbers, numbers)
+        parsed[positions[valid]] = True
+
+    # Valores que no son texto (números en columnas de tipo object)
+    other_positions = np.flatnonzero(~is_text)
+    if len(other_positions):
+        others = valores.to_numpy(dtype=object)[other_positions]
+        try:
+            values[other_positions] = others.astype('float64')
+            parsed[other_positions] = True
+        except (ValueError, TypeError):
+            for position, value in zip(other_positions, others):
+                try:
+                    values[position] = float(value)
+                    parsed[position] = True
+                except (ValueError, TypeError):
+                    pass
+
+    return values, parsed
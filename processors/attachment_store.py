@@ -0,0 +1,86 @@
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from dotenv import load_dotenv
+import logging
+
+# Cargar variables de entorno
+load_dotenv()
+
+DOWNLOAD_FOLDER = os.getenv('DOWNLOAD_FOLDER')
+
+_HASH_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+_lock = threading.Lock()
+
+def file_sha256(filepath):
+    """
+    Calcula el hash SHA-256 de un archivo.
+
+    Los archivos guardados por el almacén ya se llaman <hash>.<extensión>,
+    así que en ese caso el hash se toma del nombre sin volver a leer el archivo.
+
+    Args:
+        filepath (str): Ruta del archivo.
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal.
+    """
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    if _HASH_NAME_RE.match(stem):
+        return stem
+
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def store_attachment(chunks, original_name, download_folder=None):
+    """
+    Guarda un adjunto en el almacén direccionado por contenido.
+
+    El contenido se escribe por fragmentos en un archivo temporal mientras se
+    calcula su SHA-256. Si ese contenido ya existe el temporal se descarta; si
+    no, se renombra de forma atómica a <hash>.<extensión>. El registro del
+    adjunto (nombres originales y correos de origen) lo hace quien llama, en la
+    misma transacción que el correo.
+
+    Args:
+        chunks (iterable): Fragmentos (bytes) del contenido decodificado.
+        original_name (str): Nombre original del adjunto.
+        download_folder (str, optional): Carpeta del almacén.
+            Si no se proporciona, se usa la variable de entorno DOWNLOAD_FOLDER.
+
+    Returns:
+        dict: 'hash', 'archivo' (nombre almacenado), 'nombre' (original) y
+            'nuevo' (True si el contenido no estaba almacenado).
+    """
+    download_folder = download_folder or DOWNLOAD_FOLDER
+    extension = os.path.splitext(original_name)[1].lower()
+    sha256 = hashlib.sha256()
+
+    tmp = tempfile.NamedTemporaryFile(dir=download_folder, prefix='.', suffix='.part', delete=False)
+    try:
+        with tmp:
+            for chunk in chunks:
+                sha256.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+
+    content_hash = sha256.hexdigest()
+    stored_name = f"{content_hash}{extension}"
+    stored_path = os.path.join(download_folder, stored_name)
+    with _lock:
+        is_new = not os.path.exists(stored_path)
+        if is_new:
+            os.replace(tmp.name, stored_path)
+        else:
+            os.remove(tmp.name)
+
+    if not is_new:
+        logging.info(f"Adjunto {original_name} duplicado, ya almacenado como {stored_name}")
+    return {'hash': content_hash, 'archivo': stored_name, 'nombre': original_name, 'nuevo': is_new}
@@ -0,0 +1,154 @@
+"""
+Clasificación de cuentas en categorías según reglas por prefijo de código.
+
+Las reglas se leen de CATEGORIAS_FILE (por defecto categorias.json en la raíz
+del proyecto; también .yaml/.yml si PyYAML está instalado):
+
+    {
+      "por_defecto": "otros",
+      "excluir": {"3": "Patrimonio"},
+      "categorias": {
+        "animales": {"1445": "Semovientes"},
+        "legal": {"2365": "Retención en la fuente", "25": "Obligaciones laborales"},
+        "otros": {}
+      }
+    }
+
+Cada categoría tiene sus prefijos de código (un diccionario prefijo ->
+comentario o una lista de prefijos). Los prefijos de "excluir" llevan a la
+categoría por defecto. Gana el prefijo más largo que coincida, así una regla
+para una subcuenta ("144505") tiene prioridad sobre la de su cuenta ("1445").
+
+Las reglas se compilan una sola vez en un índice prefijo -> categoría: para
+clasificar un código solo se consultan sus prefijos de las longitudes que
+aparecen en las reglas, así el coste no crece con el número de reglas. Los
+resultados de cada código se memorizan.
+"""
+
+import os
+import json
+from functools import lru_cache
+from dotenv import load_dotenv
+import pandas as pd
+import logging
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Archivo de reglas de categorías (JSON, o YAML si PyYAML está instalado)
+CATEGORIAS_FILE = os.getenv('CATEGORIAS_FILE') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'categorias.json')
+
+# Códigos distintos cuyo resultado se memoriza
+CACHE_SIZE = 65536
+
+class CategoryClassifier:
+    """
+    Clasificador de códigos de cuenta por el prefijo más largo.
+
+    Args:
+        categorias (dict): categoría -> prefijos (lista o diccionario prefijo -> comentario).
+        excluir (iterable): Prefijos que se clasifican en la categoría por defecto.
+        por_defecto (str): Categoría de los códigos sin ninguna regla.
+
+    Raises:
+        ValueError: Si un prefijo aparece en más de una regla.
+    """
+
+    def __init__(self, categorias, excluir=(), por_defecto='otros'):
+        self.categorias = {categoria: list(prefijos) for categoria, prefijos in categorias.items()}
+        self.por_defecto = por_defecto
+
+        self._rules = {}
+        rules = [(prefijo, categoria) for categoria, prefijos in self.categorias.items() for prefijo in prefijos]
+        rules += [(prefijo, por_defecto) for prefijo in excluir]
+        for prefijo, categoria in rules:
+            prefijo = str(prefijo)
+            if not prefijo:
+                raise ValueError(f"Prefijo vacío en la categoría '{categoria}'")
+            if prefijo in self._rules:
+                raise ValueError(f"El prefijo {prefijo} está en '{self._rules[prefijo]}' y en '{categoria}'")
+            self._rules[prefijo] = categoria
+        # Longitudes de prefijo que hay que consultar, de la más larga a la más corta
+        self._lengths = sorted({len(prefijo) for prefijo in self._rules}, reverse=True)
+        self.classify = lru_cache(maxsize=CACHE_SIZE)(self._classify)
+
+    def _classify(self, codigo):
+        """Devuelve la categoría de un código de cuenta (texto)."""
+        for length in self._lengths:
+            if length <= len(codigo):
+                categoria = self._rules.get(codigo[:length])
+                if categoria is not None:
+                    return categoria
+        return self.por_defecto
+
+    def classify_many(self, codigos):
+        """
+        Clasifica un arreglo de códigos de una vez.
+
+        Cada código distinto se clasifica una sola vez y el resultado se
+        reparte entre todas sus apariciones.
+
+        Args:
+            codigos (iterable): Códigos de cuenta como texto.
+
+        Returns:
+            list: Categoría de cada código, en el mismo orden.
+        """
+        positions, uniques = pd.factorize(pd.Series(list(codigos), dtype=object))
+        if not len(positions):
+            return []
+        categorias = pd.Series([self.classify(codigo) for codigo in uniques], dtype=object)
+        return categorias.to_numpy()[positions].tolist()
+
+    def order(self):
+        """Categorías en el orden del archivo de reglas, con la categoría por defecto al final."""
+        order = [categoria for categoria in self.categorias if categoria != self.por_defecto]
+        return order + [self.por_defecto]
+
+def load_rules(path=None):
+    """
+    Lee un archivo de reglas de categorías y lo compila.
+
+    Args:
+        path (str, optional): Ruta del archivo. Por defecto CATEGORIAS_FILE.
+
+    Returns:
+        CategoryClassifier: Clasificador con las reglas del archivo.
+    """
+    path = path or CATEGORIAS_FILE
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            import yaml
+
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+
+    classifier = CategoryClassifier(
+        config.get('categorias', {}),
+        config.get('excluir', ()),
+        config.get('por_defecto', 'otros')
+    )
+    logging.debug(f"Reglas de categorías cargadas de {path}: {len(classifier._rules)} prefijos")
+    return classifier
+
+_classifier = None
+
+def get_classifier():
+    """Devuelve el clasificador de CATEGORIAS_FILE, cargándolo la primera vez."""
+    global _classifier
+    if _classifier is None:
+        _classifier = load_rules()
+    return _classifier
+
+def reload_rules(path=None):
+    """
+    Vuelve a leer las reglas (por ejemplo, después de editar el archivo).
+
+    Returns:
+        CategoryClassifier: El nuevo clasificador.
+    """
+    global _classifier
+    _classifier = load_rules(path)
+    return _classifier
@@ -0,0 +1,248 @@
+"""
+Análisis consolidado de muchos estados financieros a la vez.
+
+Para ver todas las entidades juntas o todos los meses de un año, en lugar de
+analizar cada estado por separado (analyze_financial_data) los estados se
+apilan en un solo FinancialStatement (StatementBatch) con el número de estado
+de cada cuenta, y su entidad y su periodo. Sobre esas columnas todo se calcula
+de una vez:
+
+- El nivel de cada cuenta y si es hoja se obtienen con claves enteras
+  (estado, código): una pasada por cada longitud de código para buscar los
+  prefijos de todas las cuentas de todos los estados, sin crear un árbol de
+  códigos por estado.
+- Las sumas por tipo, por categoría y de cada total se hacen con np.bincount
+  (processors.aggregation) sobre claves (grupo, tipo) y (grupo, categoría),
+  para el consolidado, cada entidad, cada periodo y cada estado.
+"""
+
+import numpy as np
+import pandas as pd
+from processors.statement import FinancialStatement, as_statement
+from processors.financial_data import TOTALES_POR_TIPO
+from processors.aggregation import sum_by_code
+from processors.report_generator import ordered_categories
+
+# Claves de los totales, en el orden de TOTALES_POR_TIPO
+TOTALES = list(dict.fromkeys(TOTALES_POR_TIPO.values()))
+
+class StatementBatch:
+    """
+    Varios estados financieros apilados por columnas.
+
+    Args:
+        statement (FinancialStatement): Cuentas de todos los estados, uno detrás de otro.
+        estados (iterable): Número de estado (posición en entidades y periodos) de cada cuenta.
+        entidades (iterable): Entidad de cada estado.
+        periodos (iterable): Periodo de cada estado (AAAA-MM).
+    """
+
+    def __init__(self, statement, estados, entidades, periodos):
+        self.statement = statement
+        self.estados = np.asarray(estados, dtype=np.int64)
+        self.entidades = list(entidades)
+        self.periodos = list(periodos)
+        self._tree = None
+
+    @classmethod
+    def from_statements(cls, statements):
+        """
+        Apila estados financieros.
+
+        Args:
+            statements (iterable): Tuplas (entidad, periodo, estado), con el
+                estado como FinancialStatement o lista de diccionarios.
+
+        Returns:
+            StatementBatch: Estados apilados, en el orden recibido.
+        """
+        entidades, periodos, partes = [], [], []
+        for entidad, periodo, statement in statements:
+            entidades.append(entidad)
+            periodos.append(periodo)
+            partes.append(as_statement(statement))
+        estados = np.repeat(np.arange(len(partes), dtype=np.int64), [len(parte) for parte in partes])
+        return cls(FinancialStatement.concat(partes), estados, entidades, periodos)
+
+    def __len__(self):
+        return len(self.entidades)
+
+    def tree(self):
+        """
+        Nivel de cada cuenta en el árbol de códigos de su estado y si es hoja
+        (se calculan la primera vez).
+
+        Un código es ancestro de otro del mismo estado si es un prefijo suyo,
+        como en processors.hierarchy.CodeIndex.
+
+        Returns:
+            tuple: (numpy.ndarray con el nivel de cada cuenta, numpy.ndarray
+                booleano que indica las hojas), en el orden de las cuentas.
+        """
+        if self._tree is None:
+            codigos = self.statement.codigos.astype(str)
+            # Identificador de cada código en el orden de los códigos distintos (pocos
+            # aunque haya muchos estados: suelen compartir el plan de cuentas)
+            ids, distintos = pd.factorize(codigos)
+            order = np.argsort(distintos)
+            distintos = distintos[order].astype(str)
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            ids = rank[ids]
+            # Clave entera (estado, código) de cada cuenta y claves presentes, ordenadas
+            keys = self.estados * len(distintos) + ids
+            presentes = np.sort(keys)
+            lengths = np.char.str_len(codigos)
+            depths = np.zeros(len(codigos), dtype=np.int64)
+            padres = []
+            for length in np.unique(lengths).tolist():
+                longer = np.flatnonzero(lengths > length)
+                if not len(longer):
+                    break
+                prefijos = codigos[longer].astype(f'<U{length}')
+                positions = np.minimum(np.searchsorted(distintos, prefijos), len(distintos) - 1)
+                prefix_keys = self.estados[longer] * len(distintos) + positions
+                found = (distintos[positions] == prefijos) & _contains(presentes, prefix_keys)
+                depths[longer[found]] += 1
+                padres.append(prefix_keys[found])
+            padres = np.sort(np.concatenate(padres)) if padres else np.empty(0, dtype=np.int64)
+            self._tree = depths, ~_contains(padres, keys)
+        return self._tree
+
+    def set_tree(self, depths, leaves):
+        """Fija el nivel de cada cuenta y si es hoja (por ejemplo, los guardados en el historial)."""
+        self._tree = np.asarray(depths, dtype=np.int64), np.asarray(leaves, dtype=bool)
+
+def _contains(sorted_keys, keys):
+    """Indica qué claves están en un arreglo ordenado de claves (puede tener repetidas)."""
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+def _group_sums(groups, size, codes, width, valores, sumar):
+    """Suma y número de cuentas de cada par (grupo, código), como matrices (grupos, códigos)."""
+    codes = np.asarray(codes, dtype=np.int64)
+    keys = np.where(codes >= 0, groups * width + codes, -1)
+    sums = sum_by_code(keys, valores, size * width, sumar).reshape(size, width)
+    counts = np.bincount(keys[keys >= 0], minlength=size * width).reshape(size, width)
+    return sums, counts
+
+def _group_results(batch, groups, size, sumar):
+    """Resultados (como los de analyze_financial_data) de cada grupo de estados."""
+    statement = batch.statement
+    valores = statement.valores
+    tipo_names = statement.tipos.categories.tolist()
+    categoria_names = statement.categorias.categories.tolist()
+    tipo_order = [code for code in pd.unique(statement.tipos.codes) if code >= 0]
+    categoria_order = [code for code in pd.unique(statement.categorias.codes) if code >= 0]
+
+    por_tipo, tipo_counts = _group_sums(groups, size, statement.tipos.codes, len(tipo_names), valores, sumar)
+    por_categoria, categoria_counts = _group_sums(
+        groups, size, statement.categorias.codes, len(categoria_names), valores, sumar)
+    # Cada tipo se lleva a la clave de su total (costos y costos de producción juntos)
+    total_of_tipo = np.array([TOTALES.index(TOTALES_POR_TIPO[tipo]) if tipo in TOTALES_POR_TIPO else -1
+                              for tipo in tipo_names] + [-1], dtype=np.int64)[statement.tipos.codes]
+    totales, total_counts = _group_sums(groups, size, total_of_tipo, len(TOTALES), valores, sumar)
+    registros = np.bincount(groups, minlength=size)
+
+    results = []
+    for group in range(size):
+        result = {
+            'total_registros': int(registros[group]),
+            'por_tipo': {tipo_names[code]: float(por_tipo[group, code])
+                         for code in tipo_order if tipo_counts[group, code]},
+            'por_categoria': {categoria_names[code]: float(por_categoria[group, code])
+                              for code in categoria_order if categoria_counts[group, code]}
+        }
+        for code, total in enumerate(TOTALES):
+            if total_counts[group, code]:
+                result[total] = float(totales[group, code])
+        result['utilidad'] = result.get('total_ingresos', 0) - result.get('total_gastos', 0) - result.get('total_costos', 0)
+        results.append(result)
+    return results
+
+def consolidate(statements, level=None):
+    """
+    Analiza varios estados financieros juntos: el consolidado de todos, cada
+    entidad, cada periodo y cada estado.
+
+    Los totales se calculan, como en analyze_financial_data, solo con las hojas
+    del árbol de códigos de cada estado o con las cuentas de un nivel.
+
+    Args:
+        statements (StatementBatch|iterable): Estados apilados o tuplas
+            (entidad, periodo, estado).
+        level (int, optional): Nivel del árbol con el que se calculan los
+            totales (0 = cuentas sin padre). Por defecto, las hojas.
+
+    Returns:
+        dict: 'consolidado' (resultados de todos los estados juntos, con
+            'total_registros', 'por_tipo', 'por_categoria', los total_* y
+            'utilidad'), 'por_entidad' y 'por_periodo' (entidad o periodo ->
+            resultados, con los periodos ordenados), 'estados' (número de
+            estados) y 'tabla' (pd.DataFrame con una fila por estado: entidad,
+            periodo, registros y totales).
+    """
+    batch = statements if isinstance(statements, StatementBatch) else StatementBatch.from_statements(statements)
+    depths, leaves = batch.tree()
+    # Cuentas que entran en los totales (las hojas o las del nivel pedido)
+    sumar = leaves if level is None else (depths == level) | (leaves & (depths < level))
+    estados = batch.estados
+
+    entidades = list(dict.fromkeys(batch.entidades))
+    periodos = sorted(set(batch.periodos))
+    entidad_of = np.array([entidades.index(entidad) for entidad in batch.entidades] + [-1], dtype=np.int64)
+    periodo_of = np.array([periodos.index(periodo) for periodo in batch.periodos] + [-1], dtype=np.int64)
+
+    por_estado = _group_results(batch, estados, len(batch), sumar)
+    tabla = pd.DataFrame({
+        'entidad': batch.entidades,
+        'periodo': batch.periodos,
+        'registros': [result['total_registros'] for result in por_estado],
+        **{total: [result.get(total, 0.0) for result in por_estado] for total in TOTALES + ['utilidad']}
+    })
+    return {
+        'estados': len(batch),
+        'consolidado': _group_results(batch, np.zeros(len(estados), dtype=np.int64), 1, sumar)[0],
+        'por_entidad': dict(zip(entidades, _group_results(batch, entidad_of[estados], len(entidades), sumar))),
+        'por_periodo': dict(zip(periodos, _group_results(batch, periodo_of[estados], len(periodos), sumar))),
+        'tabla': tabla
+    }
+
+def _summary_lines(results):
+    yield f"Total Ingresos: ${results.get('total_ingresos', 0):,.2f}"
+    yield f"Total Egresos: ${results.get('total_gastos', 0) + results.get('total_costos', 0):,.2f}"
+    for categoria, valor in ordered_categories(results['por_categoria']):
+        yield f"    {categoria.capitalize()}: ${valor:,.2f}"
+    yield f"Total Utilidad: ${results['utilidad']:,.2f}"
+
+def render_consolidated_report(results):
+    """
+    Genera el informe de un análisis consolidado línea a línea (para escribirlo
+    con processors.report_generator.write_lines).
+
+    Args:
+        results (dict): Resultado de consolidate.
+
+    Yields:
+        str: Cada línea del informe, sin el salto de línea.
+    """
+    consolidado = results['consolidado']
+    yield "INFORME FINANCIERO CONSOLIDADO"
+    yield "-" * 30
+    yield (f"Estados: {results['estados']} ({len(results['por_entidad'])} entidades, "
+           f"{len(results['por_periodo'])} periodos)")
+    yield f"Cuentas: {consolidado['total_registros']}"
+    yield ""
+    yield "CONSOLIDADO"
+    yield "-" * 30
+    yield from _summary_lines(consolidado)
+    yield ""
+    for titulo, clave in (("POR ENTIDAD", 'por_entidad'), ("POR PERIODO", 'por_periodo')):
+        yield titulo
+        yield "-" * 30
+        for nombre, resultado in results[clave].items():
+            yield f"{nombre}"
+            yield from (f"  {line}" for line in _summary_lines(resultado))
+        yield ""
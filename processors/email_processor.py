@@ -2,32 +2,45 @@ import os
 import sys
 from dotenv import load_dotenv
 import logging
+from processors.mail_sources import get_mail_source
 
 # Cargar variables de entorno
 load_dotenv()
 
-def download_attachments(force_download=False):
+def download_attachments(force_download=False, source=None):
     """
     Descarga los archivos adjuntos de los correos electrónicos.
     
     Args:
         force_download (bool): Si es True, fuerza la descarga incluso si ya existen.
+        source (str|MailSource, optional): Fuente de correo ('imap', 'maildir:<ruta>',
+            'mbox:<ruta>', 'eml:<carpeta>' o una fuente ya creada).
+            Si no se proporciona, se usa la variable de entorno MAIL_SOURCE.
         
     Returns:
         list: Lista de nombres de archivos descargados.
     """
     try:
-        # Importar el módulo mail.py que está en la raíz del proyecto
-        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        import mail
-        
-        # Llamar a la función de descarga de mail.py
-        downloaded_files = mail.download_attachments(force_download)
+        # Descargar de la fuente configurada (por defecto el buzón IMAP de mail.py)
+        downloaded_files = get_mail_source(source).download_attachments(force_download)
         return downloaded_files
     except Exception as e:
         logging.error(f"Error al descargar archivos adjuntos: {e}")
         return []
 
+def watch_mailbox(callback):
+    """
+    Procesa los correos nuevos en cuanto llegan, manteniendo la conexión abierta.
+    
+    Args:
+        callback (callable): Función que recibe la lista de archivos descargados.
+    """
+    # Importar el módulo mail.py que está en la raíz del proyecto
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mail
+    
+    mail.watch_mailbox(callback)
+
 def clean_downloaded_emails():
     """
     Limpia los correos descargados (para modo debug).
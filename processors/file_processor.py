@@ -1,53 +1,438 @@
 import os
 import sys
+import time
 import pandas as pd
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, Future
 from dotenv import load_dotenv
 import logging
+from processors.attachment_store import file_sha256
+from processors.financial_data import extract_financial_data
+from processors.statement import FinancialStatement
+from processors.amounts import detect_decimal_separator
+from processors.statement_reader import read_excel, read_csv, iter_csv_statement, list_statement_sheets, CSV_CHUNK_ROWS
+from processors import ledger, parse_cache
 
 # Cargar variables de entorno
 load_dotenv()
 
 DOWNLOAD_FOLDER = os.getenv('DOWNLOAD_FOLDER')
+# Procesos para leer archivos en paralelo (1 = secuencial)
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', os.cpu_count() or 1))
 
-def load_files(downloaded_files, download_folder=None):
+def _pending_files(downloaded_files, download_folder, skip_processed):
+    """
+    Filtra los archivos a cargar: omite los que no existen, el contenido
+    repetido (mismo SHA-256) y, si se pide, el contenido ya procesado.
+    
+    Returns:
+        list: Tuplas (nombre_archivo, ruta, hash) en el orden recibido.
+    """
+    pending = []
+    seen_hashes = set()
+    
+    for filename in downloaded_files:
+        if not filename.endswith(('.xls', '.xlsx', '.csv')):
+            continue
+        filepath = os.path.join(download_folder, filename)
+        
+        # Omitir contenido repetido o ya procesado
+        try:
+            content_hash = file_sha256(filepath)
+        except OSError as e:
+            logging.error(f"Error al cargar {filename}: {e}")
+            continue
+        if content_hash in seen_hashes:
+            logging.info(f"{filename} tiene el mismo contenido que otro archivo. Saltando...")
+            continue
+        seen_hashes.add(content_hash)
+        if skip_processed and ledger.is_processed(content_hash):
+            logging.info(f"{filename} ya fue procesado. Saltando...")
+            continue
+        pending.append((filename, filepath, content_hash))
+    return pending
+
+def _statement_sheets(filepath, content_hash):
+    """Hojas con estados financieros de un libro (guardadas en processors.parse_cache)."""
+    sheets = parse_cache.get_sheets(content_hash)
+    if sheets is None:
+        sheets = list_statement_sheets(filepath)
+        parse_cache.put_sheets(content_hash, sheets)
+    return sheets
+
+def _expand_sheets(pending):
+    """
+    Divide los libros de Excel con varios estados financieros en una entrada por hoja.
+    
+    Un libro con una sola hoja de estado (o ninguna reconocible) conserva su nombre
+    de archivo; si tiene varias, cada hoja se llama '<archivo> [<hoja>]'.
+    
+    Args:
+        pending (list): Tuplas (nombre_archivo, ruta, hash) de _pending_files.
+        
+    Returns:
+        list: Tuplas (nombre, ruta, hash, hoja o None).
+    """
+    entries = []
+    for filename, filepath, content_hash in pending:
+        sheets = [None]
+        if filename.endswith(('.xls', '.xlsx')):
+            try:
+                sheets = _statement_sheets(filepath, content_hash) or [None]
+            except Exception as e:
+                # El error de lectura, si lo hay, se registrará al leer el archivo
+                logging.warning(f"No se pudieron listar las hojas de {filename}: {e}. "
+                                f"Solo se procesa la primera hoja")
+        for sheet in sheets:
+            name = filename if len(sheets) == 1 else f"{filename} [{sheet}]"
+            entries.append((name, filepath, content_hash, sheet))
+    return entries
+
+def _content_sheets(entries):
+    """Hash -> hojas (None si es el archivo completo) de cada contenido, en orden."""
+    sheets = {}
+    for _, _, content_hash, sheet in entries:
+        sheets.setdefault(content_hash, []).append(sheet)
+    return sheets
+
+def _pending_sheets(entries):
+    """Omite las hojas que ya tienen informe (de un libro que quedó a medias)."""
+    return [entry for entry in entries if entry[3] is None or not ledger.is_processed(entry[2], entry[3])]
+
+def read_file(filepath, sheet=None):
+    """
+    Lee un archivo Excel o CSV en un DataFrame.
+    
+    Los Excel y CSV se leen con processors.statement_reader (lector rápido de
+    solo tres columnas según EXCEL_READER, CSV por bloques de CSV_CHUNK_ROWS filas).
+    
+    Args:
+        filepath (str): Ruta del archivo.
+        sheet (str, optional): Hoja del libro de Excel. Por defecto la primera.
+        
+    Returns:
+        pandas.DataFrame: DataFrame con los datos leídos.
+    """
+    if filepath.endswith(('.xls', '.xlsx')):
+        return read_excel(filepath, sheet)
+    return read_csv(filepath)
+
+def extract_file(filepath, sheet=None):
+    """
+    Lee un archivo y extrae sus registros financieros.
+    
+    Los CSV se leen y se extraen bloque a bloque, así la memoria usada por la
+    lectura depende de CSV_CHUNK_ROWS y no del tamaño del archivo.
+    
+    Args:
+        filepath (str): Ruta del archivo.
+        sheet (str, optional): Hoja del libro de Excel. Por defecto la primera.
+        
+    Returns:
+        FinancialStatement: Registros financieros (ver extract_financial_data).
+    """
+    if filepath.endswith('.csv') and CSV_CHUNK_ROWS > 0:
+        try:
+            # El separador decimal se detecta en el primer bloque y se usa en todo el archivo
+            statements, decimal = [], None
+            for chunk in iter_csv_statement(filepath):
+                decimal = decimal or detect_decimal_separator(chunk['valor'])
+                statements.append(extract_financial_data(chunk, decimal))
+            return FinancialStatement.concat(statements)
+        except ValueError as e:
+            logging.info(f"Lectura por bloques no disponible para {os.path.basename(filepath)}: {e}")
+            return extract_financial_data(pd.read_csv(filepath))
+    return extract_financial_data(read_file(filepath, sheet))
+
+def _load_worker(filepath, sheet=None):
+    """Lee un archivo en un proceso del grupo. Devuelve (DataFrame, duración, error)."""
+    start = time.perf_counter()
+    try:
+        return read_file(filepath, sheet), time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, str(e)
+
+def _extract_worker(filepath, sheet=None):
+    """
+    Lee un archivo y extrae sus registros financieros en un proceso del grupo.
+    
+    Solo viajan de vuelta los registros (un FinancialStatement por columnas), no el DataFrame.
+    
+    Returns:
+        tuple: (registros, duración en segundos, error).
+    """
+    start = time.perf_counter()
+    try:
+        records = extract_file(filepath, sheet)
+        return records, time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, str(e)
+
+def _file_type(filename):
+    return 'Excel' if filename.endswith(('.xls', '.xlsx')) else 'CSV'
+
+_FAILED = object()
+
+class LazyFileMapping(Mapping):
+    """
+    Diccionario nombre_archivo -> datos que lee cada archivo solo cuando se pide.
+    
+    Se usa como un dict normal (len, in, keys, [nombre], get), pero nada se lee al
+    crearlo. Acceder a un archivo con [nombre] lo lee y lo guarda hasta llamar a
+    release(nombre). Recorrerlo con items() o values() lee los archivos en orden
+    con un grupo de procesos, adelantando como máximo `window` archivos, y no los
+    guarda: cada archivo se libera en cuanto quien recorre pasa al siguiente.
+    
+    Los libros con varias hojas de estados financieros aparecen como una entrada
+    por hoja ('<archivo> [<hoja>]'), y las hojas se leen en paralelo igual que
+    archivos distintos.
+    
+    Los archivos que no se pueden leer se registran en el log y se omiten al
+    recorrer; pedirlos con [nombre] lanza KeyError.
+    """
+
+    def __init__(self, entries, worker, workers=None, window=None, sheets=None):
+        """
+        Args:
+            entries (list): Tuplas (nombre, ruta, hash, hoja o None) en el orden a recorrer.
+            worker (callable): Función (a nivel de módulo) que recibe la ruta y la
+                hoja y devuelve (datos, duración, error).
+            workers (int, optional): Número de procesos. Por defecto LOAD_WORKERS.
+            window (int, optional): Archivos leídos por adelantado al recorrer.
+                Por defecto el doble de procesos.
+            sheets (dict, optional): Hash -> todas las hojas de cada contenido,
+                incluidas las que no se van a recorrer. Por defecto, las de entries.
+        """
+        self._files = {name: (filepath, content_hash, sheet) for name, filepath, content_hash, sheet in entries}
+        self._sheets = sheets if sheets is not None else _content_sheets(entries)
+        self._worker = worker
+        self._workers = max(1, LOAD_WORKERS if workers is None else workers)
+        self._window = window or 2 * self._workers
+        self._loaded = {}
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def __getitem__(self, name):
+        if name in self._loaded:
+            return self._loaded[name]
+        filepath, _, sheet = self._files[name]
+        result = self._lookup(name)
+        cached = result is not None
+        if not cached:
+            result = self._worker(filepath, sheet)
+        value = self._finish(name, result, cached)
+        self._after_load()
+        if value is _FAILED:
+            raise KeyError(name)
+        self._loaded[name] = value
+        return value
+
+    def content_hash(self, name):
+        """Devuelve el SHA-256 del archivo de origen de una entrada."""
+        return self._files[name][1]
+
+    def sheet(self, name):
+        """Devuelve la hoja del libro de una entrada (None si es el archivo completo)."""
+        return self._files[name][2]
+
+    def contents(self):
+        """
+        Hojas de cada contenido, incluidas las que ya tenían informe.
+
+        Returns:
+            dict: Hash -> lista de hojas (None si es el archivo completo).
+        """
+        return {content_hash: list(sheets) for content_hash, sheets in self._sheets.items()}
+
+    def release(self, name):
+        """Libera los datos de un archivo ya leído con [nombre]."""
+        self._loaded.pop(name, None)
+
+    def items(self):
+        """
+        Recorre los archivos en orden leyéndolos en paralelo.
+        
+        Yields:
+            tuple: (nombre, datos) de cada archivo leído sin errores.
+        """
+        names = list(self._files)
+        workers = min(self._workers, len(names))
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        if executor is not None:
+            logging.info(f"Cargando {len(names)} archivos con {workers} procesos...")
+        
+        in_flight = deque()
+        position = 0
+        try:
+            while position < len(names) or in_flight:
+                # Adelantar la lectura de los siguientes archivos hasta llenar la ventana
+                while position < len(names) and len(in_flight) < (self._window if executor else 1):
+                    in_flight.append(self._submit(executor, names[position]))
+                    position += 1
+                
+                name, result, cached = in_flight.popleft()
+                if name in self._loaded:
+                    yield name, self._loaded[name]
+                    continue
+                if result is None:
+                    filepath, _, sheet = self._files[name]
+                    result = self._worker(filepath, sheet)
+                elif isinstance(result, Future):
+                    result = result.result()
+                value = self._finish(name, result, cached)
+                if value is not _FAILED:
+                    yield name, value
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            self._after_load()
+
+    def values(self):
+        for _, value in self.items():
+            yield value
+
+    def _submit(self, executor, name):
+        """
+        Empieza a leer un archivo.
+        
+        Returns:
+            tuple: (nombre, resultado ya disponible, Future o None si hay que
+                leerlo al consumirlo, True si el resultado viene de _lookup).
+        """
+        if name in self._loaded:
+            return name, None, False
+        result = self._lookup(name)
+        if result is not None:
+            return name, result, True
+        if executor is not None:
+            filepath, _, sheet = self._files[name]
+            result = executor.submit(self._worker, filepath, sheet)
+        return name, result, False
+
+    def _lookup(self, name):
+        """Resultado ya disponible sin leer el archivo (por ejemplo, de una caché), o None."""
+        return None
+
+    def _finish(self, name, result, cached):
+        """Procesa el resultado (datos, duración, error) de un archivo y devuelve los datos o _FAILED."""
+        data, duration, error = result
+        if error is not None:
+            logging.error(f"Error al cargar {name}: {error}")
+            return _FAILED
+        logging.info(f"Cargado: {name} ({_file_type(self._files[name][0])})")
+        return data
+
+    def _after_load(self):
+        """Se llama al terminar de leer uno o varios archivos."""
+
+class _StatementMapping(LazyFileMapping):
+    """
+    LazyFileMapping de registros financieros: usa processors.parse_cache y
+    registra la etapa 'extraccion' de cada archivo en el registro.
+    """
+
+    def __init__(self, entries, workers=None, window=None, sheets=None):
+        super().__init__(entries, _extract_worker, workers, window, sheets)
+        self._stored = False
+
+    def _lookup(self, name):
+        _, content_hash, sheet = self._files[name]
+        start = time.perf_counter()
+        records = parse_cache.get(content_hash, sheet)
+        if records is None:
+            return None
+        return records, time.perf_counter() - start, None
+
+    def _finish(self, name, result, cached):
+        filepath, content_hash, sheet = self._files[name]
+        records, duration, error = result
+        if error is not None:
+            logging.error(f"Error al cargar {name}: {error}")
+            ledger.record_stage(content_hash, 'extraccion', 'error', duration, error, sheet)
+            return _FAILED
+        if cached:
+            logging.info(f"{name} leído de la caché de estados")
+        else:
+            parse_cache.put(content_hash, records, sheet)
+            self._stored = True
+        ledger.record_stage(content_hash, 'extraccion', 'ok', duration, hoja=sheet)
+        if records.rechazados:
+            logging.warning(f"{name}: {records.rechazados} valores no se pudieron convertir a número")
+        logging.info(f"Cargado: {name} ({_file_type(filepath)}, {len(records)} registros)")
+        return records
+
+    def _after_load(self):
+        if self._stored and parse_cache.enabled():
+            parse_cache.evict()
+        self._stored = False
+
+def load_files(downloaded_files, download_folder=None, skip_processed=False, workers=None):
     """
     Carga los archivos descargados y devuelve un diccionario con los datos.
     
+    Los archivos con el mismo contenido (mismo SHA-256) se cargan una sola vez, y
+    de los libros de Excel se cargan todas las hojas con estados financieros
+    (una entrada por hoja). Ningún archivo se lee hasta que se pide: el resultado es un LazyFileMapping
+    que lee cada archivo al acceder a él y, al recorrerlo, los lee en paralelo
+    con un grupo de procesos sin mantenerlos todos en memoria. Un error en un
+    archivo no afecta a los demás.
+    
     Args:
         downloaded_files (list): Lista de nombres de archivos a cargar.
         download_folder (str, optional): Carpeta donde se encuentran los archivos.
             Si no se proporciona, se usa la variable de entorno DOWNLOAD_FOLDER.
+        skip_processed (bool): Si es True, omite el contenido ya marcado como
+            procesado en el registro (processors.ledger).
+        workers (int, optional): Número de procesos. Por defecto LOAD_WORKERS.
             
     Returns:
-        dict: Diccionario con los datos cargados (nombre_archivo -> DataFrame).
+        LazyFileMapping: Diccionario nombre_archivo -> DataFrame, en el orden de
+            downloaded_files.
     """
     if download_folder is None:
         download_folder = DOWNLOAD_FOLDER
     
-    data = {}
-    
-    for filename in downloaded_files:
-        filepath = os.path.join(download_folder, filename)
-        
-        # Cargar archivos .xls y .xlsx
-        if filename.endswith(('.xls', '.xlsx')):
-            try:
-                df = pd.read_excel(filepath)
-                data[filename] = df
-                logging.info(f"Cargado: {filename} (Excel)")
-            except Exception as e:
-                logging.error(f"Error al cargar {filename}: {e}")
-        
-        # Cargar archivos .csv
-        elif filename.endswith('.csv'):
-            try:
-                df = pd.read_csv(filepath)
-                data[filename] = df
-                logging.info(f"Cargado: {filename} (CSV)")
-            except Exception as e:
-                logging.error(f"Error al cargar {filename}: {e}")
+    entries = _expand_sheets(_pending_files(downloaded_files, download_folder, skip_processed))
+    pending = _pending_sheets(entries) if skip_processed else entries
+    return LazyFileMapping(pending, _load_worker, workers, sheets=_content_sheets(entries))
 
-    return data
+def extract_files(downloaded_files, download_folder=None, skip_processed=False, workers=None):
+    """
+    Carga los archivos y extrae sus datos financieros en paralelo.
+    
+    Igual que load_files, pero cada proceso devuelve directamente los registros
+    de extract_financial_data en lugar del DataFrame completo, lo que reduce la
+    información que se copia entre procesos. Los registros se guardan en
+    processors.parse_cache, así los archivos ya extraídos antes no se vuelven a
+    leer. La duración de la carga y la extracción de cada archivo se registra
+    como la etapa 'extraccion'.
+    
+    Args:
+        downloaded_files (list): Lista de nombres de archivos a cargar.
+        download_folder (str, optional): Carpeta donde se encuentran los archivos.
+            Si no se proporciona, se usa la variable de entorno DOWNLOAD_FOLDER.
+        skip_processed (bool): Si es True, omite el contenido ya procesado.
+        workers (int, optional): Número de procesos. Por defecto LOAD_WORKERS.
+            
+    Returns:
+        LazyFileMapping: Diccionario nombre_archivo -> FinancialStatement con los
+            registros financieros, en el orden de downloaded_files. Al recorrerlo se
+            omiten los archivos que no se pudieron leer.
+    """
+    if download_folder is None:
+        download_folder = DOWNLOAD_FOLDER
+    
+    entries = _expand_sheets(_pending_files(downloaded_files, download_folder, skip_processed))
+    pending = _pending_sheets(entries) if skip_processed else entries
+    return _StatementMapping(pending, workers, sheets=_content_sheets(entries))
 
 def get_available_files(download_folder=None):
     """
@@ -78,7 +463,7 @@ def load_file(filename):
     """
     try:
         if filename.lower().endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(filename)
+            df = read_excel(filename)
             logging.info(f"Cargado: {filename} (Excel)")
             return df
     except Exception as e:
@@ -87,7 +472,7 @@ def load_file(filename):
     
     try:
         if filename.lower().endswith('.csv'):
-            df = pd.read_csv(filename)
+            df = read_csv(filename)
             logging.info(f"Cargado: {filename} (CSV)")
             return df
     except Exception as e:
@@ -1,101 +1,146 @@
 import pandas as pd
 import numpy as np
 import logging
+from processors.statement_reader import STATEMENT_COLUMNS, HEADER_TEXT
+from processors.statement import FinancialStatement, DetailList, as_statement
+from processors.amounts import parse_amounts, text_mask
+from processors.categories import get_classifier
+from processors.rollup import rollup, level_mask, code_depths
+from processors.aggregation import sum_by_code, aggregate_matrix
+from processors.report_generator import render_report
 
-# Diccionario de categorías con sus IDs principales
-# Los IDs más cortos definen las categorías principales
-CATEGORIAS = {
-    "animales": ["1445"],  # Semovientes
-    "praderas": ["1504"],  # Terrenos
-    "oficina": ["2335"],   # Costos y gastos por pagar
-    "legal": ["2365", "2370", "25"],  # Retenciones, aportes y beneficios a empleados
-    "mejoras": ["1520", "1524", "1540", "1592"],  # Maquinaria, equipo, flota y depreciación
-    "otros": []  # Categoría por defecto para códigos que no coinciden con ninguna otra categoría
+# Versión del extractor: cambiarla cuando cambie lo que devuelve extract_financial_data
+# invalida las entradas de processors.parse_cache
+PARSER_VERSION = 3
+
+# Tipo de cuenta según el primer dígito del código
+TIPOS_CUENTA = {
+    '1': "Activo",
+    '2': "Pasivo",
+    '3': "Patrimonio",
+    '4': "Ingreso",
+    '5': "Gasto",
+    '6': "Costo",
+    '7': "Costo de producción",
+    '8': "Cuentas de orden deudoras",
+    '9': "Cuentas de orden acreedoras"
 }
 
-def extract_financial_data(dataframe):
+def extract_financial_data(dataframe, decimal=None):
     """
     Extrae los datos financieros de un DataFrame con la estructura específica del Estado de Situación Financiera.
     
+    Trabaja por columnas: la fila de encabezado se busca con una máscara, las
+    filas sin código o sin valor se descartan con notna, los valores de texto se
+    convierten a número todos a la vez con processors.amounts.parse_amounts y el
+    tipo y la categoría se asignan con clasificar_cuentas y clasificar_categorias.
+    Los valores que no se pueden convertir se descartan y se cuentan en el
+    atributo 'rechazados' del resultado. Las filas anteriores al encabezado
+    (empresa, título, fecha...) quedan como texto en el atributo 'encabezado'.
+    
     Args:
         dataframe (pd.DataFrame): DataFrame que contiene los datos financieros.
+        decimal (str, optional): Separador decimal de los valores ('.' o ',').
+            Por defecto se detecta en la columna de valores.
         
     Returns:
-        list: Lista de diccionarios con los campos 'codigo', 'descripcion', 'valor', 'tipo' y 'categoria'.
+        FinancialStatement: Cuentas con los campos 'codigo', 'descripcion', 'valor',
+            'tipo' y 'categoria' (se recorre como una lista de registros).
     """
-    # Lista para almacenar los resultados
-    financial_data = []
-    
     # Verificar que el DataFrame tenga al menos 3 columnas
     if dataframe.shape[1] < 3:
-        # print("El DataFrame no tiene suficientes columnas para extraer los datos financieros.")
         logging.warning("El DataFrame no tiene suficientes columnas para extraer los datos financieros.")
-        return financial_data
+        return FinancialStatement.empty()
     
     # Obtener los nombres de las columnas
     columns = dataframe.columns.tolist()
     
+    # Los DataFrames del lector rápido (processors.statement_reader) ya empiezan después del encabezado
+    header_row_idx = -1 if columns == STATEMENT_COLUMNS else None
+    
     # Buscar la fila que contiene los encabezados reales
-    header_row_idx = None
-    for idx, row in dataframe.iterrows():
-        if isinstance(row[columns[0]], str) and "Código cuenta contable" in row[columns[0]]:
-            header_row_idx = idx
-            break
+    if header_row_idx is None:
+        header_row_idx = _first_match(dataframe.iloc[:, 0], lambda textos: textos.str.contains(HEADER_TEXT, regex=False))
     
-    # Si no se encuentra la fila de encabezados, intentar con otra estrategia
+    # Si no se encuentra la fila de encabezados, buscar la primera fila con un código de cuenta (números)
+    # y asumir que la fila anterior es el encabezado
     if header_row_idx is None:
-        # Buscar filas que parecen contener códigos de cuenta (números)
-        for idx, row in dataframe.iterrows():
-            if isinstance(row[columns[0]], str) and row[columns[0]].isdigit():
-                # Encontramos una fila con un código de cuenta
-                header_row_idx = idx - 1  # Asumimos que la fila anterior es el encabezado
-                break
+        first_code_idx = _first_match(dataframe.iloc[:, 0], lambda textos: textos.str.isdigit())
+        if first_code_idx is not None:
+            header_row_idx = first_code_idx - 1
     
     # Si aún no encontramos encabezados, usar la fila 7 (basado en la salida de depuración)
     if header_row_idx is None:
         header_row_idx = 7
     
-    # Iterar sobre las filas del DataFrame a partir de la fila después del encabezado
-    for idx in range(header_row_idx + 1, len(dataframe)):
-        row = dataframe.iloc[idx]
-        
-        # Extraer los valores de las columnas
-        codigo = row[columns[0]]
-        descripcion = row[columns[1]] if len(columns) > 1 else None
-        valor = row[columns[2]] if len(columns) > 2 else None
-        
-        # Verificar que el código y el valor no estén vacíos
-        if pd.notna(codigo) and pd.notna(valor):
-            # Convertir el código a string si no lo es
-            if not isinstance(codigo, str):
-                codigo = str(codigo)
-            
-            # Convertir el valor a float si es posible
-            try:
-                if isinstance(valor, str):
-                    # Eliminar posibles caracteres no numéricos (excepto el punto decimal)
-                    valor = ''.join(c for c in valor if c.isdigit() or c == '.')
-                valor = float(valor)
-            except (ValueError, TypeError):
-                # Si no se puede convertir a float, continuar con el siguiente registro
-                continue
-            
-            # Determinar el tipo de cuenta basado en el código
-            tipo = clasificar_cuenta(codigo, descripcion)
-            
-            # Determinar la categoría basada en el código
-            categoria = clasificar_categoria(codigo, descripcion)
-            
-            # Agregar el registro a la lista de resultados
-            financial_data.append({
-                'codigo': codigo,
-                'descripcion': descripcion if pd.notna(descripcion) else '',
-                'valor': valor,
-                'tipo': tipo,
-                'categoria': categoria
-            })
-    
-    return financial_data
+    # Filas a partir de la fila después del encabezado
+    start = header_row_idx + 1
+    if start >= len(dataframe):
+        return FinancialStatement.empty()
+    body = dataframe.iloc[start:, :3]
+    
+    # Filas anteriores al encabezado (el lector rápido ya las separó en attrs)
+    if header_row_idx < 0:
+        encabezado = _header_lines(dataframe.attrs.get('encabezado', []))
+    else:
+        titles = [[column for column in columns[:3] if isinstance(column, str) and not column.startswith('Unnamed:')]]
+        encabezado = _header_lines(titles + list(dataframe.iloc[:header_row_idx, :3].itertuples(index=False, name=None)))
+    
+    # Si todas las columnas son numéricas, cada fila se leía con el tipo común de todas ellas
+    # (por ejemplo, códigos enteros convertidos a float): conservar ese comportamiento
+    row_dtype = dataframe.iloc[start].dtype
+    numeric_rows = row_dtype != object and pd.api.types.is_numeric_dtype(row_dtype)
+    if numeric_rows:
+        body = body.astype(row_dtype)
+    
+    codigo, descripcion, valor = (body.iloc[:, i] for i in range(3))
+    
+    # Descartar las filas sin código o sin valor
+    keep = (codigo.notna() & valor.notna()).to_numpy()
+    codigo, descripcion, valor = codigo[keep], descripcion[keep], valor[keep]
+    
+    # Convertir los valores a float; las filas que no se pueden convertir se descartan
+    valores, parsed = parse_amounts(valor, decimal)
+    rechazados = int(len(parsed) - parsed.sum())
+    if rechazados:
+        logging.debug(f"{rechazados} valores no se pudieron convertir a número y se descartaron")
+    codigo, descripcion, valores = codigo[parsed], descripcion[parsed], valores[parsed]
+    
+    # Convertir los códigos a string
+    codigos = codigo.astype(str).tolist()
+    descripciones = np.empty(len(descripcion), dtype=object)
+    numeric_descriptions = descripcion.dtype != object and pd.api.types.is_numeric_dtype(descripcion.dtype)
+    descripciones[:] = list(descripcion.to_numpy()) if numeric_descriptions else descripcion.to_numpy(dtype=object)
+    descripciones[~descripcion.notna().to_numpy()] = ''
+    
+    # Determinar el tipo y la categoría de cada cuenta a partir del código
+    tipos = clasificar_cuentas(codigos)
+    categorias = clasificar_categorias(codigos)
+    
+    return FinancialStatement(codigos, descripciones, valores, tipos, categorias, rechazados=rechazados,
+                              encabezado=encabezado)
+
+def _header_lines(rows):
+    """Convierte las filas anteriores al encabezado en líneas de texto (sin las filas vacías)."""
+    lines = []
+    for row in rows:
+        cells = [str(cell).strip() for cell in row if cell is not None and not pd.isna(cell)]
+        line = ' '.join(cell for cell in cells if cell)
+        if line:
+            lines.append(line)
+    return lines
+
+def _first_match(series, condition):
+    """
+    Devuelve la etiqueta de la primera fila cuyo valor es texto y cumple condition,
+    o None si ninguna la cumple.
+    """
+    is_text = text_mask(series)
+    if not is_text.any():
+        return None
+    matches = condition(series[is_text].astype(object)).to_numpy(dtype=bool)
+    positions = np.flatnonzero(is_text)[matches]
+    return series.index[positions[0]] if len(positions) else None
 
 def clasificar_cuenta(codigo, descripcion):
     """
@@ -117,58 +162,55 @@ def clasificar_cuenta(codigo, descripcion):
     # Clasificación basada en el primer dígito del código
     primer_digito = codigo_str[0] if codigo_str else ''
     
-    if primer_digito == '1':
-        return "Activo"
-    elif primer_digito == '2':
-        return "Pasivo"
-    elif primer_digito == '3':
-        return "Patrimonio"
-    elif primer_digito == '4':
-        return "Ingreso"
-    elif primer_digito == '5':
-        return "Gasto"
-    elif primer_digito == '6':
-        return "Costo"
-    elif primer_digito == '7':
-        return "Costo de producción"
-    elif primer_digito == '8':
-        return "Cuentas de orden deudoras"
-    elif primer_digito == '9':
-        return "Cuentas de orden acreedoras"
-    else:
-        return "No clasificado"
+    return TIPOS_CUENTA.get(primer_digito, "No clasificado")
 
 def clasificar_categoria(codigo, descripcion):
     """
     Clasifica una cuenta contable según su código en una de las categorías definidas.
-    Usa la jerarquía de IDs para determinar la categoría.
+    Usa las reglas de processors.categories (archivo CATEGORIAS_FILE): gana el
+    prefijo de código más largo que coincida.
     
     Args:
         codigo (str): Código de la cuenta contable.
         descripcion (str): Descripción de la cuenta contable.
         
     Returns:
-        str: Categoría (animales, praderas, oficina, legal, mejoras, otros).
+        str: Categoría (animales, praderas, oficina, legal, mejoras, otros...).
     """
+    classifier = get_classifier()
     if not codigo:
-        return "otros"
+        return classifier.por_defecto
     
-    # Convertir a string si no lo es
-    codigo_str = str(codigo)
-    
-    # Ignorar códigos que empiezan por 3 (patrimonio)
-    if codigo_str.startswith('3'):
-        return "otros"
+    return classifier.classify(str(codigo))
+
+def clasificar_cuentas(codigos):
+    """
+    Versión por lotes de clasificar_cuenta.
     
-    # Buscar coincidencias con los IDs principales de cada categoría
-    for categoria, ids_principales in CATEGORIAS.items():
-        for id_principal in ids_principales:
-            # Si el código actual es un ancestro del ID principal
-            if codigo_str.startswith(id_principal):
-                return categoria
+    Args:
+        codigos (iterable): Códigos de cuenta como texto.
+        
+    Returns:
+        list: Tipo de cada cuenta, en el mismo orden.
+    """
+    # astype('U1') se queda con el primer carácter de cada código
+    primeros = np.asarray(codigos, dtype=str).astype('U1')
+    tipos = np.full(len(primeros), "No clasificado", dtype=object)
+    for primer_digito, tipo in TIPOS_CUENTA.items():
+        tipos[primeros == primer_digito] = tipo
+    return tipos.tolist()
+
+def clasificar_categorias(codigos):
+    """
+    Versión por lotes de clasificar_categoria.
     
-    # Si no hay coincidencias, asignar a "otros"
-    return "otros"
+    Args:
+        codigos (iterable): Códigos de cuenta como texto.
+        
+    Returns:
+        list: Categoría de cada cuenta, en el mismo orden.
+    """
+    return get_classifier().classify_many(codigos)
 
 def is_parent_code(parent_code, child_code):
     """
@@ -192,115 +234,126 @@ def is_parent_code(parent_code, child_code):
     # Verificar que el hijo comience con el padre
     return child_str.startswith(parent_str)
 
-def find_ancestors(codigo, financial_data):
+def find_ancestors(codigo, financial_data, index=None):
     """
     Encuentra todos los ancestros de un código en los datos financieros.
     
     Args:
         codigo (str): Código para el cual buscar ancestros
-        financial_data (list): Lista de diccionarios con los datos financieros
+        financial_data (FinancialStatement|list): Datos financieros
+        index (CodeIndex, optional): Índice de códigos de financial_data. Si no se
+            proporciona, se usa el del estado (crearlo recorre todas las cuentas).
         
     Returns:
-        list: Lista de diccionarios con la información de los ancestros
+        list: Lista de diccionarios con la información de los ancestros,
+            ordenados por longitud del código (más cortos primero)
     """
-    ancestros = []
-    codigo_str = str(codigo)
-    
-    # Buscar todos los posibles ancestros en los datos financieros
-    for registro in financial_data:
-        codigo_potencial_padre = str(registro["codigo"])
-        
-        # Verificar si este código es un ancestro del código actual
-        if is_parent_code(codigo_potencial_padre, codigo_str):
-            ancestros.append({
-                "codigo": codigo_potencial_padre,
-                "descripcion": registro["descripcion"],
-                "valor": registro["valor"],
-                "tipo": registro["tipo"],
-                "categoria": registro["categoria"]
-            })
-    
-    # Ordenar ancestros por longitud del código (más cortos primero)
-    ancestros_ordenados = sorted(ancestros, key=lambda x: len(x["codigo"]))
-    return ancestros_ordenados
+    statement = as_statement(financial_data)
+    if index is None:
+        index = statement.hierarchy()
+    return [dict(statement[position]) for position in index.ancestor_positions(codigo)]
+
+# Clave del total de analyze_financial_data para cada tipo de cuenta
+TOTALES_POR_TIPO = {
+    "Activo": "total_activos",
+    "Pasivo": "total_pasivos",
+    "Patrimonio": "total_patrimonio",
+    "Ingreso": "total_ingresos",
+    "Gasto": "total_gastos",
+    "Costo": "total_costos",
+    "Costo de producción": "total_costos"
+}
 
-def analyze_financial_data(financial_data, debug=False):
+def analyze_financial_data(financial_data, debug=False, level=None):
     """
     Analiza los datos financieros y genera un informe.
     
+    Los detalles de cada cuenta ('detalles_completos') son vistas sobre el
+    estado financiero y sus ancestros se consultan en el índice de códigos
+    ('jerarquia', un processors.hierarchy.CodeIndex), sin recorrer todas las
+    cuentas ni copiar los registros.
+    
+    Las cuentas padre traen el subtotal de sus subcuentas, así que los totales
+    se calculan solo con las hojas del árbol de códigos (o con las cuentas de
+    un nivel, ver processors.rollup.level_mask) para no sumar nada dos veces.
+    Los subtotales de las cuentas padre que no coinciden con la suma de sus
+    hojas se devuelven en 'descuadres'.
+    
+    Las sumas se hacen de una vez sobre los códigos de tipo y de categoría
+    (processors.aggregation). 'matriz' tiene además las sumas por tipo,
+    categoría y nivel del árbol (ver aggregate_matrix).
+    
     Args:
-        financial_data (list): Lista de diccionarios con los datos financieros.
+        financial_data (FinancialStatement|list): Datos financieros (un
+            FinancialStatement o la lista de diccionarios de antes).
         debug (bool): Si es True, muestra información adicional durante el análisis.
+        level (int, optional): Nivel del árbol con el que se calculan los
+            totales (0 = cuentas sin padre). Por defecto, las hojas.
         
     Returns:
         dict: Resultados del análisis.
     """
+    statement = as_statement(financial_data)
+    index = statement.hierarchy()
+    detalles = DetailList(statement, index)
+    acumulado = rollup(statement, index)
+    
     results = {
-        'total_registros': len(financial_data),
+        'total_registros': len(statement),
         'por_categoria': {},
         'por_tipo': {},
-        'jerarquia': {},
-        'detalles_completos': []
+        'subtotales': acumulado['subtotales'],
+        'descuadres': acumulado['descuadres'],
+        'jerarquia': index,
+        'detalles_completos': detalles
     }
     
-    # Procesar cada registro
-    for registro in financial_data:
-        if debug:
-            # print(f"Procesando código: {registro['codigo']}")
-            logging.debug(f"Procesando código: {registro['codigo']}")
-            
-        # Encontrar ancestros del código
-        ancestros = find_ancestors(registro['codigo'], financial_data)
-        
-        if debug:
-            # print(f"Ancestros encontrados: {len(ancestros)}")
-            logging.debug(f"Ancestros encontrados: {len(ancestros)}")
-            for ancestro in ancestros:
-                # print(f"  - {ancestro['codigo']}: {ancestro['descripcion']}")
+    if debug:
+        for detalle in detalles:
+            logging.debug(f"Procesando código: {detalle['codigo']}")
+            logging.debug(f"Ancestros encontrados: {len(detalle['ancestros'])}")
+            for ancestro in detalle['ancestros']:
                 logging.debug(f"  - {ancestro['codigo']}: {ancestro['descripcion']}")
-        
-        # Crear detalle básico
-        detalle = {
-            "codigo": registro["codigo"],
-            "descripcion": registro["descripcion"],
-            "valor": registro["valor"],
-            "tipo": registro["tipo"],
-            "categoria": registro["categoria"],
-            "ancestros": ancestros
-        }
-        
-        # Agregar el detalle a la lista de detalles completos
-        results["detalles_completos"].append(detalle)
-        
-        # Actualizar totales y resúmenes
-        tipo = registro["tipo"]
-        valor = registro["valor"]
-        categoria = registro["categoria"]
-        
-        # Sumar al total correspondiente por tipo
-        if tipo == "Activo":
-            results["total_activos"] = results.get("total_activos", 0) + valor
-        elif tipo == "Pasivo":
-            results["total_pasivos"] = results.get("total_pasivos", 0) + valor
-        elif tipo == "Patrimonio":
-            results["total_patrimonio"] = results.get("total_patrimonio", 0) + valor
-        elif tipo == "Ingreso":
-            results["total_ingresos"] = results.get("total_ingresos", 0) + valor
-        elif tipo == "Gasto" or tipo == "Costo" or tipo == "Costo de producción":
-            if tipo == "Gasto":
-                results["total_gastos"] = results.get("total_gastos", 0) + valor
-            else:
-                results["total_costos"] = results.get("total_costos", 0) + valor
-        
-        # Agregar al resumen por tipo
-        if tipo not in results["por_tipo"]:
-            results["por_tipo"][tipo] = 0
-        results["por_tipo"][tipo] += valor
-        
-        # Agregar al resumen por categoría
-        if categoria not in results["por_categoria"]:
-            results["por_categoria"][categoria] = 0
-        results["por_categoria"][categoria] += valor
+    
+    if results['descuadres']:
+        logging.warning(f"{len(results['descuadres'])} cuentas no coinciden con la suma de sus subcuentas")
+    if debug:
+        for descuadre in results['descuadres']:
+            logging.debug(f"Descuadre en {descuadre['codigo']}: reportado {descuadre['reportado']:,.2f}, "
+                          f"subcuentas {descuadre['calculado']:,.2f}")
+    
+    valores = statement.valores
+    depths = code_depths(statement, index)
+    # Cuentas que entran en los totales (las hojas o las del nivel pedido)
+    sumar = level_mask(statement, level, index, depths)
+    
+    # Resumen por tipo, en el orden en que aparece cada tipo
+    tipos = statement.tipos
+    tipo_names = tipos.categories.tolist()
+    tipo_order = [code for code in pd.unique(tipos.codes) if code >= 0]
+    por_tipo = sum_by_code(tipos.codes, valores, len(tipo_names), sumar)
+    for code in tipo_order:
+        results["por_tipo"][tipo_names[code]] = float(por_tipo[code])
+    
+    # Totales: cada tipo se lleva a la clave de su total (los costos y los costos
+    # de producción se suman juntos en total_costos)
+    totales = list(dict.fromkeys(
+        TOTALES_POR_TIPO[tipo_names[code]] for code in tipo_order if tipo_names[code] in TOTALES_POR_TIPO))
+    total_codes = np.array([totales.index(TOTALES_POR_TIPO[tipo]) if TOTALES_POR_TIPO.get(tipo) in totales else -1
+                            for tipo in tipo_names] + [-1], dtype=np.int64)[tipos.codes]
+    for total, valor in zip(totales, sum_by_code(total_codes, valores, len(totales), sumar).tolist()):
+        results[total] = valor
+    
+    # Resumen por categoría
+    categorias = statement.categorias
+    categoria_names = categorias.categories.tolist()
+    por_categoria = sum_by_code(categorias.codes, valores, len(categoria_names), sumar)
+    for code in pd.unique(categorias.codes):
+        if code >= 0:
+            results["por_categoria"][categoria_names[code]] = float(por_categoria[code])
+    
+    # Sumas por tipo, categoría y nivel del árbol
+    results["matriz"] = aggregate_matrix(statement, depths)
     
     # Calcular utilidad
     total_ingresos = results.get("total_ingresos", 0)
@@ -311,14 +364,20 @@ def analyze_financial_data(financial_data, debug=False):
     
     return results
 
-def generate_financial_report(financial_data, analysis_results=None, debug=False):
+def generate_financial_report(financial_data, analysis_results=None, debug=False, compact=False):
     """
     Genera un informe a partir de los datos financieros.
     
+    Las líneas salen de processors.report_generator.render_report; para
+    escribir el informe en un archivo sin armarlo en memoria se usa
+    write_report.
+    
     Args:
-        financial_data (list): Lista de diccionarios con los datos financieros.
+        financial_data (FinancialStatement|list): Datos financieros.
         analysis_results (dict, optional): Resultados del análisis financiero.
         debug (bool): Si está en modo debug, incluye información adicional y limpia reportes anteriores.
+        compact (bool): Si es True, genera el detalle de las cuentas compacto
+            (una línea por cuenta y cada ruta de ancestros una sola vez).
         
     Returns:
         str: Informe generado.
@@ -330,80 +389,7 @@ def generate_financial_report(financial_data, analysis_results=None, debug=False
     if analysis_results is None:
         analysis_results = analyze_financial_data(financial_data)
     
-    # Generar el informe
-    informe = []
-    informe.append("INFORME DE ESTADO FINANCIERO")
-    informe.append("-" * 30)
-    informe.append("")
-    
-    # Resumen general
-    informe.append(f"Total Ingresos: ${analysis_results.get('total_ingresos', 0):,.2f}")
-    informe.append("")
-    
-    # Egresos por categoría
-    total_gastos = analysis_results.get('total_gastos', 0)
-    total_costos = analysis_results.get('total_costos', 0)
-    informe.append(f"Total Egresos: ${total_gastos + total_costos:,.2f}")
-    # Ordenar categorías para que aparezcan en un orden específico
-    orden_categorias = ["animales", "praderas", "oficina", "legal", "mejoras", "otros"]
-    for categoria in orden_categorias:
-        if categoria in analysis_results["por_categoria"]:
-            valor = analysis_results["por_categoria"][categoria]
-            informe.append(f"    {categoria.capitalize()}: ${valor:,.2f}")
-    informe.append("")
-    
-    # Total utilidad
-    informe.append(f"Total Utilidad: ${analysis_results['utilidad']:,.2f}")
-    informe.append("")
-    
-    # Detalles por categoría
-    informe.append("-" * 30)
-    informe.append("Detalles de cada categoria.")
-    informe.append("")
-    
-    # Agrupar detalles por categoría
-    detalles_por_categoria = {}
-    for detalle in analysis_results["detalles_completos"]:
-        categoria = detalle["categoria"]
-        if categoria not in detalles_por_categoria:
-            detalles_por_categoria[categoria] = []
-        detalles_por_categoria[categoria].append(detalle)
-    
-    # Mostrar detalles de cada categoría
-    for categoria in orden_categorias:
-        if categoria in detalles_por_categoria:
-            informe.append(f"\n{categoria.upper()}")
-            informe.append("-" * 30)
-            
-            # Mostrar cada detalle
-            for detalle in detalles_por_categoria[categoria]:
-                informe.append(f"Código: {detalle['codigo']}")
-                informe.append(f"Descripción: {detalle['descripcion']}")
-                informe.append(f"Valor: ${detalle['valor']:,.2f}")
-                informe.append(f"Tipo: {detalle['tipo']}")
-                informe.append("Ancestros:")
-                
-                # Verificar si el detalle tiene la clave 'ancestros'
-                ancestros = detalle.get('ancestros', [])
-                if ancestros:
-                    for ancestro in ancestros:
-                        informe.append(f" - {ancestro['codigo']}: {ancestro['descripcion']}")
-                else:
-                    informe.append(" - No se encontraron ancestros")
-                informe.append("")
-    
-    # Si estamos en modo debug, agregar información adicional
-    if debug:
-        informe.append("\nINFORMACIÓN DE DEBUG")
-        informe.append("-" * 30)
-        informe.append(f"Total registros procesados: {len(financial_data)}")
-        informe.append(f"Total categorías encontradas: {len(detalles_por_categoria)}")
-        for categoria, detalles in detalles_por_categoria.items():
-            informe.append(f"\nRegistros en categoría {categoria}: {len(detalles)}")
-            for detalle in detalles:
-                informe.append(f"  - {detalle['codigo']}: {detalle['descripcion']}")
-    
-    return "\n".join(informe)
+    return "\n".join(render_report(financial_data, analysis_results, debug=debug, compact=compact))
 
 def clean_previous_reports(debug=False):
     """
@@ -0,0 +1,186 @@
+"""
+Índice de la jerarquía de códigos de cuenta de un estado financiero.
+
+Un código es ancestro de otro si es más corto y es un prefijo suyo ("14" y
+"1445" son ancestros de "144505"). CodeIndex guarda un diccionario código ->
+posiciones en el estado y, para cada código, su padre (el ancestro más
+cercano que aparece en el estado) y sus hijos. Así los ancestros de un código
+se obtienen consultando solo sus prefijos, en O(profundidad), en lugar de
+recorrer todas las cuentas.
+"""
+
+from itertools import chain
+import numpy as np
+
+class CodeIndex:
+    """
+    Índice de los códigos de un estado financiero.
+
+    Args:
+        codigos (iterable): Código de cada cuenta (texto), en el orden del estado.
+    """
+
+    def __init__(self, codigos):
+        self._positions = {}
+        for position, codigo in enumerate(codigos):
+            self._positions.setdefault(str(codigo), []).append(position)
+        # Longitudes de código presentes, de menor a mayor
+        self._lengths = sorted({len(codigo) for codigo in self._positions})
+
+        self._parents = {}
+        self._children = {}
+        self._roots = []
+        # Recorrido en preorden, nivel de cada código e identificador de código
+        # de cada posición: se calculan la primera vez que se piden
+        self._preorder = None
+        self._depths = None
+        self._code_ids = None
+        for codigo in self._positions:
+            parent = self._nearest_ancestor(codigo)
+            self._parents[codigo] = parent
+            if parent is None:
+                self._roots.append(codigo)
+            else:
+                self._children.setdefault(parent, []).append(codigo)
+
+    @classmethod
+    def from_statement(cls, statement):
+        """Crea el índice de un FinancialStatement (o de la lista de registros de antes)."""
+        codigos = getattr(statement, 'codigos', None)
+        if codigos is None:
+            codigos = [registro['codigo'] for registro in statement]
+        return cls(codigos)
+
+    def _nearest_ancestor(self, codigo):
+        for length in reversed(self._lengths):
+            if length < len(codigo) and codigo[:length] in self._positions:
+                return codigo[:length]
+        return None
+
+    def __contains__(self, codigo):
+        return str(codigo) in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def positions(self, codigo):
+        """Posiciones en el estado de las cuentas con ese código (puede estar repetido)."""
+        return list(self._positions.get(str(codigo), []))
+
+    def ancestors(self, codigo):
+        """
+        Códigos ancestros de un código que aparecen en el estado.
+
+        El código no tiene por qué estar en el estado.
+
+        Returns:
+            list: Códigos, del más corto (la raíz) al más largo.
+        """
+        codigo = str(codigo)
+        return [codigo[:length] for length in self._lengths
+                if length < len(codigo) and codigo[:length] in self._positions]
+
+    def ancestor_positions(self, codigo):
+        """
+        Posiciones de las cuentas ancestro de un código, en el orden de find_ancestors
+        (por longitud del código y, con el mismo código, en el orden del estado).
+
+        Returns:
+            list: Posiciones en el estado.
+        """
+        return [position for ancestor in self.ancestors(codigo) for position in self._positions[ancestor]]
+
+    def parent(self, codigo):
+        """Código padre (el ancestro más cercano del estado), o None si es una raíz."""
+        codigo = str(codigo)
+        if codigo in self._parents:
+            return self._parents[codigo]
+        return self._nearest_ancestor(codigo)
+
+    def children(self, codigo):
+        """Códigos hijos directos, en el orden del estado."""
+        return list(self._children.get(str(codigo), []))
+
+    def descendants(self, codigo):
+        """
+        Todos los códigos que descienden de un código.
+
+        Returns:
+            list: Códigos en preorden (cada cuenta seguida de sus subcuentas).
+        """
+        descendants = []
+        pending = list(reversed(self._children.get(str(codigo), [])))
+        while pending:
+            child = pending.pop()
+            descendants.append(child)
+            pending.extend(reversed(self._children.get(child, [])))
+        return descendants
+
+    def preorder(self):
+        """
+        Todos los códigos en preorden: cada código antes que sus descendientes.
+
+        Recorrida al revés, cada código aparece después de todos sus
+        descendientes, que es el orden para acumular de abajo arriba.
+        """
+        if self._preorder is None:
+            order = []
+            pending = list(reversed(self._roots))
+            while pending:
+                codigo = pending.pop()
+                order.append(codigo)
+                children = self._children.get(codigo)
+                if children:
+                    pending.extend(reversed(children))
+            # En preorden cada padre va antes que sus hijos
+            depths = {}
+            parents = self._parents
+            for codigo in order:
+                parent = parents[codigo]
+                depths[codigo] = 0 if parent is None else depths[parent] + 1
+            self._preorder, self._depths = order, depths
+        return list(self._preorder)
+
+    def depths(self):
+        """Diccionario código -> nivel en el árbol (0 para las raíces)."""
+        if self._depths is None:
+            self.preorder()
+        return dict(self._depths)
+
+    def code_ids(self):
+        """
+        Identificador de código de cada posición del estado.
+
+        Los identificadores siguen el orden de iteración del índice (el de la
+        primera aparición de cada código): list(index)[code_ids[i]] es el
+        código de la cuenta i.
+
+        Returns:
+            numpy.ndarray: Un entero por cuenta.
+        """
+        if self._code_ids is None:
+            groups = list(self._positions.values())
+            sizes = [len(positions) for positions in groups]
+            positions = np.fromiter(chain.from_iterable(groups), dtype=np.int64, count=sum(sizes))
+            code_ids = np.empty(len(positions), dtype=np.int64)
+            code_ids[positions] = np.repeat(np.arange(len(groups)), sizes)
+            self._code_ids = code_ids
+        return self._code_ids.copy()
+
+    def roots(self):
+        """Códigos sin ancestros en el estado, en el orden del estado."""
+        return list(self._roots)
+
+    def is_leaf(self, codigo):
+        """Indica si un código no tiene hijos en el estado."""
+        return str(codigo) not in self._children
+
+    def depth(self, codigo):
+        """Número de ancestros de un código en el estado (0 para las raíces)."""
+        codigo = str(codigo)
+        if self._depths is not None and codigo in self._depths:
+            return self._depths[codigo]
+        return len(self.ancestors(codigo))
@@ -0,0 +1,469 @@
+"""
+Historial de estados financieros analizados, para consultar su evolución.
+
+Cada estado analizado se guarda en una base SQLite (HISTORY_FILE) identificado
+por su entidad y su periodo (AAAA-MM):
+
+- La entidad es la primera línea del encabezado del estado que no es una
+  fecha ni un título ("Finca La Esperanza").
+- El periodo sale de la fecha del encabezado ("Al 31 de diciembre de 2024",
+  "Enero 2024", "31/12/2024") o, si no tiene, de la fecha del correo del que
+  llegó el archivo (processors.ledger).
+
+Se guardan las cuentas (código, descripción, valor, tipo, categoría, nivel y
+si es hoja) y un resumen con los totales del análisis por tipo, por categoría
+y de cada total, junto con el nivel del árbol con el que se calcularon (NULL
+si se calcularon con las hojas). Las series de una cuenta o de una categoría, la variación
+respecto al periodo anterior y respecto al mismo mes del año anterior se
+consultan directamente en la base, sin volver a leer los archivos.
+
+Uso desde la línea de comandos: python historial.py --help
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+import numpy as np
+import pandas as pd
+import logging
+from processors import ledger
+from processors.statement import FIELDS, FinancialStatement, as_statement
+from processors.rollup import code_depths, leaf_mask
+from processors.consolidation import StatementBatch
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Base SQLite del historial de estados analizados (vacío = no guardar historial)
+HISTORY_FILE = os.getenv('HISTORY_FILE', 'historial.db')
+
+# Entidad de los estados cuyo encabezado no la indica
+DEFAULT_ENTITY = 'sin entidad'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS estados (
+    id INTEGER PRIMARY KEY,
+    entidad TEXT NOT NULL,
+    periodo TEXT NOT NULL,
+    hoja TEXT NOT NULL DEFAULT '',
+    hash TEXT NOT NULL,
+    nombre TEXT,
+    registrado TEXT NOT NULL,
+    nivel INTEGER,
+    UNIQUE (entidad, periodo, hoja)
+);
+CREATE INDEX IF NOT EXISTS idx_estados_periodo ON estados (periodo);
+CREATE TABLE IF NOT EXISTS cuentas (
+    estado INTEGER NOT NULL,
+    codigo TEXT NOT NULL,
+    descripcion TEXT,
+    valor REAL NOT NULL,
+    tipo TEXT,
+    categoria TEXT,
+    nivel INTEGER NOT NULL,
+    es_hoja INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cuentas_codigo ON cuentas (codigo, estado);
+CREATE INDEX IF NOT EXISTS idx_cuentas_estado ON cuentas (estado);
+CREATE TABLE IF NOT EXISTS resumen (
+    estado INTEGER NOT NULL,
+    grupo TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    valor REAL NOT NULL,
+    PRIMARY KEY (grupo, nombre, estado)
+);
+"""
+
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
+}
+
+# Fechas del encabezado: "31 de diciembre de 2024", "Diciembre 2024", "31/12/2024", "12/2024", "2024-12-31"
+_MONTH_NAME_RE = re.compile(rf"(?i)\b({'|'.join(MESES)})\b\s+(?:de[l]?\s+)?(\d{{4}})\b")
+_DAY_MONTH_YEAR_RE = re.compile(r"\b(?:\d{1,2}[/.-])?(\d{1,2})[/.-](\d{4})\b")
+_YEAR_MONTH_RE = re.compile(r"\b(\d{4})[/.-](\d{1,2})(?:[/.-]\d{1,2})?\b")
+# Líneas del encabezado que son el título del estado y no la entidad
+_TITLE_RE = re.compile(r"(?i)^(estado|balance|informe|reporte|notas?)\b")
+
+_lock = threading.RLock()
+_connection = None
+
+def enabled():
+    """Indica si el historial está activado."""
+    return bool(HISTORY_FILE)
+
+def get_connection():
+    """
+    Devuelve la conexión al historial, creándola (y el esquema) la primera vez.
+
+    Returns:
+        sqlite3.Connection: Conexión al historial.
+    """
+    global _connection
+    with _lock:
+        if _connection is None:
+            connection = sqlite3.connect(HISTORY_FILE, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            _connection = connection
+        return _connection
+
+def close():
+    """Cierra la conexión al historial."""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+@contextmanager
+def transaction():
+    """
+    Agrupa varias escrituras en una sola transacción.
+
+    Yields:
+        sqlite3.Connection: Conexión sobre la que ejecutar las sentencias.
+    """
+    connection = get_connection()
+    with _lock:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+def parse_period(text):
+    """
+    Busca una fecha en un texto y devuelve su periodo.
+
+    Args:
+        text (str): Texto con una fecha ("Al 31 de diciembre de 2024", "12/2024"...).
+
+    Returns:
+        str: Periodo 'AAAA-MM', o None si el texto no tiene una fecha reconocible.
+    """
+    match = _MONTH_NAME_RE.search(text)
+    if match:
+        return f"{int(match.group(2)):04d}-{MESES[match.group(1).lower()]:02d}"
+    match = _YEAR_MONTH_RE.search(text)
+    if match and 1 <= int(match.group(2)) <= 12:
+        return f"{int(match.group(1)):04d}-{int(match.group(2)):02d}"
+    match = _DAY_MONTH_YEAR_RE.search(text)
+    if match and 1 <= int(match.group(1)) <= 12:
+        return f"{int(match.group(2)):04d}-{int(match.group(1)):02d}"
+    return None
+
+def statement_period(statement, content_hash=None):
+    """
+    Periodo de un estado: la primera fecha de su encabezado o, si no tiene, la
+    fecha del primer correo del que llegó el archivo.
+
+    Args:
+        statement (FinancialStatement): Estado financiero.
+        content_hash (str, optional): SHA-256 del archivo, para buscar el correo en el registro.
+
+    Returns:
+        str: Periodo 'AAAA-MM', o None si no se pudo determinar.
+    """
+    for line in getattr(statement, 'encabezado', ()):
+        periodo = parse_period(line)
+        if periodo:
+            return periodo
+    attachment = ledger.get_attachment(content_hash) if content_hash else None
+    for correo in (attachment or {}).get('correos', []):
+        if correo['recibido']:
+            return correo['recibido'][:7]
+    return None
+
+def statement_entity(statement):
+    """Entidad de un estado: la primera línea del encabezado que no es una fecha ni un título."""
+    for line in getattr(statement, 'encabezado', ()):
+        if not parse_period(line) and not _TITLE_RE.match(line):
+            return line
+    return DEFAULT_ENTITY
+
+def _account_rows(statement, niveles, hojas):
+    """Filas de la tabla cuentas (sin el estado) de todas las cuentas de un estado."""
+    return zip(
+        statement.codigos.tolist(),
+        [None if descripcion is None else str(descripcion) for descripcion in statement.descripciones.tolist()],
+        statement.valores.tolist(),
+        pd.Series(statement.tipos, dtype=object).tolist(),
+        pd.Series(statement.categorias, dtype=object).tolist(),
+        [int(nivel) for nivel in niveles],
+        [int(hoja) for hoja in hojas]
+    )
+
+def _summary_rows(analysis_results):
+    """Filas (grupo, nombre, valor) de la tabla resumen con los totales de un análisis."""
+    resumen = [('tipo', tipo, valor) for tipo, valor in analysis_results.get('por_tipo', {}).items()]
+    resumen += [('categoria', categoria, valor) for categoria, valor in analysis_results.get('por_categoria', {}).items()]
+    resumen += [('total', clave, valor) for clave, valor in analysis_results.items()
+                if clave.startswith('total_') or clave == 'utilidad']
+    return resumen
+
+def record(financial_data, analysis_results, content_hash, nombre=None, hoja=None, periodo=None, entidad=None,
+           nivel=None):
+    """
+    Guarda un estado analizado en el historial.
+
+    Si ya había un estado de la misma entidad, periodo y hoja (por ejemplo, un
+    estado corregido que se vuelve a enviar), se reemplaza.
+
+    Args:
+        financial_data (FinancialStatement|list): Datos financieros.
+        analysis_results (dict): Resultados de analyze_financial_data.
+        content_hash (str): SHA-256 del archivo de origen.
+        nombre (str, optional): Nombre del archivo de origen.
+        hoja (str, optional): Hoja del libro de Excel.
+        periodo (str, optional): Periodo 'AAAA-MM'. Por defecto, statement_period.
+        entidad (str, optional): Entidad. Por defecto, statement_entity.
+        nivel (int, optional): Nivel del árbol con el que se calcularon los
+            totales (el level de analyze_financial_data). Por defecto, las hojas.
+
+    Returns:
+        tuple: (entidad, periodo) guardados, o None si no se pudo determinar el periodo.
+    """
+    statement = as_statement(financial_data)
+    periodo = periodo or statement_period(statement, content_hash)
+    if periodo is None:
+        logging.warning(f"{nombre or content_hash}: no se encontró la fecha del estado; no se guarda en el historial")
+        return None
+    entidad = entidad or statement_entity(statement)
+
+    index = analysis_results.get('jerarquia') or statement.hierarchy()
+    cuentas = _account_rows(statement, code_depths(statement, index), leaf_mask(statement, index))
+    resumen = _summary_rows(analysis_results)
+
+    with transaction() as connection:
+        row = connection.execute(
+            "SELECT id FROM estados WHERE entidad = ? AND periodo = ? AND hoja = ?", (entidad, periodo, hoja or '')
+        ).fetchone()
+        if row is not None:
+            connection.execute("DELETE FROM cuentas WHERE estado = ?", (row[0],))
+            connection.execute("DELETE FROM resumen WHERE estado = ?", (row[0],))
+            connection.execute("DELETE FROM estados WHERE id = ?", (row[0],))
+        estado = connection.execute(
+            "INSERT INTO estados (entidad, periodo, hoja, hash, nombre, registrado, nivel) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entidad, periodo, hoja or '', content_hash, nombre, datetime.now().isoformat(timespec='seconds'), nivel)
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO cuentas (estado, codigo, descripcion, valor, tipo, categoria, nivel, es_hoja) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((estado,) + cuenta for cuenta in cuentas)
+        )
+        connection.executemany(
+            "INSERT INTO resumen (estado, grupo, nombre, valor) VALUES (?, ?, ?, ?)",
+            ((estado,) + fila for fila in resumen)
+        )
+    logging.info(f"Estado de {entidad} ({periodo}) guardado en el historial")
+    return entidad, periodo
+
+def find_version(entidad, periodo, hoja=None):
+    """
+    Busca la versión guardada de un estado.
+
+    Returns:
+        dict: 'estado' (identificador), 'hash', 'nombre', 'registrado' y 'nivel'
+            (nivel de los totales guardados, None si son de las hojas), o None
+            si no hay ningún estado de esa entidad, periodo y hoja.
+    """
+    with _lock:
+        row = get_connection().execute(
+            "SELECT id, hash, nombre, registrado, nivel FROM estados WHERE entidad = ? AND periodo = ? AND hoja = ?",
+            (entidad, periodo, hoja or '')
+        ).fetchone()
+    if row is None:
+        return None
+    return {'estado': row[0], 'hash': row[1], 'nombre': row[2], 'registrado': row[3], 'nivel': row[4]}
+
+def load_version(estado):
+    """
+    Lee una versión guardada de un estado.
+
+    Args:
+        estado (int): Identificador de la versión (ver find_version).
+
+    Returns:
+        tuple: (FinancialStatement con las cuentas guardadas, diccionario con
+            'por_tipo', 'por_categoria' y los totales del análisis guardado).
+    """
+    cuentas = _query("SELECT codigo, descripcion, valor, tipo, categoria FROM cuentas WHERE estado = ? ORDER BY rowid",
+                     (estado,))
+    statement = FinancialStatement(*(cuentas[field].tolist() for field in FIELDS))
+
+    resultados = {'por_tipo': {}, 'por_categoria': {}}
+    with _lock:
+        filas = get_connection().execute(
+            "SELECT grupo, nombre, valor FROM resumen WHERE estado = ? ORDER BY rowid", (estado,)).fetchall()
+    for grupo, nombre, valor in filas:
+        if grupo == 'total':
+            resultados[nombre] = valor
+        else:
+            resultados[f"por_{grupo}"][nombre] = valor
+    return statement, resultados
+
+def load_batch(entidad=None, periodo=None):
+    """
+    Lee de una vez varios estados guardados, apilados para consolidarlos.
+
+    El nivel de cada cuenta y si es hoja se toman del historial, sin volver a
+    calcular el árbol de códigos.
+
+    Args:
+        entidad (str, optional): Solo los estados de esta entidad.
+        periodo (str, optional): Solo los periodos que empiezan así ('2024'
+            para todos los meses de 2024, '2024-03' para marzo).
+
+    Returns:
+        StatementBatch: Estados ordenados por entidad, periodo y hoja (ver
+            processors.consolidation).
+    """
+    sql = ("SELECT c.estado, e.entidad, e.periodo, c.codigo, c.descripcion, c.valor, c.tipo, c.categoria, "
+           "c.nivel, c.es_hoja FROM estados e JOIN cuentas c ON c.estado = e.id "
+           "WHERE (? IS NULL OR e.entidad = ?) AND (? IS NULL OR e.periodo LIKE ? || '%') "
+           "ORDER BY e.entidad, e.periodo, e.hoja, c.rowid")
+    cuentas = _query(sql, (entidad, entidad, periodo, periodo))
+    estados, _ = pd.factorize(cuentas['estado'])
+    first = np.unique(estados, return_index=True)[1]
+    batch = StatementBatch(
+        FinancialStatement(*(cuentas[field].tolist() for field in FIELDS)),
+        estados,
+        cuentas['entidad'].to_numpy()[first].tolist(),
+        cuentas['periodo'].to_numpy()[first].tolist()
+    )
+    batch.set_tree(cuentas['nivel'].to_numpy(dtype=np.int64), cuentas['es_hoja'].to_numpy(dtype=bool))
+    return batch
+
+def replace_accounts(estado, financial_data, codigos, niveles, hojas, analysis_results, content_hash, nombre=None):
+    """
+    Actualiza una versión guardada reemplazando solo las cuentas de unos códigos.
+
+    Se usa para guardar un estado corregido sin volver a escribir las cuentas
+    que no cambiaron (ver processors.incremental).
+
+    Args:
+        estado (int): Identificador de la versión (ver find_version).
+        financial_data (FinancialStatement|list): Nueva versión del estado.
+        codigos (iterable): Códigos cuyas cuentas se reemplazan (los que ya no
+            están en el estado se borran).
+        niveles (dict): Código -> nivel en el árbol, para los códigos del estado.
+        hojas (dict): Código -> si es hoja, para los códigos del estado.
+        analysis_results (dict): Totales del análisis de la nueva versión.
+        content_hash (str): SHA-256 del archivo de la nueva versión.
+        nombre (str, optional): Nombre del archivo de la nueva versión.
+    """
+    statement = as_statement(financial_data)
+    codigos = list(codigos)
+    positions = np.flatnonzero(np.isin(statement.codigos, np.array(codigos, dtype=object)))
+    changed = statement.take(positions)
+    cuentas = _account_rows(changed, (niveles[codigo] for codigo in changed.codigos),
+                            (hojas[codigo] for codigo in changed.codigos))
+
+    with transaction() as connection:
+        connection.executemany("DELETE FROM cuentas WHERE codigo = ? AND estado = ?",
+                               ((codigo, estado) for codigo in codigos))
+        connection.executemany(
+            "INSERT INTO cuentas (estado, codigo, descripcion, valor, tipo, categoria, nivel, es_hoja) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((estado,) + cuenta for cuenta in cuentas)
+        )
+        connection.execute("DELETE FROM resumen WHERE estado = ?", (estado,))
+        connection.executemany(
+            "INSERT INTO resumen (estado, grupo, nombre, valor) VALUES (?, ?, ?, ?)",
+            ((estado,) + fila for fila in _summary_rows(analysis_results))
+        )
+        connection.execute(
+            "UPDATE estados SET hash = ?, nombre = ?, registrado = ? WHERE id = ?",
+            (content_hash, nombre, datetime.now().isoformat(timespec='seconds'), estado)
+        )
+
+def _query(sql, params=()):
+    with _lock:
+        return pd.read_sql_query(sql, get_connection(), params=params)
+
+def periods(entidad=None):
+    """
+    Estados guardados en el historial.
+
+    Returns:
+        pandas.DataFrame: Columnas 'entidad', 'periodo', 'hoja', 'nombre', 'cuentas' y 'registrado'.
+    """
+    sql = ("SELECT e.entidad, e.periodo, e.hoja, e.nombre, COUNT(c.estado) AS cuentas, e.registrado "
+           "FROM estados e LEFT JOIN cuentas c ON c.estado = e.id "
+           "WHERE (? IS NULL OR e.entidad = ?) GROUP BY e.id ORDER BY e.entidad, e.periodo, e.hoja")
+    return _query(sql, (entidad, entidad))
+
+def account_series(codigo, entidad=None):
+    """
+    Valor de una cuenta en cada periodo.
+
+    Args:
+        codigo (str): Código de la cuenta.
+        entidad (str, optional): Solo los estados de esta entidad.
+
+    Returns:
+        pandas.DataFrame: Columnas 'entidad', 'periodo' y 'valor', ordenadas por periodo.
+    """
+    sql = ("SELECT e.entidad, e.periodo, SUM(c.valor) AS valor FROM cuentas c JOIN estados e ON e.id = c.estado "
+           "WHERE c.codigo = ? AND (? IS NULL OR e.entidad = ?) GROUP BY e.entidad, e.periodo "
+           "ORDER BY e.entidad, e.periodo")
+    return _query(sql, (str(codigo), entidad, entidad))
+
+def summary_series(grupo, nombre, entidad=None):
+    """
+    Valor de un total del análisis en cada periodo.
+
+    Args:
+        grupo (str): 'categoria', 'tipo' o 'total'.
+        nombre (str): Categoría, tipo o clave del total ('total_activos', 'utilidad'...).
+        entidad (str, optional): Solo los estados de esta entidad.
+
+    Returns:
+        pandas.DataFrame: Columnas 'entidad', 'periodo' y 'valor', ordenadas por periodo.
+    """
+    sql = ("SELECT e.entidad, e.periodo, SUM(r.valor) AS valor FROM resumen r JOIN estados e ON e.id = r.estado "
+           "WHERE r.grupo = ? AND r.nombre = ? AND (? IS NULL OR e.entidad = ?) GROUP BY e.entidad, e.periodo "
+           "ORDER BY e.entidad, e.periodo")
+    return _query(sql, (grupo, nombre, entidad, entidad))
+
+def category_series(categoria, entidad=None):
+    """Valor de una categoría en cada periodo (ver summary_series)."""
+    return summary_series('categoria', categoria, entidad)
+
+def _previous_year(periodo):
+    year, month = periodo.split('-')
+    return f"{int(year) - 1:04d}-{month}"
+
+def with_changes(series):
+    """
+    Añade a una serie la variación respecto al periodo anterior y al mismo mes del año anterior.
+
+    Args:
+        series (pandas.DataFrame): Serie de account_series, summary_series o category_series.
+
+    Returns:
+        pandas.DataFrame: La serie con las columnas 'variacion' y 'variacion_pct'
+            (respecto al periodo anterior guardado de la misma entidad) y
+            'interanual' e 'interanual_pct' (respecto al mismo mes del año anterior).
+            Sin periodo de referencia quedan vacías.
+    """
+    series = series.sort_values(['entidad', 'periodo']).reset_index(drop=True)
+    anterior = series.groupby('entidad')['valor'].shift()
+    series['variacion'] = series['valor'] - anterior
+    series['variacion_pct'] = series['variacion'] / anterior.abs() * 100
+
+    valores = series.set_index(['entidad', 'periodo'])['valor']
+    keys = pd.MultiIndex.from_arrays([series['entidad'], series['periodo'].map(_previous_year)])
+    anio_anterior = valores.reindex(keys).to_numpy()
+    series['interanual'] = series['valor'] - anio_anterior
+    series['interanual_pct'] = series['interanual'] / abs(anio_anterior) * 100
+    return series
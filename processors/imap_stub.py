@@ -0,0 +1,274 @@
+"""
+Servidor IMAP de prueba en memoria.
+
+Implementa el subconjunto de imaplib.IMAP4 que usa mail.py (SELECT, UID SEARCH,
+UID FETCH con UID, INTERNALDATE, BODYSTRUCTURE, BODY.PEEK[<parte>]<inicio.tamaño>
+y RFC822, STATUS, NOOP y LOGOUT) para medir y probar la descarga sin red.
+"""
+
+import io
+import re
+import email
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime
+
+_UID_RANGE_RE = re.compile(r'UID (\d+|\*)(?::(\d+|\*))?', re.IGNORECASE)
+_SUBJECT_RE = re.compile(r'SUBJECT "([^"]*)"', re.IGNORECASE)
+_SECTION_RE = re.compile(r'BODY\.PEEK\[([\d.]+)\](?:<(\d+)\.(\d+)>)?', re.IGNORECASE)
+
+def _quote(value):
+    if value is None:
+        return 'NIL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _params(pairs):
+    pairs = [(k, v) for k, v in pairs if v is not None]
+    if not pairs:
+        return 'NIL'
+    return '(' + ' '.join(f"{_quote(k.upper())} {_quote(v)}" for k, v in pairs) + ')'
+
+def _raw_body(part):
+    """Contenido codificado (tal como viaja en el correo) de una parte simple."""
+    payload = part.get_payload(decode=False)
+    if isinstance(payload, str):
+        return payload.encode('utf-8', errors='surrogateescape')
+    return bytes(payload or b'')
+
+def bodystructure(part):
+    """Genera el BODYSTRUCTURE IMAP de un correo o de una de sus partes."""
+    content_type = part.get_content_type()
+    main_type, sub_type = content_type.split('/')
+
+    if part.is_multipart() and content_type != 'message/rfc822':
+        children = ''.join(bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(sub_type.upper())})"
+
+    params = _params([(k, v) for k, v in part.get_params(header='content-type')[1:]])
+    encoding = (part.get('Content-Transfer-Encoding') or '7bit').upper()
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_param('filename', header='content-disposition')
+        disposition = f"({_quote(disposition)} {_params([('filename', filename)])})"
+    else:
+        disposition = 'NIL'
+
+    if content_type == 'message/rfc822':
+        inner = part.get_payload(0)
+        body = inner.as_bytes()
+        lines = body.count(b'\n')
+        envelope = '(' + ' '.join(['NIL'] * 10) + ')'
+        return (f"({_quote(main_type.upper())} {_quote(sub_type.upper())} {params} NIL NIL "
+                f"{_quote(encoding)} {len(body)} {envelope} {bodystructure(inner)} {lines} "
+                f"NIL {disposition} NIL)")
+
+    body = _raw_body(part)
+    lines = ' %d' % body.count(b'\n') if main_type == 'text' else ''
+    return (f"({_quote(main_type.upper())} {_quote(sub_type.upper())} {params} NIL NIL "
+            f"{_quote(encoding)} {len(body)}{lines} NIL {disposition} NIL)")
+
+def get_section(msg, part_id):
+    """Devuelve la parte identificada por part_id ('1', '2.1', ...) según la numeración IMAP."""
+    current = msg
+    for number in (int(n) for n in part_id.split('.')):
+        if current.get_content_type() == 'message/rfc822':
+            current = current.get_payload(0)
+        if current.is_multipart():
+            current = current.get_payload(number - 1)
+    return current
+
+class StubServer:
+    """
+    Buzón en memoria compartido por todas las conexiones de prueba.
+
+    Es seguro usarlo desde varios hilos, así se puede probar la descarga con
+    IMAP_CONNECTIONS > 1.
+    """
+
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = {}
+        self.next_uid = 1
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def add_message(self, message, internaldate=None):
+        """
+        Añade un correo al buzón.
+
+        Args:
+            message (bytes|email.message.Message): Correo a añadir.
+            internaldate (datetime, optional): Fecha de recepción. Por defecto, ahora.
+
+        Returns:
+            int: UID asignado.
+        """
+        if isinstance(message, bytes):
+            message = email.message_from_bytes(message)
+        with self.lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages[uid] = (message, internaldate or datetime.now(timezone.utc))
+        return uid
+
+    def seed(self, count, start_date=None, seed=0):
+        """
+        Llena el buzón con correos sintéticos de estados financieros.
+
+        Returns:
+            list: UIDs asignados.
+        """
+        rng = random.Random(seed)
+        start_date = start_date or datetime(2024, 1, 1, tzinfo=timezone.utc)
+        return [self.add_message(make_statement_email(i, rng), start_date + timedelta(hours=i))
+                for i in range(count)]
+
+    def connect(self):
+        """Abre una conexión de prueba ya autenticada y con el buzón seleccionado."""
+        connection = StubIMAP4(self)
+        connection.login('stub', 'stub')
+        connection.select('inbox')
+        return connection
+
+class StubIMAP4:
+    """Conexión de prueba con la misma interfaz que imaplib.IMAP4 para los comandos usados."""
+
+    def __init__(self, server):
+        self.server = server
+        self.capabilities = ('IMAP4REV1',)
+        self.untagged_responses = {}
+        self.state = 'NONAUTH'
+
+    def _count(self):
+        with self.server.lock:
+            self.server.commands += 1
+
+    def login(self, user, password):
+        self._count()
+        self.state = 'AUTH'
+        return 'OK', [b'LOGIN completed']
+
+    def select(self, mailbox='INBOX'):
+        self._count()
+        self.state = 'SELECTED'
+        self.untagged_responses['UIDVALIDITY'] = [str(self.server.uidvalidity).encode()]
+        return 'OK', [str(len(self.server.messages)).encode()]
+
+    def response(self, code):
+        return code, self.untagged_responses.pop(code.upper(), [None])
+
+    def status(self, mailbox, names):
+        self._count()
+        return 'OK', [f'{mailbox} (UIDVALIDITY {self.server.uidvalidity} MESSAGES {len(self.server.messages)})'.encode()]
+
+    def noop(self):
+        self._count()
+        return 'OK', [b'NOOP completed']
+
+    def logout(self):
+        self._count()
+        self.state = 'LOGOUT'
+        return 'BYE', [b'LOGOUT']
+
+    def uid(self, command, *args):
+        self._count()
+        command = command.upper()
+        if command == 'SEARCH':
+            return 'OK', [' '.join(str(uid) for uid in self._search(' '.join(args))).encode()]
+        if command == 'FETCH':
+            return 'OK', self._fetch(args[0], args[1])
+        return 'BAD', [f'{command} no soportado'.encode()]
+
+    def _search(self, criteria):
+        with self.server.lock:
+            messages = dict(self.server.messages)
+        uids = sorted(messages)
+        match = _UID_RANGE_RE.search(criteria)
+        if match and uids:
+            low = uids[-1] if match.group(1) == '*' else int(match.group(1))
+            high = match.group(2) or match.group(1)
+            high = uids[-1] if high == '*' else int(high)
+            low, high = min(low, high), max(low, high)
+            uids = [uid for uid in uids if low <= uid <= high]
+        subject = _SUBJECT_RE.search(criteria)
+        if subject:
+            text = subject.group(1).lower()
+            uids = [uid for uid in uids if text in (messages[uid][0]['Subject'] or '').lower()]
+        return uids
+
+    def _fetch(self, uid_set, items):
+        with self.server.lock:
+            messages = dict(self.server.messages)
+        uids = []
+        for piece in str(uid_set).split(','):
+            low, _, high = piece.partition(':')
+            uids.extend(range(int(low), int(high or low) + 1))
+
+        response = []
+        for seq, uid in enumerate(uids, start=1):
+            if uid not in messages:
+                continue
+            msg, internaldate = messages[uid]
+            header = f"{seq} (UID {uid}"
+            if 'INTERNALDATE' in items.upper():
+                header += f' INTERNALDATE "{internaldate.strftime("%d-%b-%Y %H:%M:%S %z")}"'
+            if 'BODYSTRUCTURE' in items.upper():
+                header += f" BODYSTRUCTURE {bodystructure(msg)}"
+
+            literals = []
+            if 'RFC822' in items.upper():
+                literals.append(('RFC822', msg.as_bytes()))
+            for part_id, offset, length in _SECTION_RE.findall(items):
+                body = _raw_body(get_section(msg, part_id))
+                name = f"BODY[{part_id}]"
+                if offset:
+                    body = body[int(offset):int(offset) + int(length)]
+                    name += f"<{offset}>"
+                literals.append((name, body))
+
+            if not literals:
+                response.append((header + ')').encode())
+                continue
+            for index, (name, data) in enumerate(literals):
+                prefix = header if index == 0 else ''
+                response.append((f"{prefix} {name} {{{len(data)}}}".encode(), data))
+            response.append(b')')
+        return response
+
+def make_statement_email(index, rng=None):
+    """
+    Crea un correo sintético con un estado financiero en CSV y adjuntos de relleno
+    (una imagen JPEG y un PDF), como los que llegan al buzón real.
+
+    Args:
+        index (int): Número del correo (para nombres y asunto).
+        rng (random.Random, optional): Generador de números aleatorios.
+
+    Returns:
+        email.message.EmailMessage: Correo generado.
+    """
+    rng = rng or random.Random(index)
+    msg = EmailMessage()
+    msg['Subject'] = f"Estado Financiero {index}"
+    msg['From'] = 'contabilidad@example.com'
+    msg['To'] = 'finca@example.com'
+    msg['Message-ID'] = f"<estado-{index}@example.com>"
+    msg['Date'] = format_datetime(datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=index))
+    msg.set_content("Adjunto el estado de situación financiera.")
+
+    csv = io.StringIO()
+    csv.write("Estado de situación financiera,,\n")
+    csv.write("Código cuenta contable,Nombre cuenta contable,Saldo\n")
+    for code, name in (('1', 'Activo'), ('1445', 'Semovientes'), ('1504', 'Terrenos'),
+                       ('2', 'Pasivo'), ('2335', 'Costos y gastos por pagar'),
+                       ('4', 'Ingresos'), ('5', 'Gastos'), ('6', 'Costos')):
+        csv.write(f"{code},{name},{rng.randint(1, 10_000_000)}\n")
+    msg.add_attachment(csv.getvalue().encode('utf-8'), maintype='text', subtype='csv',
+                       filename=f"Estado_de_situacion_financiera_{index}.csv")
+    msg.add_attachment(rng.randbytes(64 * 1024), maintype='image', subtype='jpeg',
+                       filename=f"foto_{index}.jpeg")
+    msg.add_attachment(rng.randbytes(32 * 1024), maintype='application', subtype='pdf',
+                       filename=f"{index}.pdf")
+    return msg
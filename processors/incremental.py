@@ -0,0 +1,266 @@
+"""
+Análisis incremental de un estado corregido contra su versión anterior.
+
+Cuando un estado se vuelve a enviar con unas pocas cuentas corregidas, en
+lugar de repetir todo el análisis se comparan las dos versiones por código
+(diff_statements) y se recalcula solo lo que depende de las cuentas que
+cambiaron (incremental_analysis):
+
+- Los totales por tipo, por categoría y de cada total_* se actualizan con la
+  diferencia de las hojas afectadas: las cuentas cambiadas, agregadas o
+  eliminadas y las que pasaron de ser hoja a tener subcuentas (o al revés).
+- Los subtotales y descuadres se recalculan solo para los ancestros de esas
+  cuentas.
+
+Todo se hace por columnas sobre los códigos ordenados: las subcuentas de un
+código son un tramo contiguo del orden, así que saber si un código es hoja y
+sumar las hojas de un subárbol no requiere construir el árbol de códigos.
+"""
+
+import numpy as np
+from processors.statement import as_statement
+from processors.financial_data import TOTALES_POR_TIPO
+from processors.rollup import ROLLUP_TOLERANCE
+from processors.report_generator import ordered_categories
+
+# Mayor que cualquier carácter: los códigos que empiezan por p están entre p y p + _MAX_CHAR
+_MAX_CHAR = '\U0010ffff'
+
+class _CodeTable:
+    """
+    Un elemento por código distinto de un estado, con los códigos ordenados:
+    valor sumado, descripción, tipo y categoría de la primera cuenta con ese
+    código y si es hoja.
+    """
+
+    def __init__(self, statement):
+        statement = as_statement(statement)
+        self.codigos, first, inverse = np.unique(statement.codigos.astype(str), return_index=True, return_inverse=True)
+        self.valores = np.bincount(inverse, weights=statement.valores, minlength=len(self.codigos))
+        self.descripciones = statement.descripciones[first]
+        self.tipos = np.asarray(statement.tipos.categories, dtype=object)[statement.tipos.codes[first]] \
+            if len(first) else np.empty(0, dtype=object)
+        self.categorias = np.asarray(statement.categorias.categories, dtype=object)[statement.categorias.codes[first]] \
+            if len(first) else np.empty(0, dtype=object)
+        # Un código tiene subcuentas si el siguiente en orden empieza por él
+        parent = np.zeros(len(self.codigos), dtype=bool)
+        if len(self.codigos) > 1:
+            parent[:-1] = np.char.startswith(self.codigos[1:], self.codigos[:-1])
+        self.hojas = ~parent
+        self._set = None
+
+    def __contains__(self, codigo):
+        if self._set is None:
+            self._set = set(self.codigos.tolist())
+        return codigo in self._set
+
+    def positions(self, codigos):
+        """Posición de cada código (que debe estar en la tabla)."""
+        return np.searchsorted(self.codigos, np.asarray(codigos, dtype=str))
+
+    def prefixes(self, codigo):
+        """Prefijos de un código que están en la tabla, del más corto al más largo."""
+        return [codigo[:length] for length in range(1, len(codigo)) if codigo[:length] in self]
+
+    def subtree(self, codigo):
+        """Tramo [inicio, fin) de los códigos que empiezan por codigo (incluido él mismo)."""
+        return np.searchsorted(self.codigos, [codigo, codigo + _MAX_CHAR])
+
+def diff_statements(anterior, nuevo):
+    """
+    Compara dos versiones de un estado por código de cuenta.
+
+    Args:
+        anterior (FinancialStatement|list): Versión anterior.
+        nuevo (FinancialStatement|list): Versión nueva.
+
+    Returns:
+        dict: 'agregadas' y 'eliminadas' (listas de diccionarios con 'codigo',
+            'descripcion' y 'valor') y 'modificadas' (con 'codigo',
+            'descripcion', 'anterior', 'nuevo' y 'diferencia'), ordenadas por
+            código. Una cuenta con el valor igual y otra descripción cuenta como
+            modificada.
+    """
+    return _diff(_CodeTable(anterior), _CodeTable(nuevo))
+
+def _accounts(table, positions):
+    return [{'codigo': codigo, 'descripcion': descripcion, 'valor': valor} for codigo, descripcion, valor in zip(
+        table.codigos[positions].tolist(), table.descripciones[positions].tolist(), table.valores[positions].tolist())]
+
+def _diff(old, new):
+    _, old_both, new_both = np.intersect1d(old.codigos, new.codigos, assume_unique=True, return_indices=True)
+    changed = (old.valores[old_both] != new.valores[new_both]) \
+        | (old.descripciones[old_both].astype(str) != new.descripciones[new_both].astype(str))
+    old_changed, new_changed = old_both[changed], new_both[changed]
+    return {
+        'agregadas': _accounts(new, np.flatnonzero(~np.isin(new.codigos, old.codigos, assume_unique=True))),
+        'eliminadas': _accounts(old, np.flatnonzero(~np.isin(old.codigos, new.codigos, assume_unique=True))),
+        'modificadas': [
+            {'codigo': codigo, 'descripcion': descripcion, 'anterior': anterior, 'nuevo': valor, 'diferencia': valor - anterior}
+            for codigo, descripcion, anterior, valor in zip(
+                new.codigos[new_changed].tolist(), new.descripciones[new_changed].tolist(),
+                old.valores[old_changed].tolist(), new.valores[new_changed].tolist())
+        ]
+    }
+
+def _contributions(table, codigos, grupos):
+    """Suma de los valores de las hojas de unos códigos, por tipo o por categoría."""
+    codigos = [codigo for codigo in codigos if codigo in table]
+    positions = table.positions(codigos) if codigos else np.empty(0, dtype=np.int64)
+    positions = positions[table.hojas[positions]]
+    sums = {}
+    for grupo, valor in zip(grupos[positions].tolist(), table.valores[positions].tolist()):
+        sums[grupo] = sums.get(grupo, 0) + valor
+    return sums
+
+def _update(previos, old, new, affected, campo):
+    """Totales de un campo ('tipos' o 'categorias') actualizados con la diferencia de las hojas afectadas."""
+    antes = _contributions(old, affected, getattr(old, campo))
+    despues = _contributions(new, affected, getattr(new, campo))
+    totales = dict(previos)
+    for clave in dict.fromkeys(list(antes) + list(despues)):
+        totales[clave] = totales.get(clave, 0) + despues.get(clave, 0) - antes.get(clave, 0)
+    # Solo los tipos o categorías que siguen teniendo cuentas
+    presentes = set(getattr(new, campo).tolist())
+    return {clave: valor for clave, valor in totales.items() if clave in presentes}
+
+def incremental_analysis(anterior, resultados_anteriores, nuevo, tolerance=None):
+    """
+    Actualiza el análisis de la versión anterior de un estado con los cambios de la nueva.
+
+    Los totales se calculan con las hojas del árbol de códigos, como
+    analyze_financial_data sin nivel.
+
+    Args:
+        anterior (FinancialStatement|list): Versión anterior del estado.
+        resultados_anteriores (dict): 'por_tipo' y 'por_categoria' de la versión
+            anterior (por ejemplo, de processors.history.load_version).
+        nuevo (FinancialStatement|list): Versión nueva del estado.
+        tolerance (float, optional): Diferencia admitida en los descuadres. Por
+            defecto ROLLUP_TOLERANCE.
+
+    Returns:
+        dict: 'cambios' (ver diff_statements), 'afectadas' (códigos de la nueva
+            versión cuyas cuentas cambiaron, incluidos los que cambiaron de
+            nivel o dejaron de ser hoja), 'niveles' y 'hojas' de esos códigos,
+            'por_tipo', 'por_categoria', los total_* y 'utilidad' actualizados,
+            y 'subtotales' y 'descuadres' de los ancestros de las cuentas
+            cambiadas.
+    """
+    tolerance = ROLLUP_TOLERANCE if tolerance is None else tolerance
+    old, new = _CodeTable(anterior), _CodeTable(nuevo)
+    cambios = _diff(old, new)
+
+    _, old_both, new_both = np.intersect1d(old.codigos, new.codigos, assume_unique=True, return_indices=True)
+    leaf_changed = new.codigos[new_both[old.hojas[old_both] != new.hojas[new_both]]].tolist()
+    added = [cambio['codigo'] for cambio in cambios['agregadas']]
+    removed = [cambio['codigo'] for cambio in cambios['eliminadas']]
+    affected = list(dict.fromkeys([cambio['codigo'] for cambio in cambios['modificadas']] + added + removed + leaf_changed))
+
+    results = {
+        'cambios': cambios,
+        'por_tipo': _update(resultados_anteriores.get('por_tipo', {}), old, new, affected, 'tipos'),
+        'por_categoria': _update(resultados_anteriores.get('por_categoria', {}), old, new, affected, 'categorias')
+    }
+    for tipo, valor in results['por_tipo'].items():
+        total = TOTALES_POR_TIPO.get(tipo)
+        if total:
+            results[total] = results.get(total, 0) + valor
+    results['utilidad'] = results.get('total_ingresos', 0) - results.get('total_gastos', 0) - results.get('total_costos', 0)
+
+    # Códigos cuyo nivel cambia: las subcuentas de los códigos agregados o eliminados
+    renivelados = []
+    for codigo in added + removed:
+        start, end = new.subtree(codigo)
+        renivelados.extend(new.codigos[start:end].tolist())
+    afectadas = [codigo for codigo in dict.fromkeys(affected + renivelados) if codigo in new]
+    results['afectadas'] = afectadas
+    results['niveles'] = {codigo: len(new.prefixes(codigo)) for codigo in afectadas}
+    results['hojas'] = dict(zip(afectadas, new.hojas[new.positions(afectadas)].tolist())) if afectadas else {}
+
+    # Subtotales de los ancestros de las cuentas afectadas (solo los que siguen
+    # teniendo subcuentas): suma de las hojas de su tramo
+    ancestros = set()
+    for codigo in affected:
+        ancestros.update(new.prefixes(codigo))
+        if codigo in new:
+            ancestros.add(codigo)
+    ancestros = sorted(ancestros)
+    ancestros = [codigo for codigo, hoja in zip(ancestros, new.hojas[new.positions(ancestros)].tolist()) if not hoja] \
+        if ancestros else []
+    leaf_sums = np.concatenate([[0.0], np.cumsum(np.where(new.hojas, new.valores, 0.0))])
+    results['subtotales'] = {}
+    results['descuadres'] = []
+    for codigo in ancestros:
+        start, end = new.subtree(codigo)
+        position = start
+        calculado = float(leaf_sums[end] - leaf_sums[start])
+        reportado = float(new.valores[position])
+        results['subtotales'][codigo] = calculado
+        if abs(reportado - calculado) > tolerance:
+            results['descuadres'].append({
+                'codigo': codigo,
+                'descripcion': new.descripciones[position],
+                'reportado': reportado,
+                'calculado': calculado,
+                'diferencia': reportado - calculado
+            })
+    return results
+
+def render_change_report(results, entidad=None, periodo=None):
+    """
+    Genera el informe de cambios de un estado corregido línea a línea (para
+    escribirlo con processors.report_generator.write_lines).
+
+    Args:
+        results (dict): Resultado de incremental_analysis.
+        entidad (str, optional): Entidad del estado.
+        periodo (str, optional): Periodo del estado (AAAA-MM).
+
+    Yields:
+        str: Cada línea del informe, sin el salto de línea.
+    """
+    cambios = results['cambios']
+    yield "INFORME DE CAMBIOS DEL ESTADO FINANCIERO"
+    yield "-" * 30
+    if entidad or periodo:
+        yield f"{entidad or ''} {periodo or ''}".strip()
+    yield ""
+    yield f"Cuentas modificadas: {len(cambios['modificadas'])}"
+    yield f"Cuentas agregadas: {len(cambios['agregadas'])}"
+    yield f"Cuentas eliminadas: {len(cambios['eliminadas'])}"
+    yield ""
+
+    if cambios['modificadas']:
+        yield "MODIFICADAS"
+        yield "-" * 30
+        for cambio in cambios['modificadas']:
+            yield (f"{cambio['codigo']} {cambio['descripcion']}: ${cambio['anterior']:,.2f} -> "
+                   f"${cambio['nuevo']:,.2f} (diferencia ${cambio['diferencia']:,.2f})")
+        yield ""
+    for titulo, clave in (("AGREGADAS", 'agregadas'), ("ELIMINADAS", 'eliminadas')):
+        if cambios[clave]:
+            yield titulo
+            yield "-" * 30
+            for cuenta in cambios[clave]:
+                yield f"{cuenta['codigo']} {cuenta['descripcion']}: ${cuenta['valor']:,.2f}"
+            yield ""
+
+    yield "TOTALES ACTUALIZADOS"
+    yield "-" * 30
+    yield f"Total Ingresos: ${results.get('total_ingresos', 0):,.2f}"
+    yield f"Total Egresos: ${results.get('total_gastos', 0) + results.get('total_costos', 0):,.2f}"
+    for categoria, valor in ordered_categories(results['por_categoria']):
+        yield f"    {categoria.capitalize()}: ${valor:,.2f}"
+    yield f"Total Utilidad: ${results['utilidad']:,.2f}"
+    yield ""
+
+    if results['descuadres']:
+        yield "DESCUADRES EN LAS CUENTAS AFECTADAS"
+        yield "-" * 30
+        for descuadre in results['descuadres']:
+            yield (f"{descuadre['codigo']} {descuadre['descripcion']}: "
+                   f"reportado ${descuadre['reportado']:,.2f}, "
+                   f"subcuentas ${descuadre['calculado']:,.2f}, "
+                   f"diferencia ${descuadre['diferencia']:,.2f}")
+        yield ""
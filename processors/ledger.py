@@ -0,0 +1,286 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+import logging
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Registro SQLite de correos, adjuntos, etapas de procesamiento y puntos de control
+LEDGER_FILE = os.getenv('LEDGER_FILE', 'ledger.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    fuente TEXT PRIMARY KEY,
+    uidvalidity INTEGER,
+    last_uid INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS mensajes (
+    fuente TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL DEFAULT 0,
+    uid TEXT NOT NULL,
+    recibido TEXT,
+    descargado TEXT NOT NULL,
+    duracion REAL,
+    PRIMARY KEY (fuente, uidvalidity, uid)
+);
+CREATE TABLE IF NOT EXISTS adjuntos (
+    hash TEXT PRIMARY KEY,
+    archivo TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS adjunto_nombres (
+    hash TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    PRIMARY KEY (hash, nombre)
+);
+CREATE TABLE IF NOT EXISTS adjunto_mensajes (
+    hash TEXT NOT NULL,
+    fuente TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL DEFAULT 0,
+    uid TEXT NOT NULL,
+    PRIMARY KEY (hash, fuente, uidvalidity, uid)
+);
+CREATE INDEX IF NOT EXISTS idx_adjunto_mensajes_uid ON adjunto_mensajes (fuente, uidvalidity, uid);
+CREATE TABLE IF NOT EXISTS etapas (
+    hash TEXT NOT NULL,
+    hoja TEXT NOT NULL DEFAULT '',
+    etapa TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    inicio TEXT NOT NULL,
+    duracion REAL,
+    error TEXT,
+    PRIMARY KEY (hash, hoja, etapa)
+);
+"""
+
+# Etapa cuyo estado 'ok' indica que el contenido (o una hoja del libro) ya fue procesado por completo
+FINAL_STAGE = 'informe'
+
+_lock = threading.RLock()
+_connection = None
+
+def get_connection():
+    """
+    Devuelve la conexión al registro, creándola (y el esquema) la primera vez.
+
+    La conexión se comparte entre hilos protegida por un candado; el modo WAL
+    permite que otra ejecución lea mientras esta escribe.
+
+    Returns:
+        sqlite3.Connection: Conexión al registro.
+    """
+    global _connection
+    with _lock:
+        if _connection is None:
+            connection = sqlite3.connect(LEDGER_FILE, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            _connection = connection
+        return _connection
+
+def close():
+    """Cierra la conexión al registro."""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+@contextmanager
+def transaction():
+    """
+    Agrupa varias escrituras en una sola transacción.
+
+    Yields:
+        sqlite3.Connection: Conexión sobre la que ejecutar las sentencias.
+    """
+    connection = get_connection()
+    with _lock:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+def get_sync_state(fuente):
+    """
+    Lee el punto de control de sincronización de una fuente.
+
+    Returns:
+        dict: Diccionario con 'uidvalidity' y 'last_uid' (vacío si no hay punto de control).
+    """
+    with _lock:
+        row = get_connection().execute(
+            "SELECT uidvalidity, last_uid FROM sync_state WHERE fuente = ?", (fuente,)
+        ).fetchone()
+    return {'uidvalidity': row[0], 'last_uid': row[1]} if row else {}
+
+def _save_sync_state(connection, fuente, uidvalidity, last_uid):
+    connection.execute(
+        "INSERT INTO sync_state (fuente, uidvalidity, last_uid) VALUES (?, ?, ?) "
+        "ON CONFLICT (fuente) DO UPDATE SET uidvalidity = excluded.uidvalidity, last_uid = excluded.last_uid",
+        (fuente, uidvalidity, last_uid)
+    )
+
+def save_sync_state(fuente, uidvalidity, last_uid):
+    """Guarda el punto de control de sincronización de una fuente."""
+    with transaction() as connection:
+        _save_sync_state(connection, fuente, uidvalidity, last_uid)
+
+def _record_attachment(connection, attachment):
+    connection.execute(
+        "INSERT OR IGNORE INTO adjuntos (hash, archivo) VALUES (?, ?)",
+        (attachment['hash'], attachment['archivo'])
+    )
+    connection.execute(
+        "INSERT OR IGNORE INTO adjunto_nombres (hash, nombre) VALUES (?, ?)",
+        (attachment['hash'], attachment['nombre'])
+    )
+
+def record_messages(fuente, messages, uidvalidity=0, checkpoint=None):
+    """
+    Registra en una sola transacción varios correos con sus adjuntos.
+
+    Args:
+        fuente (str): Identificador de la fuente ('imap:<buzón>', 'mbox:<ruta>', ...).
+        messages (list): Diccionarios con 'uid', 'recibido', 'duracion' y 'adjuntos'
+            (lista de diccionarios con 'hash', 'archivo' y 'nombre').
+        uidvalidity (int): UIDVALIDITY del buzón (0 para fuentes locales).
+        checkpoint (int, optional): Nuevo último UID del punto de control.
+    """
+    now = datetime.now().isoformat(timespec='seconds')
+    with transaction() as connection:
+        for message in messages:
+            uid = str(message['uid'])
+            connection.execute(
+                "INSERT OR REPLACE INTO mensajes (fuente, uidvalidity, uid, recibido, descargado, duracion) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (fuente, uidvalidity, uid, message.get('recibido'), now, message.get('duracion'))
+            )
+            for attachment in message.get('adjuntos', []):
+                _record_attachment(connection, attachment)
+                connection.execute(
+                    "INSERT OR IGNORE INTO adjunto_mensajes (hash, fuente, uidvalidity, uid) VALUES (?, ?, ?, ?)",
+                    (attachment['hash'], fuente, uidvalidity, uid)
+                )
+        if checkpoint is not None:
+            _save_sync_state(connection, fuente, uidvalidity, checkpoint)
+
+def has_message(fuente, uid, uidvalidity=0):
+    """Indica si un correo ya está registrado."""
+    with _lock:
+        row = get_connection().execute(
+            "SELECT 1 FROM mensajes WHERE fuente = ? AND uidvalidity = ? AND uid = ?",
+            (fuente, uidvalidity, str(uid))
+        ).fetchone()
+    return row is not None
+
+def get_attachment(content_hash):
+    """
+    Devuelve la información registrada de un adjunto.
+
+    Returns:
+        dict: 'archivo', 'nombres' y 'correos' (lista de diccionarios con 'fuente',
+            'uid' y 'recibido'), o None si el hash no está registrado.
+    """
+    with _lock:
+        connection = get_connection()
+        row = connection.execute("SELECT archivo FROM adjuntos WHERE hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return None
+        names = [r[0] for r in connection.execute(
+            "SELECT nombre FROM adjunto_nombres WHERE hash = ? ORDER BY nombre", (content_hash,))]
+        messages = [{'fuente': r[0], 'uid': r[1], 'recibido': r[2]} for r in connection.execute(
+            "SELECT a.fuente, a.uid, m.recibido FROM adjunto_mensajes a "
+            "LEFT JOIN mensajes m ON m.fuente = a.fuente AND m.uidvalidity = a.uidvalidity AND m.uid = a.uid "
+            "WHERE a.hash = ? ORDER BY m.recibido", (content_hash,))]
+    return {'archivo': row[0], 'nombres': names, 'correos': messages}
+
+def record_stage(content_hash, etapa, estado, duracion=None, error=None, hoja=None):
+    """
+    Registra el estado y la duración de una etapa de procesamiento de un contenido.
+
+    Las etapas de cada hoja de un libro con varios estados se registran por
+    separado (hoja); las del contenido completo, sin hoja.
+    """
+    with transaction() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO etapas (hash, hoja, etapa, estado, inicio, duracion, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (content_hash, hoja or '', etapa, estado, datetime.now().isoformat(timespec='seconds'), duracion, error)
+        )
+
+@contextmanager
+def stage(content_hash, etapa, hoja=None):
+    """
+    Mide una etapa de procesamiento y registra si terminó bien o con error.
+
+    Args:
+        content_hash (str): SHA-256 del contenido procesado.
+        etapa (str): Nombre de la etapa ('carga', 'extraccion', 'analisis', 'informe', ...).
+        hoja (str, optional): Hoja del libro, si el contenido tiene varios estados.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_stage(content_hash, etapa, 'error', time.perf_counter() - start, str(e), hoja)
+        raise
+    record_stage(content_hash, etapa, 'ok', time.perf_counter() - start, hoja=hoja)
+
+def is_processed(content_hash, hoja=None):
+    """Indica si el contenido con ese hash (o una de sus hojas) ya fue procesado por completo."""
+    with _lock:
+        row = get_connection().execute(
+            "SELECT 1 FROM etapas WHERE hash = ? AND hoja = ? AND etapa = ? AND estado = 'ok'",
+            (content_hash, hoja or '', FINAL_STAGE)
+        ).fetchone()
+    return row is not None
+
+def mark_processed(content_hash, hoja=None):
+    """Marca el contenido con ese hash (o una de sus hojas) como procesado por completo."""
+    record_stage(content_hash, FINAL_STAGE, 'ok', hoja=hoja)
+
+def finish_sheets(content_hash, hojas):
+    """
+    Marca un libro con varias hojas como procesado si todas tienen su informe.
+
+    Si falta alguna (no se pudo leer, no tenía datos o la ejecución se
+    interrumpió), el contenido queda con la etapa final en error y la lista de
+    hojas pendientes, y la siguiente ejecución procesa solo esas hojas.
+
+    Args:
+        content_hash (str): SHA-256 del libro.
+        hojas (list): Hojas con estados del libro (None si es el archivo completo,
+            que se marca con su propia etapa final).
+
+    Returns:
+        bool: True si el contenido quedó procesado por completo.
+    """
+    hojas = [hoja for hoja in hojas if hoja is not None]
+    if not hojas:
+        return is_processed(content_hash)
+    pendientes = [hoja for hoja in hojas if not is_processed(content_hash, hoja)]
+    if pendientes:
+        record_stage(content_hash, FINAL_STAGE, 'error', error=f"Hojas sin informe: {', '.join(pendientes)}")
+    else:
+        record_stage(content_hash, FINAL_STAGE, 'ok')
+    return not pendientes
+
+def reset():
+    """
+    Reinicia el registro de correos descargados y los puntos de control.
+
+    Los adjuntos ya almacenados y el estado de sus etapas se conservan.
+    """
+    with transaction() as connection:
+        connection.execute("DELETE FROM sync_state")
+        connection.execute("DELETE FROM mensajes")
+        connection.execute("DELETE FROM adjunto_mensajes")
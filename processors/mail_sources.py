@@ -0,0 +1,180 @@
+import os
+import sys
+import email
+import mailbox
+import time
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+from processors import ledger
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Fuente de correo: 'imap' (por defecto), 'maildir:<ruta>', 'mbox:<ruta>' o 'eml:<carpeta>'
+MAIL_SOURCE = os.getenv('MAIL_SOURCE', 'imap')
+
+def _mail_module():
+    """Importa el módulo mail.py que está en la raíz del proyecto."""
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mail
+    return mail
+
+def _received_date(msg, fallback_path=None):
+    """Obtiene la fecha de recepción (ISO 8601) de la cabecera Date o de la fecha del archivo."""
+    try:
+        if msg['Date']:
+            return parsedate_to_datetime(msg['Date']).isoformat()
+    except (TypeError, ValueError):
+        pass
+    if fallback_path and os.path.exists(fallback_path):
+        return datetime.fromtimestamp(os.path.getmtime(fallback_path), timezone.utc).isoformat()
+    return None
+
+class MailSource(ABC):
+    """
+    Fuente de correos de la que se descargan los adjuntos soportados.
+
+    Las subclases implementan download_attachments con la misma firma que
+    mail.download_attachments.
+    """
+
+    @abstractmethod
+    def download_attachments(self, force_download=False):
+        """
+        Descarga los adjuntos de los correos nuevos de la fuente.
+
+        Args:
+            force_download (bool): Si es True, vuelve a procesar todos los correos.
+
+        Returns:
+            list: Lista de nombres de archivos descargados.
+        """
+
+class IMAPSource(MailSource):
+    """Buzón IMAP (servidor real o el servidor de prueba de processors.imap_stub)."""
+
+    def __init__(self, connect=None):
+        """
+        Args:
+            connect (callable, optional): Función que abre una conexión IMAP
+                autenticada con el buzón seleccionado. Por defecto mail.connect_imap.
+        """
+        self.connect = connect
+
+    def download_attachments(self, force_download=False):
+        return _mail_module().download_attachments(force_download, connect=self.connect)
+
+class LocalMailSource(MailSource):
+    """
+    Base de las fuentes locales (Maildir, mbox y carpeta de .eml).
+
+    Los correos ya procesados se guardan en processors.ledger por su clave,
+    con el identificador de fuente '<tipo>:<ruta>'.
+    """
+
+    kind = None
+
+    def __init__(self, path):
+        self.path = path
+        self.source_id = f"{self.kind}:{os.path.abspath(path)}"
+
+    @abstractmethod
+    def iter_messages(self):
+        """
+        Recorre los correos de la fuente.
+
+        Yields:
+            tuple: (clave estable del correo, email.message.Message, fecha ISO 8601 o None).
+        """
+
+    def download_attachments(self, force_download=False):
+        mail = _mail_module()
+        logging.info(f"Leyendo correos de {self.source_id}...")
+        if not os.path.exists(mail.DOWNLOAD_FOLDER):
+            os.makedirs(mail.DOWNLOAD_FOLDER)
+
+        downloaded_files = []
+        for key, msg, received in self.iter_messages():
+            if not force_download and ledger.has_message(self.source_id, key):
+                continue
+            start = time.perf_counter()
+            attachments = mail.save_message_attachments(msg)
+            ledger.record_messages(self.source_id, [{'uid': key, 'recibido': received, 'adjuntos': attachments,
+                                                     'duracion': time.perf_counter() - start}])
+            downloaded_files.extend(attachment['archivo'] for attachment in attachments)
+
+        downloaded_files = list(dict.fromkeys(downloaded_files))
+        logging.info(f"Archivos descargados: {downloaded_files}")
+        return downloaded_files
+
+class MaildirSource(LocalMailSource):
+    """Carpeta Maildir (cur/new/tmp)."""
+
+    kind = 'maildir'
+
+    def iter_messages(self):
+        box = mailbox.Maildir(self.path, factory=None, create=False)
+        for key in sorted(box.keys()):
+            with box.get_file(key) as f:
+                msg = email.message_from_binary_file(f)
+            yield key, msg, _received_date(msg)
+
+class MboxSource(LocalMailSource):
+    """Archivo mbox. Los correos se identifican por su Message-ID."""
+
+    kind = 'mbox'
+
+    def iter_messages(self):
+        box = mailbox.mbox(self.path, create=False)
+        try:
+            for index, key in enumerate(box.keys()):
+                with box.get_file(key) as f:
+                    msg = email.message_from_binary_file(f)
+                yield msg['Message-ID'] or f"#{index}", msg, _received_date(msg)
+        finally:
+            box.close()
+
+class EmlFolderSource(LocalMailSource):
+    """Carpeta con un archivo .eml por correo. Los correos se identifican por su nombre."""
+
+    kind = 'eml'
+
+    def iter_messages(self):
+        for filename in sorted(os.listdir(self.path)):
+            if not filename.lower().endswith('.eml'):
+                continue
+            filepath = os.path.join(self.path, filename)
+            with open(filepath, 'rb') as f:
+                msg = email.message_from_binary_file(f)
+            yield filename, msg, _received_date(msg, filepath)
+
+SOURCE_TYPES = {
+    'maildir': MaildirSource,
+    'mbox': MboxSource,
+    'eml': EmlFolderSource
+}
+
+def get_mail_source(spec=None):
+    """
+    Crea la fuente de correo a partir de su especificación.
+
+    Args:
+        spec (str|MailSource, optional): 'imap', 'maildir:<ruta>', 'mbox:<ruta>',
+            'eml:<carpeta>' o una fuente ya creada. Por defecto MAIL_SOURCE.
+
+    Returns:
+        MailSource: Fuente de correo.
+    """
+    if isinstance(spec, MailSource):
+        return spec
+    spec = spec or MAIL_SOURCE
+    kind, _, path = spec.partition(':')
+    kind = kind.lower()
+    if kind == 'imap':
+        return IMAPSource()
+    if kind not in SOURCE_TYPES or not path:
+        raise ValueError(f"Fuente de correo no válida: {spec}")
+    return SOURCE_TYPES[kind](path)
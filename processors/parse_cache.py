@@ -0,0 +1,212 @@
+"""
+Caché en disco de los estados financieros ya extraídos.
+
+Los registros de cada archivo (o de cada hoja de un libro) se guardan por
+columnas (código, descripción y valor), junto con las líneas de encabezado del
+estado, con la clave <hash del contenido>-v<PARSER_VERSION>-<configuración>,
+en Parquet si pyarrow está instalado o en pickle si no. La configuración es una
+huella de los ajustes que cambian lo que se extrae (AMOUNT_DECIMAL_SEPARATOR,
+EXCEL_READER, HEADER_SCAN_ROWS y CSV_CHUNK_ROWS, porque el separador decimal
+de un CSV se detecta en su primer bloque): al cambiar uno, las entradas anteriores dejan
+de usarse y se borran por antigüedad. El tipo y la categoría
+no se guardan: se recalculan al leer, así un cambio en las reglas de
+clasificación no deja registros obsoletos en la caché.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+import importlib.util
+from dotenv import load_dotenv
+import pandas as pd
+import logging
+from processors.financial_data import PARSER_VERSION, clasificar_cuentas, clasificar_categorias
+from processors import amounts, statement_reader
+from processors.statement import FinancialStatement, as_statement
+
+# Cargar variables de entorno
+load_dotenv()
+
+PARSE_CACHE_DIR = os.getenv('PARSE_CACHE_DIR', 'cache')
+# Tamaño máximo de la caché en MB; al superarlo se borran las entradas usadas hace más tiempo (0 = desactivada)
+PARSE_CACHE_MAX_MB = float(os.getenv('PARSE_CACHE_MAX_MB', '256'))
+
+PARQUET = importlib.util.find_spec('pyarrow') is not None
+COLUMNS = ['codigo', 'descripcion', 'valor']
+
+def enabled():
+    """Indica si la caché está activada."""
+    return PARSE_CACHE_MAX_MB > 0
+
+def config_fingerprint():
+    """Huella de la configuración que cambia los registros extraídos."""
+    settings = [amounts.AMOUNT_DECIMAL_SEPARATOR, statement_reader.EXCEL_READER, statement_reader.HEADER_SCAN_ROWS,
+                statement_reader.CSV_CHUNK_ROWS]
+    return hashlib.sha1(json.dumps(settings).encode('utf-8')).hexdigest()[:8]
+
+def _stem(content_hash, sheet=None):
+    stem = f"{content_hash}-v{PARSER_VERSION}-{config_fingerprint()}"
+    if sheet is not None:
+        stem += '-' + hashlib.sha1(sheet.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(PARSE_CACHE_DIR, stem)
+
+def _entry_paths(content_hash, sheet=None):
+    stem = _stem(content_hash, sheet)
+    return [f"{stem}.parquet", f"{stem}.pkl"]
+
+def get(content_hash, sheet=None):
+    """
+    Lee de la caché los registros extraídos de un contenido.
+
+    Args:
+        content_hash (str): SHA-256 del archivo.
+        sheet (str, optional): Hoja del libro de Excel.
+
+    Returns:
+        FinancialStatement: Registros financieros (como los de extract_financial_data),
+            o None si no están en la caché.
+    """
+    if not enabled():
+        return None
+    for path in _entry_paths(content_hash, sheet):
+        if not os.path.exists(path):
+            continue
+        try:
+            if path.endswith('.parquet'):
+                frame = pd.read_parquet(path)
+                columns = frame.to_dict('list')
+                columns['encabezado'] = frame.attrs.get('encabezado', [])
+            else:
+                with open(path, 'rb') as f:
+                    columns = pickle.load(f)
+        except Exception as e:
+            logging.warning(f"Entrada de caché ilegible {path}: {e}")
+            os.remove(path)
+            return None
+        # Marcar la entrada como usada recientemente
+        os.utime(path)
+        return FinancialStatement(
+            columns['codigo'],
+            columns['descripcion'],
+            columns['valor'],
+            clasificar_cuentas(columns['codigo']),
+            clasificar_categorias(columns['codigo']),
+            encabezado=columns.get('encabezado', [])
+        )
+    return None
+
+def put(content_hash, records, sheet=None):
+    """
+    Guarda en la caché los registros extraídos de un contenido.
+
+    Args:
+        content_hash (str): SHA-256 del archivo.
+        records (FinancialStatement|list): Registros devueltos por extract_financial_data.
+        sheet (str, optional): Hoja del libro de Excel.
+    """
+    if not enabled():
+        return
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    statement = as_statement(records)
+    columns = {
+        'codigo': statement.codigos.tolist(),
+        'descripcion': statement.descripciones.tolist(),
+        'valor': statement.valores.tolist()
+    }
+    parquet_path, pickle_path = _entry_paths(content_hash, sheet)
+
+    fd, tmp_path = tempfile.mkstemp(dir=PARSE_CACHE_DIR, prefix='.', suffix='.part')
+    os.close(fd)
+    try:
+        path = pickle_path
+        if PARQUET:
+            try:
+                frame = pd.DataFrame(columns, columns=COLUMNS)
+                frame.attrs['encabezado'] = list(statement.encabezado)
+                frame.to_parquet(tmp_path, index=False)
+                path = parquet_path
+            except Exception:
+                # Descripciones con tipos mezclados: guardar en pickle
+                pass
+        if path == pickle_path:
+            columns['encabezado'] = list(statement.encabezado)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def get_sheets(content_hash):
+    """
+    Lee de la caché la lista de hojas con estados financieros de un libro.
+
+    Returns:
+        list: Nombres de las hojas, o None si no están en la caché.
+    """
+    path = f"{_stem(content_hash)}.hojas.json"
+    if not enabled() or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            sheets = json.load(f)
+    except (OSError, ValueError):
+        return None
+    os.utime(path)
+    return sheets
+
+def put_sheets(content_hash, sheets):
+    """Guarda en la caché la lista de hojas con estados financieros de un libro."""
+    if not enabled():
+        return
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    path = f"{_stem(content_hash)}.hojas.json"
+    fd, tmp_path = tempfile.mkstemp(dir=PARSE_CACHE_DIR, prefix='.', suffix='.part')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(sheets, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def evict(max_mb=None):
+    """
+    Borra las entradas usadas hace más tiempo hasta que la caché ocupe como
+    máximo max_mb MB.
+
+    Args:
+        max_mb (float, optional): Tamaño máximo en MB. Por defecto PARSE_CACHE_MAX_MB.
+
+    Returns:
+        int: Número de entradas borradas.
+    """
+    if max_mb is None:
+        max_mb = PARSE_CACHE_MAX_MB
+    if not os.path.isdir(PARSE_CACHE_DIR):
+        return 0
+
+    entries = []
+    for entry in os.scandir(PARSE_CACHE_DIR):
+        if entry.is_file() and not entry.name.startswith('.'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 1024 * 1024
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    if removed:
+        logging.info(f"Caché de estados: {removed} entradas antiguas eliminadas")
+    return removed
+
+def clear():
+    """Borra todas las entradas de la caché."""
+    if os.path.isdir(PARSE_CACHE_DIR):
+        for entry in os.scandir(PARSE_CACHE_DIR):
+            if entry.is_file():
+                os.remove(entry.path)
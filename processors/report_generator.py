@@ -1,18 +1,206 @@
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
+from processors.statement import DetailList, as_statement
+from processors.categories import get_classifier
 
-def generate_report(financial_data, analysis_results, output_folder=None, filename_prefix="informe"):
+def render_report(financial_data, analysis_results, debug=False, compact=False):
+    """
+    Genera el informe de estado financiero línea a línea.
+
+    Es un generador: las líneas se producen a medida que se piden, así el
+    informe se puede escribir en un archivo (write_report) sin armarlo
+    entero en memoria. Las cuentas de cada categoría se leen del estado por
+    posición, sin copiar los registros.
+
+    En modo compacto cada cuenta ocupa una línea, ordenadas por código, y la
+    ruta de ancestros se escribe una sola vez por subárbol, con sangría por
+    nivel, en lugar de repetir todos los ancestros en cada cuenta.
+
+    Args:
+        financial_data (FinancialStatement|list): Datos financieros.
+        analysis_results (dict): Resultados de analyze_financial_data.
+        debug (bool): Si es True, incluye información de debug al final.
+        compact (bool): Si es True, genera el detalle de las cuentas compacto.
+
+    Yields:
+        str: Cada línea del informe, sin el salto de línea.
+    """
+    statement = as_statement(financial_data)
+    index = analysis_results.get('jerarquia') or statement.hierarchy()
+    detalles = analysis_results.get('detalles_completos')
+    if detalles is None:
+        detalles = DetailList(statement, index)
+
+    yield "INFORME DE ESTADO FINANCIERO"
+    yield "-" * 30
+    yield ""
+
+    # Resumen general
+    yield f"Total Ingresos: ${analysis_results.get('total_ingresos', 0):,.2f}"
+    yield ""
+
+    # Egresos por categoría
+    total_gastos = analysis_results.get('total_gastos', 0)
+    total_costos = analysis_results.get('total_costos', 0)
+    yield f"Total Egresos: ${total_gastos + total_costos:,.2f}"
+    for categoria, valor in ordered_categories(analysis_results.get('por_categoria', {})):
+        yield f"    {categoria.capitalize()}: ${valor:,.2f}"
+    yield ""
+
+    # Total utilidad
+    yield f"Total Utilidad: ${analysis_results.get('utilidad', 0):,.2f}"
+    yield ""
+
+    # Cuentas padre cuyo valor no coincide con la suma de sus subcuentas
+    descuadres = analysis_results.get('descuadres', [])
+    if descuadres:
+        yield "-" * 30
+        yield "Descuadres (cuentas que no coinciden con la suma de sus subcuentas)."
+        yield ""
+        for descuadre in descuadres:
+            yield (f"{descuadre['codigo']} {descuadre['descripcion']}: "
+                   f"reportado ${descuadre['reportado']:,.2f}, "
+                   f"subcuentas ${descuadre['calculado']:,.2f}, "
+                   f"diferencia ${descuadre['diferencia']:,.2f}")
+        yield ""
+
+    # Detalles por categoría
+    yield "-" * 30
+    yield "Detalles de cada categoria."
+    yield ""
+
+    # Posiciones de las cuentas de cada categoría, en el orden del estado
+    por_posicion = _positions_by_category(statement)
+
+    # Mostrar detalles de cada categoría, en el mismo orden que el resumen
+    for categoria, positions in ordered_categories(por_posicion):
+        yield f"\n{categoria.upper()}"
+        yield "-" * 30
+        if compact:
+            yield from _compact_lines(statement, index, positions)
+            continue
+
+        # Mostrar cada detalle
+        for position in positions.tolist():
+            detalle = detalles[position]
+            yield f"Código: {detalle['codigo']}"
+            yield f"Descripción: {detalle['descripcion']}"
+            yield f"Valor: ${detalle['valor']:,.2f}"
+            yield f"Tipo: {detalle['tipo']}"
+            yield "Ancestros:"
+
+            ancestros = detalle.get('ancestros', [])
+            if ancestros:
+                for ancestro in ancestros:
+                    yield f" - {ancestro['codigo']}: {ancestro['descripcion']}"
+            else:
+                yield " - No se encontraron ancestros"
+            yield ""
+
+    # Si estamos en modo debug, agregar información adicional
+    if debug:
+        yield "\nINFORMACIÓN DE DEBUG"
+        yield "-" * 30
+        yield f"Total registros procesados: {len(statement)}"
+        yield f"Total categorías encontradas: {len(por_posicion)}"
+        for categoria, positions in por_posicion.items():
+            yield f"\nRegistros en categoría {categoria}: {len(positions)}"
+            for position in positions.tolist():
+                yield f"  - {statement.codigos[position]}: {statement.descripciones[position]}"
+
+def ordered_categories(por_categoria):
+    """
+    Sumas (o cuentas) por categoría en el orden del clasificador
+    (get_classifier().order()), el mismo en todos los informes.
+
+    Args:
+        por_categoria (dict): Categoría -> suma, como 'por_categoria' de los
+            resultados, o categoría -> posiciones de sus cuentas.
+
+    Returns:
+        list: Tuplas (categoría, valor); las categorías que el clasificador no
+            conoce (por ejemplo, de estados guardados con otras reglas) van al final.
+    """
+    orden = [categoria for categoria in get_classifier().order() if categoria in por_categoria]
+    orden += [categoria for categoria in por_categoria if categoria not in orden]
+    return [(categoria, por_categoria[categoria]) for categoria in orden]
+
+def _positions_by_category(statement):
+    """Categoría -> posiciones de sus cuentas (en el orden del estado), en el orden en que aparece cada categoría."""
+    codes = statement.categorias.codes
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(-1, len(statement.categorias.categories) + 1))
+    grupos = {}
+    for code in pd.unique(codes).tolist():
+        positions = order[bounds[code + 1]:bounds[code + 2]]
+        grupos[statement.value('categoria', positions[0])] = positions
+    return grupos
+
+def _compact_lines(statement, index, positions):
+    """Líneas compactas de las cuentas de una categoría, con cada ruta de ancestros una sola vez."""
+    positions = positions[np.argsort(statement.codigos[positions].astype(str), kind='stable')]
+    # Códigos ya escritos de la rama actual, de la raíz hacia abajo
+    ruta = []
+    for position in positions.tolist():
+        codigo = str(statement.codigos[position])
+        ancestros = index.ancestors(codigo)
+        comunes = 0
+        while comunes < min(len(ruta), len(ancestros)) and ruta[comunes] == ancestros[comunes]:
+            comunes += 1
+        del ruta[comunes:]
+        for ancestro in ancestros[comunes:]:
+            yield f"{'  ' * len(ruta)}{ancestro} {statement.descripciones[index.positions(ancestro)[0]]}"
+            ruta.append(ancestro)
+        yield (f"{'  ' * len(ruta)}{codigo} {statement.descripciones[position]}: "
+               f"${statement.valores[position]:,.2f} ({statement.value('tipo', position)})")
+        ruta.append(codigo)
+
+def write_report(destination, financial_data, analysis_results, debug=False, compact=False):
+    """
+    Escribe el informe de estado financiero a medida que se genera (ver render_report).
+
+    Args:
+        destination (str|file): Ruta del archivo o flujo de texto abierto (con write).
+        financial_data (FinancialStatement|list): Datos financieros.
+        analysis_results (dict): Resultados de analyze_financial_data.
+        debug (bool): Si es True, incluye información de debug al final.
+        compact (bool): Si es True, genera el detalle de las cuentas compacto.
+    """
+    write_lines(destination, render_report(financial_data, analysis_results, debug=debug, compact=compact))
+
+def write_lines(destination, lines):
+    """
+    Escribe las líneas de un informe a medida que se generan, separadas por saltos de línea.
+
+    Args:
+        destination (str|file): Ruta del archivo o flujo de texto abierto (con write).
+        lines (iterable): Líneas del informe, sin el salto de línea (render_report,
+            render_consolidated_report, render_change_report...).
+    """
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "w", encoding="utf-8") as f:
+            write_lines(f, lines)
+        return
+    for number, line in enumerate(lines):
+        if number:
+            destination.write("\n")
+        destination.write(line)
+
+def generate_report(financial_data, analysis_results, output_folder=None, filename_prefix="informe", debug=False, compact=False):
     """
     Genera un informe de estado financiero y lo guarda en un archivo.
     
     Args:
-        financial_data (list): Lista de diccionarios con los datos financieros.
+        financial_data (FinancialStatement|list): Datos financieros.
         analysis_results (dict): Resultados del análisis financiero.
         output_folder (str, optional): Carpeta donde se guardará el informe.
             Si no se proporciona, se guarda en la carpeta actual.
         filename_prefix (str, optional): Prefijo para el nombre del archivo.
+        debug (bool): Si es True, incluye información de debug al final.
+        compact (bool): Si es True, genera el detalle de las cuentas compacto.
             
     Returns:
         str: Ruta del archivo generado.
@@ -21,60 +209,6 @@ def generate_report(financial_data, analysis_results, output_folder=None, filena
         logging.warning("No hay datos para generar el informe.")
         return None
     
-    # Crear el informe
-    informe = []
-    informe.append("INFORME DE ESTADO FINANCIERO")
-    informe.append("-" * 30)
-    informe.append("")
-    
-    # Resumen general
-    informe.append(f"Total Ingresos: ${analysis_results['total_ingresos']:,.2f}")
-    informe.append("")
-    
-    # Egresos por categoría
-    informe.append(f"Total Egresos: ${analysis_results['total_gastos'] + analysis_results['total_costos']:,.2f}")
-    # Ordenar categorías para que aparezcan en un orden específico
-    orden_categorias = ["animales", "praderas", "oficina", "legal", "mejoras", "otros"]
-    for categoria in orden_categorias:
-        if categoria in analysis_results["resumen_por_categoria"]:
-            valor = analysis_results["resumen_por_categoria"][categoria]
-            informe.append(f"    {categoria.capitalize()}: ${valor:,.2f}")
-    informe.append("")
-    
-    # Total utilidad
-    informe.append(f"Total Utilidad: ${analysis_results['utilidad']:,.2f}")
-    informe.append("")
-    
-    # Detalles por categoría
-    informe.append("-" * 30)
-    informe.append("Detalles de cada categoria.")
-    informe.append("")
-    
-    # Agrupar datos por categoría
-    datos_por_categoria = {}
-    for registro in financial_data:
-        categoria = registro["categoria"]
-        if categoria not in datos_por_categoria:
-            datos_por_categoria[categoria] = []
-        datos_por_categoria[categoria].append(registro)
-    
-    # Mostrar detalles de cada categoría
-    for categoria in orden_categorias:
-        if categoria in datos_por_categoria:
-            informe.append(f"\n{categoria.upper()}")
-            informe.append("-" * 30)
-            
-            # Ordenar registros por código
-            registros = sorted(datos_por_categoria[categoria], key=lambda x: x["codigo"])
-            
-            # Mostrar cada registro
-            for registro in registros:
-                informe.append(f"Código: {registro['codigo']}")
-                informe.append(f"Descripción: {registro['descripcion']}")
-                informe.append(f"Valor: ${registro['valor']:,.2f}")
-                informe.append(f"Tipo: {registro['tipo']}")
-                informe.append("")
-    
     # Guardar el informe en un archivo
     if output_folder is None:
         output_folder = "."
@@ -88,9 +222,8 @@ def generate_report(financial_data, analysis_results, output_folder=None, filena
     filename = f"{filename_prefix}_{timestamp}.txt"
     filepath = os.path.join(output_folder, filename)
     
-    # Escribir el informe en el archivo
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write("\n".join(informe))
+    # Escribir el informe en el archivo a medida que se genera
+    write_report(filepath, financial_data, analysis_results, debug=debug, compact=compact)
     
     return filepath
 
@@ -99,7 +232,7 @@ def export_to_excel(financial_data, analysis_results, output_folder=None, filena
     Exporta los datos financieros a un archivo Excel.
     
     Args:
-        financial_data (list): Lista de diccionarios con los datos financieros.
+        financial_data (FinancialStatement|list): Datos financieros.
         analysis_results (dict): Resultados del análisis financiero.
         output_folder (str, optional): Carpeta donde se guardará el archivo.
             Si no se proporciona, se guarda en la carpeta actual.
@@ -113,12 +246,12 @@ def export_to_excel(financial_data, analysis_results, output_folder=None, filena
         return None
     
     # Crear DataFrame con los datos financieros
-    df = pd.DataFrame(financial_data)
+    df = as_statement(financial_data).to_frame()
     
     # Crear DataFrame con el resumen por categoría
     categorias = []
     valores = []
-    for categoria, valor in analysis_results["resumen_por_categoria"].items():
+    for categoria, valor in analysis_results.get("por_categoria", {}).items():
         categorias.append(categoria)
         valores.append(valor)
     
@@ -132,13 +265,13 @@ def export_to_excel(financial_data, analysis_results, output_folder=None, filena
         "Concepto": ["Total Activos", "Total Pasivos", "Total Patrimonio", "Total Ingresos", 
                     "Total Gastos", "Total Costos", "Utilidad"],
         "Valor": [
-            analysis_results["total_activos"],
-            analysis_results["total_pasivos"],
-            analysis_results["total_patrimonio"],
-            analysis_results["total_ingresos"],
-            analysis_results["total_gastos"],
-            analysis_results["total_costos"],
-            analysis_results["utilidad"]
+            analysis_results.get("total_activos", 0),
+            analysis_results.get("total_pasivos", 0),
+            analysis_results.get("total_patrimonio", 0),
+            analysis_results.get("total_ingresos", 0),
+            analysis_results.get("total_gastos", 0),
+            analysis_results.get("total_costos", 0),
+            analysis_results.get("utilidad", 0)
         ]
     }
     df_general = pd.DataFrame(resumen_general)
@@ -0,0 +1,130 @@
+"""
+Acumulación jerárquica de los valores de un estado financiero.
+
+Los estados traen las cuentas padre con su subtotal ("14 Inventarios") y
+también sus subcuentas ("1445 Semovientes", "144505 Ganado"...). Sumar todos
+los registros cuenta cada valor varias veces. Este módulo recorre una sola
+vez el árbol de códigos (processors.hierarchy.CodeIndex) de las hojas a la
+raíz:
+
+- rollup calcula el subtotal de cada cuenta padre a partir de sus hojas y lo
+  compara con el valor que trae el estado (descuadres).
+- level_mask elige las cuentas que se suman para los totales: solo las hojas
+  o las cuentas de un nivel del árbol, así ningún valor se suma dos veces.
+"""
+
+import os
+from dotenv import load_dotenv
+import numpy as np
+from processors.statement import as_statement
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Diferencia máxima entre el valor de una cuenta padre y la suma de sus hojas para no considerarla un descuadre
+ROLLUP_TOLERANCE = float(os.getenv('ROLLUP_TOLERANCE', '0.01'))
+
+def _code_ids(index):
+    """Identificador de código de cada cuenta y lista de códigos distintos."""
+    return index.code_ids(), list(index)
+
+def code_depths(statement, index=None):
+    """
+    Nivel de cada cuenta en el árbol de códigos (0 para las cuentas sin padre).
+
+    Args:
+        statement (FinancialStatement|list): Datos financieros.
+        index (CodeIndex, optional): Índice de códigos. Por defecto el del estado.
+
+    Returns:
+        numpy.ndarray: Nivel de cada cuenta, en el orden del estado.
+    """
+    statement = as_statement(statement)
+    index = index or statement.hierarchy()
+    depths = index.depths()
+    ids, codigos = _code_ids(index)
+    return np.array([depths[codigo] for codigo in codigos], dtype=np.int64)[ids]
+
+def leaf_mask(statement, index=None):
+    """
+    Indica qué cuentas son hojas (no tienen subcuentas en el estado).
+
+    Returns:
+        numpy.ndarray: Máscara booleana, en el orden del estado.
+    """
+    statement = as_statement(statement)
+    index = index or statement.hierarchy()
+    ids, codigos = _code_ids(index)
+    return np.array([index.is_leaf(codigo) for codigo in codigos], dtype=bool)[ids]
+
+def level_mask(statement, level=None, index=None, depths=None):
+    """
+    Cuentas que se suman para obtener los totales sin contar ningún valor dos veces.
+
+    Args:
+        statement (FinancialStatement|list): Datos financieros.
+        level (int, optional): Nivel del árbol (0 = cuentas sin padre). Se
+            eligen las cuentas de ese nivel y las hojas de niveles superiores
+            (las ramas que no llegan a ese nivel). Si es None, solo las hojas.
+        index (CodeIndex, optional): Índice de códigos. Por defecto el del estado.
+        depths (numpy.ndarray, optional): Nivel de cada cuenta, si ya se calculó
+            con code_depths.
+
+    Returns:
+        numpy.ndarray: Máscara booleana, en el orden del estado.
+    """
+    statement = as_statement(statement)
+    index = index or statement.hierarchy()
+    leaves = leaf_mask(statement, index)
+    if level is None:
+        return leaves
+    if depths is None:
+        depths = code_depths(statement, index)
+    return (depths == level) | (leaves & (depths < level))
+
+def rollup(statement, index=None, tolerance=None):
+    """
+    Calcula el subtotal de cada cuenta padre sumando sus hojas, de abajo arriba
+    en un solo recorrido del árbol, y lo compara con el valor del estado.
+
+    Args:
+        statement (FinancialStatement|list): Datos financieros.
+        index (CodeIndex, optional): Índice de códigos. Por defecto el del estado.
+        tolerance (float, optional): Diferencia admitida. Por defecto ROLLUP_TOLERANCE.
+
+    Returns:
+        dict: 'subtotales' (código -> suma de sus hojas, para cada cuenta padre)
+            y 'descuadres' (lista de diccionarios con 'codigo', 'descripcion',
+            'reportado', 'calculado' y 'diferencia', en preorden).
+    """
+    statement = as_statement(statement)
+    index = index or statement.hierarchy()
+    tolerance = ROLLUP_TOLERANCE if tolerance is None else tolerance
+
+    # Valor que trae el estado para cada código (sumado si el código está repetido)
+    ids, codigos = _code_ids(index)
+    reported = dict(zip(codigos, np.bincount(ids, weights=statement.valores, minlength=len(codigos)).tolist()))
+
+    order = index.preorder()
+    subtotals = {}
+    for codigo in reversed(order):
+        children = index.children(codigo)
+        subtotals[codigo] = sum(subtotals[child] for child in children) if children else reported[codigo]
+
+    parents = [codigo for codigo in order if not index.is_leaf(codigo)]
+    descuadres = []
+    for codigo in parents:
+        diferencia = reported[codigo] - subtotals[codigo]
+        if abs(diferencia) > tolerance:
+            descuadres.append({
+                'codigo': codigo,
+                'descripcion': statement.descripciones[index.positions(codigo)[0]],
+                'reportado': reported[codigo],
+                'calculado': subtotals[codigo],
+                'diferencia': diferencia
+            })
+
+    return {
+        'subtotales': {codigo: subtotals[codigo] for codigo in parents},
+        'descuadres': descuadres
+    }
@@ -0,0 +1,269 @@
+"""
+Representación por columnas de un estado financiero.
+
+En lugar de un diccionario por cuenta, FinancialStatement guarda cada campo en
+un arreglo de NumPy: los códigos y descripciones como objetos, los valores como
+float64 y el tipo y la categoría como pd.Categorical (un código entero por
+cuenta). Recorrerlo devuelve vistas RecordView (con __slots__, sin copiar los
+datos) que se usan igual que los diccionarios de antes: registro['codigo'],
+registro.get('valor'), dict(registro)...
+"""
+
+from collections.abc import Mapping, Sequence
+import numpy as np
+import pandas as pd
+from processors.hierarchy import CodeIndex
+
+# Campos de cada registro, en el orden de los diccionarios de extract_financial_data
+FIELDS = ('codigo', 'descripcion', 'valor', 'tipo', 'categoria')
+
+class FinancialStatement(Sequence):
+    """
+    Estado financiero guardado por columnas.
+
+    Args:
+        codigos (iterable): Código de cada cuenta (texto).
+        descripciones (iterable): Descripción de cada cuenta.
+        valores (iterable): Valor de cada cuenta.
+        tipos (iterable): Tipo de cada cuenta (ver clasificar_cuenta).
+        categorias (iterable): Categoría de cada cuenta (ver clasificar_categoria).
+        rechazados (int): Valores descartados en la extracción porque no se
+            pudieron convertir a número.
+        encabezado (iterable): Líneas de texto anteriores a la fila de
+            encabezado (empresa, título, fecha del estado...).
+    """
+
+    def __init__(self, codigos, descripciones, valores, tipos, categorias, rechazados=0, encabezado=()):
+        self.codigos = _object_array(codigos)
+        self.descripciones = _object_array(descripciones)
+        self.valores = np.asarray(valores, dtype='float64')
+        self.tipos = pd.Categorical(tipos)
+        self.categorias = pd.Categorical(categorias)
+        self.rechazados = rechazados
+        self.encabezado = tuple(encabezado)
+        self._hierarchy = None
+        # Nombres de las categorías como lista, para leer una cuenta sin pasar por pandas
+        self._tipo_names = self.tipos.categories.tolist()
+        self._categoria_names = self.categorias.categories.tolist()
+
+    @classmethod
+    def from_records(cls, records):
+        """Crea un estado a partir de una lista de diccionarios con los campos de FIELDS."""
+        records = list(records)
+        columns = {field: [record[field] for record in records] for field in FIELDS}
+        return cls(*(columns[field] for field in FIELDS))
+
+    @classmethod
+    def empty(cls):
+        """Crea un estado sin cuentas."""
+        return cls([], [], [], [], [])
+
+    @classmethod
+    def concat(cls, statements):
+        """Une varios estados en uno, en el orden recibido (con el primer encabezado no vacío)."""
+        statements = [as_statement(statement) for statement in statements]
+        if not statements:
+            return cls.empty()
+        return cls(
+            np.concatenate([s.codigos for s in statements]),
+            np.concatenate([s.descripciones for s in statements]),
+            np.concatenate([s.valores for s in statements]),
+            np.concatenate([np.asarray(s.tipos, dtype=object) for s in statements]),
+            np.concatenate([np.asarray(s.categorias, dtype=object) for s in statements]),
+            rechazados=sum(s.rechazados for s in statements),
+            encabezado=next((s.encabezado for s in statements if s.encabezado), ())
+        )
+
+    def take(self, positions):
+        """Devuelve un estado con las cuentas de las posiciones indicadas (o una máscara booleana)."""
+        return FinancialStatement(
+            self.codigos[positions],
+            self.descripciones[positions],
+            self.valores[positions],
+            self.tipos[positions],
+            self.categorias[positions],
+            encabezado=self.encabezado
+        )
+
+    def hierarchy(self):
+        """
+        Índice de la jerarquía de códigos del estado (se crea la primera vez).
+
+        Returns:
+            CodeIndex: Índice de processors.hierarchy.
+        """
+        if self._hierarchy is None:
+            self._hierarchy = CodeIndex(self.codigos)
+        return self._hierarchy
+
+    def value(self, field, position):
+        """Devuelve el valor de un campo de una cuenta, con los tipos de Python de los registros."""
+        if field == 'codigo':
+            return self.codigos[position]
+        if field == 'descripcion':
+            return self.descripciones[position]
+        if field == 'valor':
+            return float(self.valores[position])
+        if field == 'tipo':
+            return self._tipo_names[self.tipos.codes[position]]
+        if field == 'categoria':
+            return self._categoria_names[self.categorias.codes[position]]
+        raise KeyError(field)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(index)
+            return RecordView(self, index)
+        return self.take(index)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield RecordView(self, position)
+
+    def __eq__(self, other):
+        if isinstance(other, FinancialStatement):
+            other = other.to_records()
+        elif not isinstance(other, list):
+            return NotImplemented
+        return self.to_records() == [dict(record) for record in other]
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<FinancialStatement: {len(self)} cuentas>"
+
+    def to_records(self):
+        """
+        Devuelve las cuentas como lista de diccionarios (la representación anterior).
+
+        Returns:
+            list: Diccionarios con los campos 'codigo', 'descripcion', 'valor', 'tipo' y 'categoria'.
+        """
+        columns = zip(self.codigos.tolist(), self.descripciones.tolist(), self.valores.tolist(),
+                      np.asarray(self.tipos, dtype=object).tolist(),
+                      np.asarray(self.categorias, dtype=object).tolist())
+        return [dict(zip(FIELDS, values)) for values in columns]
+
+    def to_frame(self):
+        """
+        Devuelve las cuentas como DataFrame, con 'tipo' y 'categoria' categóricos.
+
+        Returns:
+            pandas.DataFrame: Columnas 'codigo', 'descripcion', 'valor', 'tipo' y 'categoria'.
+        """
+        return pd.DataFrame({
+            'codigo': self.codigos,
+            'descripcion': self.descripciones,
+            'valor': self.valores,
+            'tipo': self.tipos,
+            'categoria': self.categorias
+        })
+
+class RecordView(Mapping):
+    """
+    Vista de solo lectura de una cuenta de un FinancialStatement.
+
+    Se usa como el diccionario de antes (registro['valor'], registro.get(...),
+    dict(registro)) o por atributos (registro.valor).
+    """
+
+    __slots__ = ('_statement', '_position')
+
+    def __init__(self, statement, position):
+        self._statement = statement
+        self._position = position
+
+    def __getitem__(self, field):
+        return self._statement.value(field, self._position)
+
+    def __getattr__(self, field):
+        if field in FIELDS:
+            return self._statement.value(field, self._position)
+        raise AttributeError(field)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class DetailView(RecordView):
+    """Vista de una cuenta del análisis: los campos de RecordView más 'ancestros'."""
+
+    __slots__ = ('_ancestors',)
+
+    def __init__(self, statement, position, ancestors):
+        super().__init__(statement, position)
+        self._ancestors = ancestors
+
+    def __getitem__(self, field):
+        if field == 'ancestros':
+            return [RecordView(self._statement, position) for position in self._ancestors]
+        return self._statement.value(field, self._position)
+
+    def __iter__(self):
+        yield from FIELDS
+        yield 'ancestros'
+
+    def __len__(self):
+        return len(FIELDS) + 1
+
+class DetailList(Sequence):
+    """
+    Detalles del análisis (cuenta + ancestros) sin copiar los registros.
+
+    Los ancestros de cada cuenta se consultan en el índice de códigos del
+    estado (processors.hierarchy.CodeIndex) al acceder al detalle.
+    """
+
+    def __init__(self, statement, index=None):
+        self.statement = statement
+        self.index = index or statement.hierarchy()
+
+    def __len__(self):
+        return len(self.statement)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        ancestors = self.index.ancestor_positions(self.statement.codigos[position])
+        return DetailView(self.statement, position, ancestors)
+
+def _object_array(values):
+    """Crea un arreglo de objetos sin que NumPy intente convertir los valores."""
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def as_statement(financial_data):
+    """
+    Convierte datos financieros a FinancialStatement.
+
+    Acepta un FinancialStatement (se devuelve tal cual) o la lista de
+    diccionarios de la representación anterior.
+
+    Args:
+        financial_data (FinancialStatement|list): Datos financieros.
+
+    Returns:
+        FinancialStatement: Los mismos datos por columnas.
+    """
+    if isinstance(financial_data, FinancialStatement):
+        return financial_data
+    if not financial_data:
+        return FinancialStatement.empty()
+    return FinancialStatement.from_records(financial_data)
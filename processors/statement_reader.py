@@ -0,0 +1,284 @@
+"""
+Lectura rápida de estados financieros en Excel y CSV.
+
+En lugar de cargar la hoja completa con pd.read_excel, recorre las filas en
+modo de solo lectura (o con python-calamine si está instalado), busca la fila
+de encabezado "Código cuenta contable" mientras lee y solo conserva las tres
+columnas que usa extract_financial_data: código, descripción y valor.
+
+Los CSV se leen por bloques de CSV_CHUNK_ROWS filas, así la memoria usada
+depende del tamaño del bloque y no del tamaño del archivo.
+"""
+
+import os
+from dotenv import load_dotenv
+import pandas as pd
+import logging
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Lector de Excel: 'rapido' (filas en streaming, solo tres columnas) o 'pandas' (hoja completa)
+EXCEL_READER = os.getenv('EXCEL_READER', 'rapido')
+# Filas por bloque al leer CSV (0 = leer el archivo completo con pd.read_csv)
+CSV_CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', '100000'))
+# Filas del principio de cada hoja en las que se busca el encabezado para saber si es un estado financiero
+HEADER_SCAN_ROWS = int(os.getenv('HEADER_SCAN_ROWS', '50'))
+
+# Columnas del DataFrame que devuelve read_statement
+STATEMENT_COLUMNS = ['codigo', 'descripcion', 'valor']
+HEADER_TEXT = "Código cuenta contable"
+
+def _convert_cell(value):
+    """Convierte los números enteros guardados como float a int, igual que pd.read_excel."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _open_openpyxl(filepath):
+    from openpyxl import load_workbook
+
+    return load_workbook(filepath, read_only=True, data_only=True)
+
+def _iter_rows_openpyxl(filepath, sheet=None):
+    """Recorre las tres primeras columnas de una hoja con openpyxl en modo de solo lectura."""
+    workbook = _open_openpyxl(filepath)
+    try:
+        worksheet = workbook.worksheets[0] if sheet is None else workbook[sheet]
+        for row in worksheet.iter_rows(max_col=len(STATEMENT_COLUMNS), values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+def _calamine_rows(worksheet):
+    rows = worksheet.iter_rows() if hasattr(worksheet, 'iter_rows') else worksheet.to_python(skip_empty_area=False)
+    for row in rows:
+        yield tuple(None if cell == '' else cell for cell in row[:len(STATEMENT_COLUMNS)])
+
+def _iter_rows_calamine(filepath, sheet=None):
+    """Recorre las tres primeras columnas de una hoja con python-calamine."""
+    workbook = CalamineWorkbook.from_path(filepath)
+    worksheet = workbook.get_sheet_by_index(0) if sheet is None else workbook.get_sheet_by_name(sheet)
+    return _calamine_rows(worksheet)
+
+def _check_engine(filepath):
+    if CalamineWorkbook is None and filepath.lower().endswith('.xls'):
+        raise ValueError("El formato .xls requiere python-calamine para la lectura rápida")
+
+def iter_sheet_rows(filepath, sheet=None):
+    """
+    Recorre las filas de una hoja de un Excel (solo las tres primeras columnas).
+
+    Usa python-calamine si está instalado; si no, openpyxl en modo de solo lectura
+    (que no admite el formato .xls antiguo).
+
+    Args:
+        filepath (str): Ruta del archivo Excel.
+        sheet (str, optional): Nombre de la hoja. Por defecto la primera.
+
+    Yields:
+        tuple: Valores de las celdas de cada fila.
+    """
+    _check_engine(filepath)
+    if CalamineWorkbook is not None:
+        return _iter_rows_calamine(filepath, sheet)
+    return _iter_rows_openpyxl(filepath, sheet)
+
+def list_statement_sheets(filepath, scan_rows=None):
+    """
+    Lista las hojas de un Excel que parecen estados financieros, es decir, que
+    tienen la fila "Código cuenta contable" en sus primeras filas.
+
+    Args:
+        filepath (str): Ruta del archivo Excel.
+        scan_rows (int, optional): Filas revisadas por hoja. Por defecto HEADER_SCAN_ROWS.
+
+    Los .xls sin python-calamine se revisan con pd.ExcelFile (xlrd), más lento
+    pero sin dejar fuera ninguna hoja.
+
+    Returns:
+        list: Nombres de las hojas, en el orden del libro.
+    """
+    scan_rows = scan_rows or HEADER_SCAN_ROWS
+    if CalamineWorkbook is None and filepath.lower().endswith('.xls'):
+        return _list_sheets_pandas(filepath, scan_rows)
+    sheets = []
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_path(filepath)
+        for name in workbook.sheet_names:
+            rows = _calamine_rows(workbook.get_sheet_by_name(name))
+            if any(_is_header(row) for _, row in zip(range(scan_rows), rows)):
+                sheets.append(name)
+        return sheets
+
+    workbook = _open_openpyxl(filepath)
+    try:
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(max_col=1, max_row=scan_rows, values_only=True)
+            if any(_is_header(row) for row in rows):
+                sheets.append(worksheet.title)
+    finally:
+        workbook.close()
+    return sheets
+
+def _list_sheets_pandas(filepath, scan_rows):
+    """Hojas con la fila de encabezado en sus primeras filas, leídas con pd.ExcelFile."""
+    sheets = []
+    with pd.ExcelFile(filepath) as workbook:
+        for name in workbook.sheet_names:
+            frame = workbook.parse(name, header=None, nrows=scan_rows, usecols=[0])
+            if any(_is_header(row) for row in frame.itertuples(index=False)):
+                sheets.append(name)
+    return sheets
+
+def _is_header(row):
+    return bool(row) and isinstance(row[0], str) and HEADER_TEXT in row[0]
+
+def read_statement(filepath, sheet=None):
+    """
+    Lee un estado financiero en Excel quedándose solo con las filas de datos.
+
+    Las filas anteriores al encabezado (título, empresa, fecha...) no se
+    convierten en columnas del DataFrame: se guardan en df.attrs['encabezado'].
+
+    Args:
+        filepath (str): Ruta del archivo Excel.
+        sheet (str, optional): Nombre de la hoja. Por defecto la primera.
+
+    Returns:
+        pandas.DataFrame: Columnas 'codigo' (str), 'descripcion' (object) y
+            'valor' (float64, u object si hay valores de texto), o None si no se
+            encontró la fila de encabezado o la hoja tiene menos de tres columnas.
+    """
+    header = []
+    codes, descriptions, values = [], [], []
+    header_found = False
+
+    for row in iter_sheet_rows(filepath, sheet):
+        if not header_found:
+            if _is_header(row):
+                header_found = True
+            else:
+                header.append(row)
+            continue
+        row = tuple(row) + (None,) * (len(STATEMENT_COLUMNS) - len(row))
+        codigo, descripcion, valor = (_convert_cell(cell) for cell in row[:len(STATEMENT_COLUMNS)])
+        if codigo is None and valor is None:
+            continue
+        codes.append(None if codigo is None else str(codigo))
+        descriptions.append(descripcion)
+        values.append(valor)
+
+    if not header_found:
+        return None
+
+    valor = pd.Series(values, dtype=object)
+    numeric = pd.to_numeric(valor, errors='coerce')
+    if numeric.notna().sum() == valor.notna().sum():
+        valor = numeric.astype('float64')
+
+    df = pd.DataFrame({
+        'codigo': pd.Series(codes, dtype=object),
+        'descripcion': pd.Series(descriptions, dtype=object),
+        'valor': valor
+    })
+    df.attrs['encabezado'] = header
+    return df
+
+def read_excel(filepath, sheet=None):
+    """
+    Lee una hoja de un archivo Excel con el lector configurado en EXCEL_READER.
+
+    Con el lector rápido, si la hoja no tiene la fila de encabezado esperada se
+    vuelve a leer completa con pd.read_excel para no perder ningún formato.
+
+    Args:
+        filepath (str): Ruta del archivo Excel.
+        sheet (str, optional): Nombre de la hoja. Por defecto la primera.
+
+    Returns:
+        pandas.DataFrame: DataFrame con los datos leídos.
+    """
+    if EXCEL_READER == 'rapido':
+        try:
+            df = read_statement(filepath, sheet)
+            if df is not None:
+                return df
+            logging.info(f"{os.path.basename(filepath)} no tiene la fila '{HEADER_TEXT}'. Leyendo la hoja completa...")
+        except ValueError as e:
+            logging.info(f"Lectura rápida no disponible para {os.path.basename(filepath)}: {e}")
+    return pd.read_excel(filepath, sheet_name=0 if sheet is None else sheet)
+
+def iter_csv_statement(filepath, chunk_rows=None):
+    """
+    Lee un estado financiero en CSV por bloques.
+
+    Solo se leen las tres primeras columnas, como texto (igual que las deja
+    pd.read_csv cuando la columna tiene el título y el encabezado). La fila de
+    encabezado se busca bloque a bloque, aunque caiga en el siguiente bloque;
+    las filas anteriores se guardan en attrs['encabezado'] del primer bloque.
+
+    Args:
+        filepath (str): Ruta del archivo CSV.
+        chunk_rows (int, optional): Filas por bloque. Por defecto CSV_CHUNK_ROWS.
+
+    Yields:
+        pandas.DataFrame: Bloques con las columnas 'codigo', 'descripcion' y 'valor'.
+
+    Raises:
+        ValueError: Si el archivo no tiene la fila de encabezado (en las primeras
+            chunk_rows filas) o tiene menos de tres columnas.
+    """
+    chunk_rows = chunk_rows or CSV_CHUNK_ROWS
+    header = []
+    header_found = False
+
+    reader = pd.read_csv(filepath, header=None, usecols=range(len(STATEMENT_COLUMNS)), dtype=str,
+                         chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            chunk.columns = STATEMENT_COLUMNS
+            if not header_found:
+                matches = chunk['codigo'].str.contains(HEADER_TEXT, regex=False, na=False).to_numpy().nonzero()[0]
+                if not len(matches):
+                    header.extend(chunk.itertuples(index=False, name=None))
+                    if len(header) > chunk_rows:
+                        break
+                    continue
+                header_found = True
+                position = matches[0]
+                header.extend(chunk.iloc[:position].itertuples(index=False, name=None))
+                chunk = chunk.iloc[position + 1:]
+                chunk.attrs['encabezado'] = header
+            yield chunk.reset_index(drop=True)
+
+    if not header_found:
+        raise ValueError(f"No se encontró la fila '{HEADER_TEXT}'")
+
+def read_csv(filepath):
+    """
+    Lee un archivo CSV por bloques, con solo las columnas de código, descripción y valor.
+
+    Si el archivo no tiene la fila de encabezado esperada, o CSV_CHUNK_ROWS es 0,
+    se lee completo con pd.read_csv.
+
+    Args:
+        filepath (str): Ruta del archivo CSV.
+
+    Returns:
+        pandas.DataFrame: DataFrame con los datos leídos.
+    """
+    if CSV_CHUNK_ROWS > 0:
+        try:
+            chunks = list(iter_csv_statement(filepath))
+            df = pd.concat(chunks, ignore_index=True)
+            df.attrs['encabezado'] = chunks[0].attrs.get('encabezado', [])
+            return df
+        except ValueError as e:
+            logging.info(f"Lectura por bloques no disponible para {os.path.basename(filepath)}: {e}")
+    return pd.read_csv(filepath)
@@ -0,0 +1,28 @@
+"""Estados financieros de prueba compartidos por los tests."""
+
+import pytest
+from processors.statement import FinancialStatement
+
+# (código, descripción, valor, tipo, categoría). Las cuentas 15 y 1 no
+# coinciden con la suma de sus subcuentas (500 contra 450).
+CUENTAS = [
+    ('1', 'Activo', 1500.0, 'Activo', 'otros'),
+    ('14', 'Inventarios', 1000.0, 'Activo', 'animales'),
+    ('1445', 'Semovientes', 1000.0, 'Activo', 'animales'),
+    ('144505', 'Ganado', 600.0, 'Activo', 'animales'),
+    ('144510', 'Cerdos', 400.0, 'Activo', 'animales'),
+    ('15', 'Propiedad planta y equipo', 500.0, 'Activo', 'praderas'),
+    ('1504', 'Terrenos', 450.0, 'Activo', 'praderas'),
+    ('4', 'Ingresos', 5000.0, 'Ingreso', 'otros'),
+    ('41', 'Operacionales', 5000.0, 'Ingreso', 'otros'),
+    ('5', 'Gastos', 2000.0, 'Gasto', 'otros'),
+    ('51', 'Administración', 2000.0, 'Gasto', 'legal'),
+]
+
+def make_statement(cuentas):
+    """Crea un FinancialStatement a partir de tuplas (código, descripción, valor, tipo, categoría)."""
+    return FinancialStatement(*(list(campo) for campo in zip(*cuentas)))
+
+@pytest.fixture
+def statement():
+    return make_statement(CUENTAS)
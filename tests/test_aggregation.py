@@ -0,0 +1,24 @@
+import numpy as np
+from processors.aggregation import sum_by_code, aggregate_matrix
+from processors.rollup import code_depths
+
+def test_sum_by_code_ignores_negative_codes_and_mask():
+    codes = np.array([0, 1, -1, 1, 2])
+    valores = np.array([1.0, 2.0, 100.0, 3.0, 4.0])
+    np.testing.assert_array_equal(sum_by_code(codes, valores, 4), [1.0, 5.0, 4.0, 0.0])
+    mask = np.array([True, False, True, True, True])
+    np.testing.assert_array_equal(sum_by_code(codes, valores, 3, mask), [1.0, 3.0, 4.0])
+
+def test_aggregate_matrix_by_tipo_categoria_and_level(statement):
+    depths = code_depths(statement)
+    matriz = aggregate_matrix(statement, depths)
+    assert matriz['niveles'] == [0, 1, 2, 3]
+    valores = matriz['valores']
+    assert valores.shape == (len(matriz['tipos']), len(matriz['categorias']), 4)
+
+    activo = matriz['tipos'].index('Activo')
+    animales = matriz['categorias'].index('animales')
+    assert valores[activo, animales].tolist() == [0.0, 1000.0, 1000.0, 1000.0]
+    # Cada nivel suma las cuentas de esa profundidad: el total de todo es la suma de los valores
+    assert valores.sum() == statement.valores.sum()
+    np.testing.assert_allclose(valores.sum(axis=(0, 1)), np.bincount(depths, weights=statement.valores))
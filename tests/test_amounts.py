@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from processors.amounts import parse_amounts, detect_decimal_separator
+
+def parse(valores, decimal=None):
+    return parse_amounts(pd.Series(valores, dtype=object), decimal=decimal)
+
+def test_parse_amounts_signs_and_separators():
+    values, parsed = parse(['-1.234.567,89', '(5.000)', '300-', '1 234,5 COP'])
+    assert parsed.all()
+    np.testing.assert_allclose(values, [-1234567.89, -5000.0, -300.0, 1234.5])
+
+def test_parse_amounts_currency_and_dot_decimal():
+    values, parsed = parse(['$1,234.50', 'US$ 2,000', '-0.75'])
+    assert parsed.all()
+    np.testing.assert_allclose(values, [1234.5, 2000.0, -0.75])
+
+def test_parse_amounts_rejects_badly_grouped_thousands():
+    # Con punto decimal, la coma es de miles y debe ir seguida de tres dígitos
+    values, parsed = parse(['1,234.50', '1,2345'])
+    assert parsed.tolist() == [True, False]
+    assert values[0] == 1234.5
+    assert np.isnan(values[1])
+
+@pytest.mark.parametrize('texto', ['1.2.3', '--5', '(-5)', 'abc', ''])
+def test_parse_amounts_rejects_invalid_text(texto):
+    _, parsed = parse(['10.50', texto], decimal='.')
+    assert parsed.tolist() == [True, False]
+
+def test_parse_amounts_keeps_numbers_in_object_columns():
+    values, parsed = parse([1500, 2.5, '3,5'], decimal=',')
+    assert parsed.all()
+    np.testing.assert_allclose(values, [1500.0, 2.5, 3.5])
+
+def test_parse_amounts_numeric_column():
+    values, parsed = parse_amounts(pd.Series([1.0, -2.0]))
+    assert parsed.all()
+    np.testing.assert_allclose(values, [1.0, -2.0])
+
+@pytest.mark.parametrize('valores, separador', [
+    (['-1.234.567,89', '(5.000)'], ','),
+    (['1.234.567', '12'], ','),
+    (['1,234,567', '12'], '.'),
+    (['1,5', '2,25'], ','),
+    (['1.5', '2.25'], '.'),
+])
+def test_detect_decimal_separator(valores, separador):
+    assert detect_decimal_separator(pd.Series(valores, dtype=object)) == separador
+
+def test_detect_decimal_separator_without_evidence_uses_default():
+    # "1.234" puede ser mil doscientos o uno con decimales: no hay votos
+    assert detect_decimal_separator(pd.Series(['1.234', '5'], dtype=object), default=',') == ','
+    assert detect_decimal_separator(pd.Series([1.5, 2.0]), default='.') == '.'
@@ -0,0 +1,75 @@
+import io
+import numpy as np
+import pytest
+from processors.consolidation import StatementBatch, consolidate, render_consolidated_report
+from processors.financial_data import analyze_financial_data
+from processors.categories import get_classifier
+from processors.rollup import code_depths, leaf_mask
+from processors.report_generator import write_report
+from tests.conftest import CUENTAS, make_statement
+
+def statements():
+    """Estados con árboles distintos: sin la cuenta 14, con un código repetido y con otro plan."""
+    sin_14 = make_statement([cuenta for cuenta in CUENTAS if cuenta[0] != '14'])
+    repetido = make_statement(CUENTAS + [('144505', 'Ganado', 100.0, 'Activo', 'animales')])
+    otro = make_statement([
+        ('2', 'Pasivo', 300.0, 'Pasivo', 'otros'),
+        ('25', 'Obligaciones', 300.0, 'Pasivo', 'legal'),
+        ('4', 'Ingresos', 900.0, 'Ingreso', 'otros'),
+        ('41', 'Operacionales', 900.0, 'Ingreso', 'otros'),
+        ('1', 'Activo', 10.0, 'Activo', 'otros'),
+    ])
+    return [
+        ('Finca La Esperanza', '2024-01', make_statement(CUENTAS)),
+        ('Finca La Esperanza', '2024-02', sin_14),
+        ('Finca El Roble', '2024-01', repetido),
+        ('Finca El Roble', '2024-02', otro),
+    ]
+
+def test_tree_matches_code_index_of_each_statement():
+    batch = StatementBatch.from_statements(statements())
+    depths, leaves = batch.tree()
+    for numero, (_, _, statement) in enumerate(statements()):
+        cuentas = batch.estados == numero
+        np.testing.assert_array_equal(depths[cuentas], code_depths(statement))
+        np.testing.assert_array_equal(leaves[cuentas], leaf_mask(statement))
+
+def test_consolidate_per_statement_matches_analysis():
+    results = consolidate(statements())
+    for fila, (_, _, statement) in zip(results['tabla'].itertuples(), statements()):
+        analysis = analyze_financial_data(statement)
+        assert fila.registros == len(statement)
+        assert fila.utilidad == pytest.approx(analysis['utilidad'])
+        assert fila.total_activos == pytest.approx(analysis.get('total_activos', 0))
+
+def test_consolidate_groups():
+    results = consolidate(statements())
+    assert results['estados'] == 4
+    assert list(results['por_entidad']) == ['Finca La Esperanza', 'Finca El Roble']
+    assert list(results['por_periodo']) == ['2024-01', '2024-02']
+    assert results['consolidado']['total_ingresos'] == pytest.approx(5000.0 * 3 + 900.0)
+    esperanza = results['por_entidad']['Finca La Esperanza']
+    assert esperanza['total_activos'] == pytest.approx(1450.0 * 2)
+
+def test_consolidate_level():
+    results = consolidate(statements(), level=0)
+    assert results['consolidado']['total_activos'] == pytest.approx(1500.0 * 3 + 10.0)
+
+def test_report_orders_categories_like_the_classifier():
+    results = consolidate(statements())
+    # Las cuentas aparecen primero con la categoría 'otros', que el clasificador pone al final
+    lines = list(render_consolidated_report(results))
+    inicio = lines.index("CONSOLIDADO")
+    consolidado = lines[inicio:lines.index("", inicio)]
+    categorias = [line.strip().split(':')[0].lower() for line in consolidado if line.startswith("    ")]
+    assert categorias == [categoria for categoria in get_classifier().order() if categoria in categorias]
+    assert sorted(categorias) == sorted(results['consolidado']['por_categoria'])
+
+def test_file_report_uses_the_same_category_order(statement):
+    # El informe de cada archivo comparte ordered_categories con el consolidado
+    salida = io.StringIO()
+    write_report(salida, statement, analyze_financial_data(statement))
+    lines = salida.getvalue().split("\n")
+    detalle = [line.lower() for line in lines[lines.index("Detalles de cada categoria."):] if line.isupper()]
+    assert detalle == [categoria for categoria in get_classifier().order()
+                       if categoria in set(statement.categorias.tolist())]
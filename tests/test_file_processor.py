@@ -0,0 +1,45 @@
+import logging
+import pytest
+from openpyxl import Workbook
+from processors import file_processor, statement_reader
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Libro con dos hojas de estados financieros, una de notas y una vacía."""
+    workbook = Workbook()
+    workbook.active.title = 'Vacia'
+    for name in ('Enero', 'Notas', 'Febrero'):
+        worksheet = workbook.create_sheet(name)
+        worksheet.append(['Finca La Esperanza'])
+        if name != 'Notas':
+            worksheet.append(['Código cuenta contable', 'Descripción', 'Saldo'])
+            worksheet.append(['1', 'Activo', 100])
+    path = tmp_path / 'estados.xlsx'
+    workbook.save(path)
+    return str(path)
+
+def test_list_statement_sheets(workbook):
+    assert statement_reader.list_statement_sheets(workbook) == ['Enero', 'Febrero']
+
+def test_list_sheets_with_pandas(workbook):
+    # Lector de los .xls sin python-calamine
+    assert statement_reader._list_sheets_pandas(workbook, 50) == ['Enero', 'Febrero']
+
+def test_expand_sheets(workbook, monkeypatch):
+    monkeypatch.setattr(file_processor.parse_cache, 'PARSE_CACHE_MAX_MB', 0)
+    entries = file_processor._expand_sheets([('estados.xlsx', workbook, 'abc'), ('otro.csv', 'otro.csv', 'def')])
+    assert entries == [
+        ('estados.xlsx [Enero]', workbook, 'abc', 'Enero'),
+        ('estados.xlsx [Febrero]', workbook, 'abc', 'Febrero'),
+        ('otro.csv', 'otro.csv', 'def', None),
+    ]
+
+def test_expand_sheets_warns_when_sheets_cannot_be_listed(workbook, monkeypatch, caplog):
+    def fail(filepath):
+        raise ImportError("Missing optional dependency 'xlrd'")
+    monkeypatch.setattr(file_processor.parse_cache, 'PARSE_CACHE_MAX_MB', 0)
+    monkeypatch.setattr(file_processor, 'list_statement_sheets', fail)
+    with caplog.at_level(logging.WARNING):
+        entries = file_processor._expand_sheets([('estados.xls', workbook, 'abc')])
+    assert entries == [('estados.xls', workbook, 'abc', None)]
+    assert 'Solo se procesa la primera hoja' in caplog.text
@@ -0,0 +1,30 @@
+from processors.hierarchy import CodeIndex
+
+def test_parents_skip_missing_levels():
+    # 1445 no tiene 14 en el estado: su padre es la cuenta 1
+    index = CodeIndex(['1', '1445', '144505', '2', '25'])
+    assert index.parent('1445') == '1'
+    assert index.parent('144505') == '1445'
+    assert index.parent('1') is None
+    assert index.roots() == ['1', '2']
+    assert index.ancestors('14450599') == ['1', '1445', '144505']
+
+def test_children_descendants_and_preorder():
+    index = CodeIndex(['1', '14', '1445', '144505', '144510', '15', '1504', '4', '41'])
+    assert index.children('1') == ['14', '15']
+    assert index.descendants('14') == ['1445', '144505', '144510']
+    assert index.preorder() == ['1', '14', '1445', '144505', '144510', '15', '1504', '4', '41']
+    assert index.is_leaf('144505') and not index.is_leaf('1445')
+
+def test_depths_match_number_of_ancestors():
+    codigos = ['1', '14', '1445', '144505', '15', '1504', '5', '51', '5105']
+    index = CodeIndex(codigos)
+    depths = index.depths()
+    assert depths == {codigo: len(index.ancestors(codigo)) for codigo in codigos}
+    assert depths['144505'] == 3 and depths['5'] == 0
+
+def test_repeated_codes_share_one_id():
+    index = CodeIndex(['1', '14', '14', '1405'])
+    assert index.positions('14') == [1, 2]
+    assert index.code_ids().tolist() == [0, 1, 1, 2]
+    assert index.ancestor_positions('1405') == [0, 1, 2]
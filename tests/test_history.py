@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from processors import history, ledger
+from processors.consolidation import StatementBatch
+from processors.financial_data import analyze_financial_data
+from processors.incremental import incremental_analysis
+from processors.statement import FinancialStatement
+from tests.conftest import CUENTAS, make_statement
+
+@pytest.fixture(autouse=True)
+def history_file(tmp_path, monkeypatch):
+    history.close()
+    ledger.close()
+    monkeypatch.setattr(history, 'HISTORY_FILE', str(tmp_path / 'historial.db'))
+    monkeypatch.setattr(ledger, 'LEDGER_FILE', str(tmp_path / 'ledger.db'))
+    yield
+    history.close()
+    ledger.close()
+
+def with_header(statement, *encabezado):
+    return FinancialStatement(statement.codigos, statement.descripciones, statement.valores,
+                              statement.tipos, statement.categorias, encabezado=encabezado)
+
+@pytest.mark.parametrize('texto, periodo', [
+    ('Al 31 de diciembre de 2024', '2024-12'),
+    ('Enero 2024', '2024-01'),
+    ('31/12/2024', '2024-12'),
+    ('12/2024', '2024-12'),
+    ('2024-03-31', '2024-03'),
+    ('Estado de Situación Financiera', None),
+])
+def test_parse_period(texto, periodo):
+    assert history.parse_period(texto) == periodo
+
+def test_statement_entity_skips_titles_and_dates(statement):
+    statement = with_header(statement, 'Estado de Situación Financiera', 'Finca La Esperanza', 'Enero 2024')
+    assert history.statement_entity(statement) == 'Finca La Esperanza'
+    assert history.statement_period(statement) == '2024-01'
+
+def test_record_and_load_version(statement):
+    results = analyze_financial_data(statement)
+    assert history.record(statement, results, 'h1', periodo='2024-01', entidad='Finca') == ('Finca', '2024-01')
+    version = history.find_version('Finca', '2024-01')
+    assert version['hash'] == 'h1' and version['nivel'] is None
+
+    cuentas, resumen = history.load_version(version['estado'])
+    assert cuentas == statement
+    assert resumen['por_tipo'] == pytest.approx(results['por_tipo'])
+    assert resumen['utilidad'] == pytest.approx(results['utilidad'])
+
+def test_record_keeps_the_level(statement):
+    history.record(statement, analyze_financial_data(statement, level=1), 'h1', periodo='2024-01', entidad='Finca',
+                   nivel=1)
+    assert history.find_version('Finca', '2024-01')['nivel'] == 1
+
+def test_record_replaces_same_entity_period_and_sheet(statement):
+    results = analyze_financial_data(statement)
+    history.record(statement, results, 'h1', periodo='2024-01', entidad='Finca')
+    history.record(statement, results, 'h2', periodo='2024-01', entidad='Finca')
+    history.record(statement, results, 'h3', periodo='2024-01', entidad='Finca', hoja='Enero')
+    assert history.periods()['hoja'].tolist() == ['', 'Enero']
+    assert history.find_version('Finca', '2024-01')['hash'] == 'h2'
+
+def test_replace_accounts_matches_a_full_record(statement):
+    history.record(statement, analyze_financial_data(statement), 'h1', periodo='2024-01', entidad='Finca')
+    version = history.find_version('Finca', '2024-01')
+    nuevo = make_statement([(codigo, descripcion, 700.0 if codigo == '144505' else valor, tipo, categoria)
+                            for codigo, descripcion, valor, tipo, categoria in CUENTAS if codigo != '51'])
+    anterior, resultados = history.load_version(version['estado'])
+    results = incremental_analysis(anterior, resultados, nuevo)
+    eliminadas = [cuenta['codigo'] for cuenta in results['cambios']['eliminadas']]
+    history.replace_accounts(version['estado'], nuevo, results['afectadas'] + eliminadas,
+                             results['niveles'], results['hojas'], results, 'h2')
+
+    cuentas, resumen = history.load_version(version['estado'])
+    assert sorted(cuentas.codigos.tolist()) == sorted(nuevo.codigos.tolist())
+    assert resumen['por_categoria'] == pytest.approx(analyze_financial_data(nuevo)['por_categoria'])
+    batch = history.load_batch()
+    stored = dict(zip(batch.statement.codigos.tolist(), zip(*batch.tree())))
+    computed = StatementBatch.from_statements([('Finca', '2024-01', nuevo)])
+    assert stored == dict(zip(computed.statement.codigos.tolist(), zip(*computed.tree())))
+
+def test_series_with_changes(statement):
+    for periodo, factor in (('2023-01', 1.0), ('2023-12', 2.0), ('2024-01', 3.0)):
+        escalado = FinancialStatement(statement.codigos, statement.descripciones, statement.valores * factor,
+                                      statement.tipos, statement.categorias)
+        history.record(escalado, analyze_financial_data(escalado), periodo, periodo=periodo, entidad='Finca')
+    series = history.with_changes(history.account_series('144505'))
+    assert series['valor'].tolist() == [600.0, 1200.0, 1800.0]
+    assert series['variacion'].tolist()[1:] == [600.0, 600.0]
+    assert np.isnan(series['interanual'].tolist()[1])
+    assert series['interanual'].tolist()[2] == 1200.0
+    assert series['interanual_pct'].tolist()[2] == pytest.approx(200.0)
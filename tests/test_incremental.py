@@ -0,0 +1,56 @@
+import pytest
+from processors.incremental import diff_statements, incremental_analysis
+from processors.financial_data import analyze_financial_data, TOTALES_POR_TIPO
+from tests.conftest import CUENTAS, make_statement
+
+TOTALES = sorted(set(TOTALES_POR_TIPO.values())) + ['utilidad']
+
+def corrected(cambios=(), agregadas=(), eliminadas=()):
+    """Copia de CUENTAS con otros valores, cuentas nuevas y sin algunos códigos."""
+    cambios = dict(cambios)
+    cuentas = [(codigo, descripcion, cambios.get(codigo, valor), tipo, categoria)
+               for codigo, descripcion, valor, tipo, categoria in CUENTAS if codigo not in eliminadas]
+    return make_statement(cuentas + list(agregadas))
+
+def assert_same_totals(incremental, full):
+    assert incremental['por_tipo'] == pytest.approx(full['por_tipo'])
+    assert incremental['por_categoria'] == pytest.approx(full['por_categoria'])
+    for total in TOTALES:
+        assert incremental.get(total, 0) == pytest.approx(full.get(total, 0)), total
+
+@pytest.mark.parametrize('nuevo', [
+    # Una hoja corregida
+    corrected(cambios={'144505': 700.0}),
+    # Una cuenta padre corregida (no cambia los totales, sí sus descuadres)
+    corrected(cambios={'1445': 1200.0}),
+    # Una hoja que pasa a tener subcuentas
+    corrected(agregadas=[('150405', 'Lote norte', 300.0, 'Activo', 'praderas'),
+                         ('150410', 'Lote sur', 150.0, 'Activo', 'praderas')]),
+    # Una cuenta padre que se queda sin subcuentas (vuelve a ser hoja)
+    corrected(eliminadas=['51']),
+    # Una categoría y un tipo que desaparecen
+    corrected(eliminadas=['5', '51']),
+    # Una cuenta nueva de otro tipo y otra categoría
+    corrected(agregadas=[('6', 'Costos', 800.0, 'Costo', 'mejoras')]),
+])
+def test_incremental_totals_match_full_analysis(statement, nuevo):
+    anterior = analyze_financial_data(statement)
+    results = incremental_analysis(statement, anterior, nuevo)
+    assert_same_totals(results, analyze_financial_data(nuevo))
+
+def test_incremental_descuadres_of_affected_ancestors(statement):
+    nuevo = corrected(cambios={'144505': 700.0})
+    results = incremental_analysis(statement, analyze_financial_data(statement), nuevo)
+    full = {descuadre['codigo']: descuadre for descuadre in analyze_financial_data(nuevo)['descuadres']}
+    assert [descuadre['codigo'] for descuadre in results['descuadres']] == ['1', '14', '1445']
+    for descuadre in results['descuadres']:
+        assert descuadre == pytest.approx(full[descuadre['codigo']])
+
+def test_diff_statements(statement):
+    nuevo = corrected(cambios={'144505': 700.0}, eliminadas=['51'],
+                      agregadas=[('144515', 'Ovejas', 50.0, 'Activo', 'animales')])
+    cambios = diff_statements(statement, nuevo)
+    assert cambios['modificadas'] == [{'codigo': '144505', 'descripcion': 'Ganado', 'anterior': 600.0,
+                                       'nuevo': 700.0, 'diferencia': 100.0}]
+    assert cambios['agregadas'] == [{'codigo': '144515', 'descripcion': 'Ovejas', 'valor': 50.0}]
+    assert cambios['eliminadas'] == [{'codigo': '51', 'descripcion': 'Administración', 'valor': 2000.0}]
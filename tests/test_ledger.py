@@ -0,0 +1,55 @@
+import pytest
+from processors import ledger
+
+@pytest.fixture(autouse=True)
+def ledger_file(tmp_path, monkeypatch):
+    ledger.close()
+    monkeypatch.setattr(ledger, 'LEDGER_FILE', str(tmp_path / 'ledger.db'))
+    yield
+    ledger.close()
+
+def test_messages_attachments_and_checkpoint():
+    adjunto = {'hash': 'abc', 'archivo': 'ab/abc.xlsx', 'nombre': 'estado.xlsx'}
+    ledger.record_messages('imap:INBOX', [{'uid': 7, 'recibido': '2024-03-05T10:00:00', 'adjuntos': [adjunto]}],
+                           uidvalidity=42, checkpoint=7)
+    assert ledger.get_sync_state('imap:INBOX') == {'uidvalidity': 42, 'last_uid': 7}
+    assert ledger.has_message('imap:INBOX', 7, 42)
+    assert not ledger.has_message('imap:INBOX', 7, 43)
+    assert ledger.get_attachment('abc') == {
+        'archivo': 'ab/abc.xlsx',
+        'nombres': ['estado.xlsx'],
+        'correos': [{'fuente': 'imap:INBOX', 'uid': '7', 'recibido': '2024-03-05T10:00:00'}]
+    }
+    assert ledger.get_attachment('otro') is None
+
+def test_failed_batch_does_not_move_checkpoint():
+    ledger.save_sync_state('imap:INBOX', 42, 5)
+    with pytest.raises(KeyError):
+        ledger.record_messages('imap:INBOX', [{'uid': 6}, {'uid': 7, 'adjuntos': [{}]}], 42, checkpoint=7)
+    assert ledger.get_sync_state('imap:INBOX') == {'uidvalidity': 42, 'last_uid': 5}
+    assert not ledger.has_message('imap:INBOX', 6, 42)
+
+def test_stage_records_errors():
+    with pytest.raises(ValueError):
+        with ledger.stage('abc', 'informe'):
+            raise ValueError('sin datos')
+    assert not ledger.is_processed('abc')
+    with ledger.stage('abc', 'informe'):
+        pass
+    assert ledger.is_processed('abc')
+
+def test_workbook_is_processed_when_every_sheet_is():
+    ledger.mark_processed('abc', 'Enero')
+    ledger.record_stage('abc', 'informe', 'error', error='Sin datos extraídos', hoja='Febrero')
+    assert ledger.is_processed('abc', 'Enero')
+    assert not ledger.finish_sheets('abc', ['Enero', 'Febrero'])
+    assert not ledger.is_processed('abc')
+
+    ledger.mark_processed('abc', 'Febrero')
+    assert ledger.finish_sheets('abc', ['Enero', 'Febrero'])
+    assert ledger.is_processed('abc')
+
+def test_single_sheet_content_keeps_its_own_stage():
+    assert not ledger.finish_sheets('abc', [None])
+    ledger.mark_processed('abc')
+    assert ledger.finish_sheets('abc', [None])
@@ -0,0 +1,26 @@
+import pytest
+from processors import amounts, parse_cache, statement_reader
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, 'PARSE_CACHE_DIR', str(tmp_path / 'cache'))
+
+def test_put_and_get(statement):
+    parse_cache.put('abc', statement, sheet='Enero')
+    cached = parse_cache.get('abc', sheet='Enero')
+    assert cached.codigos.tolist() == statement.codigos.tolist()
+    assert cached.valores.tolist() == statement.valores.tolist()
+    assert parse_cache.get('abc') is None
+
+@pytest.mark.parametrize('module, setting, value', [
+    (amounts, 'AMOUNT_DECIMAL_SEPARATOR', ','),
+    (statement_reader, 'EXCEL_READER', 'pandas'),
+    (statement_reader, 'HEADER_SCAN_ROWS', 7),
+    (statement_reader, 'CSV_CHUNK_ROWS', 10),
+])
+def test_settings_change_the_key(statement, monkeypatch, module, setting, value):
+    parse_cache.put('abc', statement)
+    fingerprint = parse_cache.config_fingerprint()
+    monkeypatch.setattr(module, setting, value)
+    assert parse_cache.config_fingerprint() != fingerprint
+    assert parse_cache.get('abc') is None
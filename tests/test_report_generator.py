@@ -0,0 +1,208 @@
+import io
+import pytest
+from processors.financial_data import analyze_financial_data, generate_financial_report
+from processors.report_generator import render_report, write_report, write_lines, generate_report
+
+# Informe completo del estado de tests/conftest.py, con las categorías de categorias.json
+INFORME = """\
+INFORME DE ESTADO FINANCIERO
+------------------------------
+
+Total Ingresos: $5,000.00
+
+Total Egresos: $2,000.00
+    Animales: $1,000.00
+    Praderas: $450.00
+    Legal: $2,000.00
+    Otros: $5,000.00
+
+Total Utilidad: $3,000.00
+
+------------------------------
+Descuadres (cuentas que no coinciden con la suma de sus subcuentas).
+
+1 Activo: reportado $1,500.00, subcuentas $1,450.00, diferencia $50.00
+15 Propiedad planta y equipo: reportado $500.00, subcuentas $450.00, diferencia $50.00
+
+------------------------------
+Detalles de cada categoria.
+
+
+ANIMALES
+------------------------------
+Código: 14
+Descripción: Inventarios
+Valor: $1,000.00
+Tipo: Activo
+Ancestros:
+ - 1: Activo
+
+Código: 1445
+Descripción: Semovientes
+Valor: $1,000.00
+Tipo: Activo
+Ancestros:
+ - 1: Activo
+ - 14: Inventarios
+
+Código: 144505
+Descripción: Ganado
+Valor: $600.00
+Tipo: Activo
+Ancestros:
+ - 1: Activo
+ - 14: Inventarios
+ - 1445: Semovientes
+
+Código: 144510
+Descripción: Cerdos
+Valor: $400.00
+Tipo: Activo
+Ancestros:
+ - 1: Activo
+ - 14: Inventarios
+ - 1445: Semovientes
+
+
+PRADERAS
+------------------------------
+Código: 15
+Descripción: Propiedad planta y equipo
+Valor: $500.00
+Tipo: Activo
+Ancestros:
+ - 1: Activo
+
+Código: 1504
+Descripción: Terrenos
+Valor: $450.00
+Tipo: Activo
+Ancestros:
+ - 1: Activo
+ - 15: Propiedad planta y equipo
+
+
+LEGAL
+------------------------------
+Código: 51
+Descripción: Administración
+Valor: $2,000.00
+Tipo: Gasto
+Ancestros:
+ - 5: Gastos
+
+
+OTROS
+------------------------------
+Código: 1
+Descripción: Activo
+Valor: $1,500.00
+Tipo: Activo
+Ancestros:
+ - No se encontraron ancestros
+
+Código: 4
+Descripción: Ingresos
+Valor: $5,000.00
+Tipo: Ingreso
+Ancestros:
+ - No se encontraron ancestros
+
+Código: 41
+Descripción: Operacionales
+Valor: $5,000.00
+Tipo: Ingreso
+Ancestros:
+ - 4: Ingresos
+
+Código: 5
+Descripción: Gastos
+Valor: $2,000.00
+Tipo: Gasto
+Ancestros:
+ - No se encontraron ancestros
+"""
+
+# Detalle compacto: cada ruta de ancestros una sola vez, con sangría por nivel
+DETALLE_COMPACTO = """\
+Detalles de cada categoria.
+
+
+ANIMALES
+------------------------------
+1 Activo
+  14 Inventarios: $1,000.00 (Activo)
+    1445 Semovientes: $1,000.00 (Activo)
+      144505 Ganado: $600.00 (Activo)
+      144510 Cerdos: $400.00 (Activo)
+
+PRADERAS
+------------------------------
+1 Activo
+  15 Propiedad planta y equipo: $500.00 (Activo)
+    1504 Terrenos: $450.00 (Activo)
+
+LEGAL
+------------------------------
+5 Gastos
+  51 Administración: $2,000.00 (Gasto)
+
+OTROS
+------------------------------
+1 Activo: $1,500.00 (Activo)
+4 Ingresos: $5,000.00 (Ingreso)
+  41 Operacionales: $5,000.00 (Ingreso)
+5 Gastos: $2,000.00 (Gasto)"""
+
+@pytest.fixture
+def results(statement):
+    return analyze_financial_data(statement)
+
+def test_render_report(statement, results):
+    assert "\n".join(render_report(statement, results)) == INFORME
+
+def test_render_report_is_lazy(statement, results):
+    lines = render_report(statement, results)
+    assert next(lines) == "INFORME DE ESTADO FINANCIERO"
+
+def test_compact_report(statement, results):
+    informe = "\n".join(render_report(statement, results, compact=True))
+    resumen = INFORME[:INFORME.index("Detalles de cada categoria.")]
+    assert informe == resumen + DETALLE_COMPACTO
+
+def test_debug_report_lists_accounts_by_category(statement, results):
+    informe = "\n".join(render_report(statement, results, debug=True))
+    assert informe.startswith(INFORME)
+    debug = informe[len(INFORME):].split("\n")
+    assert debug[:6] == ["", "", "INFORMACIÓN DE DEBUG", "-" * 30, "Total registros procesados: 11",
+                         "Total categorías encontradas: 4"]
+    assert "Registros en categoría animales: 4" in debug
+    assert "  - 1504: Terrenos" in debug
+
+def test_report_accepts_records(statement, results):
+    assert "\n".join(render_report(statement.to_records(), results)) == INFORME
+    assert generate_financial_report(statement, results) == INFORME
+
+def test_write_report(tmp_path, statement, results):
+    path = tmp_path / "informe.txt"
+    write_report(str(path), statement, results, compact=True)
+    assert path.read_text(encoding="utf-8") == "\n".join(render_report(statement, results, compact=True))
+
+def test_generate_report(tmp_path, statement, results):
+    path = generate_report(statement, results, output_folder=str(tmp_path / "reportes"), filename_prefix="prueba")
+    assert path.startswith(str(tmp_path / "reportes" / "prueba_"))
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == INFORME
+
+def test_write_lines_to_stream_and_path(tmp_path):
+    salida = io.StringIO()
+    write_lines(salida, iter(["uno", "", "tres"]))
+    assert salida.getvalue() == "uno\n\ntres"
+
+    path = tmp_path / "lineas.txt"
+    write_lines(path, (line for line in ["á", "b"]))
+    assert path.read_text(encoding="utf-8") == "á\nb"
+
+    vacio = io.StringIO()
+    write_lines(vacio, [])
+    assert vacio.getvalue() == ""
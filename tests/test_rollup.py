@@ -0,0 +1,42 @@
+from processors.rollup import rollup, code_depths, leaf_mask, level_mask
+from processors.financial_data import analyze_financial_data
+
+def test_rollup_subtotals_from_leaves(statement):
+    subtotales = rollup(statement)['subtotales']
+    assert subtotales['1445'] == 1000.0
+    assert subtotales['14'] == 1000.0
+    assert subtotales['15'] == 450.0
+    assert subtotales['1'] == 1450.0
+
+def test_rollup_reports_descuadres_in_preorder(statement):
+    descuadres = rollup(statement)['descuadres']
+    assert [descuadre['codigo'] for descuadre in descuadres] == ['1', '15']
+    assert descuadres[1] == {
+        'codigo': '15',
+        'descripcion': 'Propiedad planta y equipo',
+        'reportado': 500.0,
+        'calculado': 450.0,
+        'diferencia': 50.0
+    }
+
+def test_rollup_tolerance(statement):
+    assert rollup(statement, tolerance=50.0)['descuadres'] == []
+
+def test_depths_and_leaves(statement):
+    assert code_depths(statement).tolist() == [0, 1, 2, 3, 3, 1, 2, 0, 1, 0, 1]
+    assert statement.codigos[leaf_mask(statement)].tolist() == ['144505', '144510', '1504', '41', '51']
+
+def test_level_mask_includes_shallow_leaves(statement):
+    mask = level_mask(statement, level=1)
+    assert statement.codigos[mask].tolist() == ['14', '15', '41', '51']
+    mask = level_mask(statement, level=2)
+    assert statement.codigos[mask].tolist() == ['1445', '1504', '41', '51']
+
+def test_totals_count_each_value_once(statement):
+    results = analyze_financial_data(statement)
+    assert results['total_activos'] == 1450.0
+    assert results['total_ingresos'] == 5000.0
+    assert results['utilidad'] == 3000.0
+    assert [descuadre['codigo'] for descuadre in results['descuadres']] == ['1', '15']
+    # Con el nivel 1 se suman las cuentas padre con el valor que trae el estado
+    assert analyze_financial_data(statement, level=1)['total_activos'] == 1500.0